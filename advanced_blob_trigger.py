@@ -1,39 +1,61 @@
-import cv2
 import numpy as np
-from PyQt5 import QtWidgets, QtGui, QtCore, QtOpenGL
+from PyQt5 import QtWidgets, QtCore, QtOpenGL
+import argparse
 import sys
-import mediapipe as mp
-from OpenGL.GL import *
-from OpenGL.GLU import *
-from pydub import AudioSegment
-from pydub.playback import play
 import scipy.interpolate as interp
-import threading
+import time
+
+from audio_synth import StreamingSynth, open_backend
+from frame_pipeline import CaptureThread, FrameQueue, LatestValue, ProcessingWorker, SharedParams
+from frame_source import open_source
+from gl_batch import BlobRenderer, FrameTexture
+from particle_engine import ParticleSystem
+from perf_metrics import NULL_TIMER, start_metrics
+from pose_tracker import (LEFT_FOOT, LEFT_HAND, NOSE, RIGHT_FOOT, RIGHT_HAND, TARGET_INFERENCE_MS, FrameRing,
+                          PoseHistory, PoseTracker)
+
+# Particle Burst: the hand emits enough particles per second to keep the
+# pool full; they inherit part of the hand's velocity and fall under gravity
+PARTICLE_POOL = 50000
+PARTICLE_LIFE = (0.6, 1.4)  # seconds
+PARTICLE_GRAVITY = 400.0  # px/s^2, downwards
+PARTICLE_INHERIT = 0.5
+PARTICLE_COLOR = (0.0, 1.0, 0.0)  # Green
+
+# Landmarks that trigger blobs, per "Trigger Points" choice; the first one
+# of the first person also drives the audio
+TRIGGER_SETS = {
+    "Right Hand": [RIGHT_HAND],
+    "Both Hands": [RIGHT_HAND, LEFT_HAND],
+    "Hands, Feet & Head": [RIGHT_HAND, LEFT_HAND, RIGHT_FOOT, LEFT_FOOT, NOSE],
+}
+MAX_TRIGGERS = max(len(points) for points in TRIGGER_SETS.values())
+TRAIL_CAPACITY = 500  # Trail Length slider maximum, in render frames
 
 class AdvancedBlobTriggerApp(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, source=0, metrics=None, people=1, pose_model=None):
         super().__init__()
         self.setWindowTitle("Advanced Blob Trigger")
         self.setGeometry(100, 100, 1280, 720)
 
-        # Video capture
-        self.cap = cv2.VideoCapture(0)
+        # Video capture (default webcam, a recording or a synthetic feed)
+        self.cap = open_source(source)
         if not self.cap.isOpened():
-            raise RuntimeError("Cannot open webcam")
+            raise RuntimeError("Cannot open video source %r" % source)
 
-        # Mediapipe setup
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+        # Mediapipe pose tracking: every landmark of up to `people` people
+        self.pose = PoseTracker(min_detection_confidence=0.5, min_tracking_confidence=0.5, num_poses=people,
+                                model_path=pose_model)
 
         # Widget setup
         self.central_widget = QtWidgets.QWidget()
         self.setCentralWidget(self.central_widget)
         self.layout = QtWidgets.QHBoxLayout(self.central_widget)
 
-        # Left: Video feed
-        self.video_label = QtWidgets.QLabel()
-        self.video_label.setFixedSize(640, 480)
-        self.layout.addWidget(self.video_label)
+        # Left: Video feed, uploaded into a persistent GL texture
+        self.video_view = GLFrameView()
+        self.video_view.setFixedSize(640, 480)
+        self.layout.addWidget(self.video_view)
 
         # Right: OpenGL blob effect
         self.gl_widget = GLWidget()
@@ -63,12 +85,22 @@ class AdvancedBlobTriggerApp(QtWidgets.QMainWindow):
 
         # Trail length slider
         self.trail_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
-        self.trail_slider.setRange(1, 50)
+        self.trail_slider.setRange(1, 500)
         self.trail_slider.setValue(10)
         self.trail_slider.valueChanged.connect(self.update_params)
         self.controls_layout.addWidget(QtWidgets.QLabel("Trail Length"))
         self.controls_layout.addWidget(self.trail_slider)
 
+        # Particle pool size slider
+        self.particle_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+        self.particle_slider.setRange(1000, 200000)
+        self.particle_slider.setSingleStep(1000)
+        self.particle_slider.setPageStep(10000)
+        self.particle_slider.setValue(PARTICLE_POOL)
+        self.particle_slider.valueChanged.connect(self.update_params)
+        self.controls_layout.addWidget(QtWidgets.QLabel("Particle Pool"))
+        self.controls_layout.addWidget(self.particle_slider)
+
         # Preset dropdown
         self.preset_combo = QtWidgets.QComboBox()
         self.preset_combo.addItems(["Default", "Glow", "Particle Burst"])
@@ -76,20 +108,64 @@ class AdvancedBlobTriggerApp(QtWidgets.QMainWindow):
         self.controls_layout.addWidget(QtWidgets.QLabel("Effect Preset"))
         self.controls_layout.addWidget(self.preset_combo)
 
-        # State variables
-        self.blob_pos = None
-        self.prev_pos = []
+        # Which landmarks of each person trigger blobs
+        self.trigger_combo = QtWidgets.QComboBox()
+        self.trigger_combo.addItems(list(TRIGGER_SETS))
+        self.trigger_combo.currentIndexChanged.connect(self.update_params)
+        self.controls_layout.addWidget(QtWidgets.QLabel("Trigger Points"))
+        self.controls_layout.addWidget(self.trigger_combo)
+
+        # Trade inference resolution/model size for latency when over budget
+        self.adaptive_checkbox = QtWidgets.QCheckBox("Adaptive Quality")
+        self.adaptive_checkbox.toggled.connect(self.update_params)
+        self.controls_layout.addWidget(self.adaptive_checkbox)
+
+        # State variables. Trigger points of every person are smoothed and
+        # extrapolated by PoseHistory; the trail keeps one row of points per
+        # render frame (NaN where a point wasn't tracked) in a ring buffer.
+        self.history = PoseHistory(max_people=people)
+        self.trail = FrameRing(TRAIL_CAPACITY, (people * MAX_TRIGGERS, 2))
+        self.triggers = TRIGGER_SETS["Right Hand"]
+        self.blob_points = np.empty((0, 2), dtype=np.float32)
+        self.last_frame_time = time.perf_counter()
+
+        # Pose inference runs on a worker that always takes the newest frame
+        # (one-slot queue, stale frames are dropped); the render loop below
+        # never waits for it and extrapolates the landmarks between results
+        self.params = SharedParams(adaptive=False, target_ms=TARGET_INFERENCE_MS)
+        self.frame_queue = FrameQueue(maxsize=1)
+        self.latest_result = LatestValue()
+        # Live stage metrics (see perf_metrics.py); NULL_TIMER when off
+        self.metrics = metrics
+        timer = metrics or NULL_TIMER
+        self.pose.timer = timer
+        self.gl_widget.timer = timer
+        self.video_view.timer = timer
+        if metrics is not None:
+            metrics.watch("queue_dropped", lambda: self.frame_queue.dropped)
+        self.capture_thread = CaptureThread(self.cap, self.frame_queue, timer)
+        self.worker = ProcessingWorker(self.frame_queue, self.pose.process, self.params, self.publish_result, timer)
+        self.capture_thread.start()
+        self.worker.start()
+
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.timer.start(16)  # ~60 FPS
 
-        # Audio setup
-        self.audio_thread = threading.Thread(target=self.audio_feedback, daemon=True)
-        self.audio_thread.start()
+        # Audio setup: one continuous stream whose pitch follows the blob
+        self.synth = StreamingSynth()
+        self.audio = open_backend(self.synth)
+        self.audio.start()
 
     def update_params(self):
         self.gl_widget.blob_size = self.blob_size_slider.value()
         self.gl_widget.trail_length = self.trail_slider.value()
+        self.gl_widget.particles.resize(self.particle_slider.value())
+        self.params.update(adaptive=self.adaptive_checkbox.isChecked())
+        triggers = TRIGGER_SETS[self.trigger_combo.currentText()]
+        if triggers != self.triggers:
+            self.triggers = triggers
+            self.trail.clear()
 
     def apply_preset(self):
         preset = self.preset_combo.currentText()
@@ -105,134 +181,150 @@ class AdvancedBlobTriggerApp(QtWidgets.QMainWindow):
             self.gl_widget.effect_type = "default"
             self.blob_size_slider.setValue(50)
             self.trail_slider.setValue(10)
+        self.gl_widget.particles.clear()
         self.update_params()
 
-    def update_frame(self):
-        ret, frame = self.cap.read()
-        if not ret:
-            return
-
-        frame = cv2.resize(frame, (640, 480))
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(rgb_frame)
-
-        if results.pose_landmarks:
-            # Track right hand (landmark 20)
-            hand_x = int(results.pose_landmarks.landmark[20].x * 640)
-            hand_y = int(results.pose_landmarks.landmark[20].y * 480)
-            self.blob_pos = (hand_x, hand_y)
-            self.prev_pos.append(self.blob_pos)
-            if len(self.prev_pos) > self.trail_slider.value():
-                self.prev_pos.pop(0)
-        else:
-            self.blob_pos = None
-
-        # Update video feed
-        h, w, ch = rgb_frame.shape
-        bytes_per_line = ch * w
-        qt_image = QtGui.QImage(rgb_frame.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-        self.video_label.setPixmap(QtGui.QPixmap.fromImage(qt_image))
+    def publish_result(self, result, frame):
+        # Worker thread: filter the poses here, off the GUI thread, and keep
+        # only the newest frame for display
+        display_frame, poses = result
+        self.history.observe(frame.timestamp, poses)
+        self.latest_result.set((display_frame, frame.timestamp))
 
-        # Update GL widget
-        self.gl_widget.blob_pos = self.blob_pos
-        self.gl_widget.prev_pos = self.prev_pos
+    def update_frame(self):
+        now = time.perf_counter()
+        dt, self.last_frame_time = now - self.last_frame_time, now
+        if self.metrics is not None:
+            self.metrics.frame()
+        latest = self.latest_result.take()
+        if latest is not None:
+            frame, captured_at = latest
+            if self.metrics is not None:
+                self.metrics.observe("latency", now - captured_at)
+
+            # Update video feed; it only repaints when a new frame arrived
+            self.video_view.set_frame(frame)
+
+        # One consistent snapshot, predicted for "now", which also hides the
+        # capture-to-result latency
+        positions, velocities = self.history.snapshot(now).landmarks(self.triggers)
+        row = self.trail.push(now)
+        row[:positions.shape[0] * positions.shape[1]] = positions.reshape(-1, 2)
+        tracked = np.isfinite(positions[..., 0]).ravel()
+        self.blob_points = positions.reshape(-1, 2)[tracked]
+
+        self.audio_feedback()
+
+        # The GL widget gets arrays of its own, never modified afterwards
+        self.gl_widget.blob_pos = self.blob_points
+        self.gl_widget.prev_pos = self.trail.latest(self.trail_slider.value())
+        if self.gl_widget.effect_type == "particles":
+            self.gl_widget.step_particles(dt, velocities.reshape(-1, 2)[tracked])
         self.gl_widget.update()
 
     def audio_feedback(self):
-        while True:
-            if self.blob_pos:
-                # Simple sine wave tone based on y-position
-                freq = 200 + (self.blob_pos[1] / 480) * 800
-                audio = AudioSegment.sine(duration=100, freq=freq).fade_out(50)
-                play(audio)
-            QtCore.QThread.msleep(100)
+        # Simple sine tone based on the y-position of the first tracked
+        # trigger point; the synth glides to it
+        if len(self.blob_points):
+            self.synth.set_tone(200 + (self.blob_points[0, 1] / 480) * 800)
+        else:
+            self.synth.set_tone(None)
 
     def closeEvent(self, event):
+        self.timer.stop()
+        self.audio.close()
+        self.capture_thread.stop()
+        self.worker.stop()
+        self.capture_thread.join()
+        self.worker.join()
         self.cap.release()
         self.pose.close()
         event.accept()
 
+class GLFrameView(QtOpenGL.QGLWidget):
+    # Camera pane: each new BGR frame is uploaded into one persistent
+    # texture at paint time (no color conversion or pixmap); repaints
+    # without a new frame just redraw the texture
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.texture = None
+        self._pending = None
+        self.timer = NULL_TIMER
+
+    def set_frame(self, image, bgr=True):
+        self._pending = (image, bgr)
+        self.update()
+
+    def initializeGL(self):
+        self.texture = FrameTexture()
+
+    def resizeGL(self, w, h):
+        self.texture.resize(w, h)
+
+    def paintGL(self):
+        with self.timer.stage("present"):
+            if self._pending is not None:
+                image, bgr = self._pending
+                self._pending = None
+                self.texture.upload(image, bgr)
+            self.texture.draw()
+
 class GLWidget(QtOpenGL.QGLWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.blob_pos = None
-        self.prev_pos = []
+        self.blob_pos = np.empty((0, 2), dtype=np.float32)  # Trigger points
+        self.prev_pos = None  # Trail, (frames, points, 2) oldest first
         self.blob_size = 50
         self.trail_length = 10
         self.effect_type = "default"
+        self.particles = ParticleSystem(PARTICLE_POOL, gravity=(0.0, PARTICLE_GRAVITY))
+        # Trail quads and particles live in vertex buffers, one draw per effect
+        self.renderer = BlobRenderer()
+        self.timer = NULL_TIMER
+
+    def step_particles(self, dt, velocities):
+        # Every trigger point emits its share, inheriting its own velocity.
+        # Clamp dt so a stalled frame doesn't teleport every particle
+        dt = min(dt, 0.05)
+        with self.timer.stage("effect"):
+            if len(self.blob_pos):
+                rate = self.particles.capacity / (sum(PARTICLE_LIFE) / 2) / len(self.blob_pos)
+                for origin, velocity in zip(self.blob_pos, velocities):
+                    self.particles.burst(origin, rate * dt, (self.blob_size, 4 * self.blob_size), PARTICLE_LIFE,
+                                         PARTICLE_COLOR, spread=self.blob_size / 4,
+                                         velocity=PARTICLE_INHERIT * velocity)
+            self.particles.update(dt)
 
     def initializeGL(self):
-        glClearColor(0.0, 0.0, 0.0, 1.0)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        self.renderer.initialize()
 
     def resizeGL(self, w, h):
-        glViewport(0, 0, w, h)
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
-        gluOrtho2D(0, w, h, 0)
-        glMatrixMode(GL_MODELVIEW)
+        self.renderer.resize(w, h)
 
     def paintGL(self):
-        glClear(GL_COLOR_BUFFER_BIT)
-        glLoadIdentity()
-
-        # Draw vertical line
-        glColor3f(1.0, 1.0, 1.0)
-        glBegin(GL_LINES)
-        glVertex2f(320, 0)
-        glVertex2f(320, 480)
-        glEnd()
-
-        if self.blob_pos:
-            x, y = self.blob_pos
-            if self.effect_type == "glow":
-                self.draw_glow(x, y)
-            elif self.effect_type == "particles":
-                self.draw_particles(x, y)
-            else:
-                self.draw_default(x, y)
-
-    def draw_default(self, x, y):
-        glColor3f(0.0, 1.0, 1.0)  # Cyan
-        glBegin(GL_QUADS)
-        r = self.blob_size / 2
-        glVertex2f(x - r, y - r)
-        glVertex2f(x + r, y - r)
-        glVertex2f(x + r, y + r)
-        glVertex2f(x - r, y + r)
-        glEnd()
-
-    def draw_glow(self, x, y):
-        for i, pos in enumerate(self.prev_pos):
-            alpha = 1.0 - (i / len(self.prev_pos))
-            glColor4f(1.0, 0.5, 0.0, alpha)  # Orange with fading alpha
-            glBegin(GL_QUADS)
-            r = self.blob_size * (1 - i / len(self.prev_pos))
-            px, py = pos
-            glVertex2f(px - r, py - r)
-            glVertex2f(px + r, py - r)
-            glVertex2f(px + r, py + r)
-            glVertex2f(px - r, py + r)
-            glEnd()
-
-    def draw_particles(self, x, y):
-        np.random.seed(42)
-        for i in range(20):
-            offset_x = np.random.uniform(-self.blob_size, self.blob_size)
-            offset_y = np.random.uniform(-self.blob_size, self.blob_size)
-            alpha = np.random.uniform(0.5, 1.0)
-            glColor4f(0.0, 1.0, 0.0, alpha)  # Green particles
-            glBegin(GL_POINTS)
-            glPointSize(5)
-            glVertex2f(x + offset_x, y + offset_y)
-            glEnd()
+        with self.timer.stage("render"):
+            self.renderer.paint(self.blob_pos, self.prev_pos, self.blob_size, self.effect_type, self.particles)
 
 def main():
-    app = QtWidgets.QApplication(sys.argv)
-    window = AdvancedBlobTriggerApp()
+    parser = argparse.ArgumentParser(description="Advanced Blob Trigger")
+    parser.add_argument("--source", default="0", help="webcam index, video file or synthetic[:WxH]")
+    parser.add_argument("--metrics", metavar="SPEC", help="publish stage metrics to udp:HOST[:PORT] or shm:NAME")
+    parser.add_argument("--people", type=int, default=1, help="people to track (more than 1 needs --pose-model)")
+    parser.add_argument("--pose-model", metavar="TASK",
+                        help="Mediapipe pose_landmarker .task file; uses the Tasks API instead of classic Pose")
+    args, qt_args = parser.parse_known_args()
+    if args.people > 1 and not args.pose_model:
+        parser.error("--people above 1 needs --pose-model")
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    metrics, publisher = start_metrics("advanced_blob_trigger", args.metrics, target_fps=60) \
+        if args.metrics else (None, None)
+    window = AdvancedBlobTriggerApp(args.source, metrics, args.people, args.pose_model)
     window.show()
-    sys.exit(app.exec_())
+    status = app.exec_()
+    if publisher is not None:
+        publisher.stop()
+        publisher.join()
+    sys.exit(status)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,285 @@
+import asyncio
+import os
+import secrets
+import signal
+import socket
+import time
+import traceback
+from email.utils import formatdate
+from urllib.parse import unquote
+
+from static_assets import (AssetIndex, cache_headers, is_not_modified, is_versioned, plan_ranges, range_layout,
+                           unsatisfiable_headers)
+
+# Production engine for server.py: pre-forked worker processes sharing one
+# listening socket, each running an asyncio loop. Files that are not held
+# in memory go out with loop.sendfile() (zero-copy on Linux/macOS).
+
+MAX_HEADER_BYTES = 16 * 1024
+KEEPALIVE_TIMEOUT = 15
+SERVER_NAME = 'VirtualPark'
+
+REASONS = {
+    200: 'OK',
+    206: 'Partial Content',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    416: 'Range Not Satisfiable',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class HttpDate:
+    # formatdate() is surprisingly slow; the header only changes once a second
+    def __init__(self):
+        self._second = None
+        self._value = None
+
+    def now(self):
+        second = int(time.time())
+        if second != self._second:
+            self._second = second
+            self._value = formatdate(second, usegmt=True)
+        return self._value
+
+
+class Request:
+    __slots__ = ('method', 'path', 'query', 'version', 'headers')
+
+    def __init__(self, method, path, query, version, headers):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+
+def parse_request(head):
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        return None
+    if not version.startswith('HTTP/1.'):
+        return None
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(':')
+        if not sep:
+            return None
+        headers[name.strip().lower()] = value.strip()
+    path, _, query = target.partition('?')
+    return Request(method, unquote(path), query, version, headers)
+
+
+class AssetServer:
+    def __init__(self, index, max_connections=256):
+        self.index = index
+        # Caps the requests being answered at once. A connection only holds
+        # a slot while it has a request in progress, so idle keep-alive
+        # connections never keep new visitors waiting; requests past the
+        # limit wait for a slot instead of competing for the event loop.
+        self.active = asyncio.Semaphore(max_connections)
+        self.date = HttpDate()
+        # Connections whose current response has begun; a failure after
+        # that can't be reported, only the connection dropped
+        self.responding = set()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while await self.handle_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except asyncio.LimitOverrunError:
+            await self.send_error(writer, 431, keep_alive=False)
+        except Exception:
+            traceback.print_exc()
+            if writer not in self.responding:
+                try:
+                    await self.send_error(writer, 500, keep_alive=False)
+                except ConnectionError:
+                    pass
+        finally:
+            self.responding.discard(writer)
+            writer.close()
+
+    async def handle_request(self, reader, writer):
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+        self.responding.discard(writer)
+        async with self.active:
+            return await self.answer(head, writer)
+
+    async def answer(self, head, writer):
+        request = parse_request(head)
+        if request is None:
+            await self.send_error(writer, 400, keep_alive=False)
+            return False
+        if 'content-length' in request.headers or 'transfer-encoding' in request.headers:
+            # Static server: request bodies are never expected
+            await self.send_error(writer, 400, keep_alive=False)
+            return False
+
+        if request.method not in ('GET', 'HEAD'):
+            await self.send_error(writer, 405, request.keep_alive, {'Allow': 'GET, HEAD'})
+        else:
+            await self.send_asset(request, writer)
+        return request.keep_alive
+
+    def start_response(self, writer, status, headers, keep_alive, body=b''):
+        # Header and body go out in a single write; two small segments in a
+        # row run into delayed-ACK stalls on keep-alive connections
+        lines = ['HTTP/1.1 %d %s' % (status, REASONS.get(status, '')),
+                 'Date: ' + self.date.now(),
+                 'Server: ' + SERVER_NAME]
+        if not keep_alive:
+            lines.append('Connection: close')
+        lines.extend('%s: %s' % item for item in headers.items())
+        self.responding.add(writer)
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+
+    async def send_error(self, writer, status, keep_alive=True, headers=None):
+        body = ('%d %s\n' % (status, REASONS[status])).encode()
+        headers = dict(headers or {}, **{'Content-Type': 'text/plain', 'Content-Length': str(len(body))})
+        self.start_response(writer, status, headers, keep_alive, body)
+        await writer.drain()
+
+    async def send_asset(self, request, writer):
+        path = 'index.html' if request.path == '/' else request.path.lstrip('/')
+        asset = self.index.get(path)
+        if asset is None:
+            await self.send_error(writer, 404, request.keep_alive)
+            return
+
+        range_header = request.headers.get('range')
+        # Ranges address the identity bytes, so partial requests skip compression
+        accept_encoding = None if range_header else request.headers.get('accept-encoding')
+        encoding, body, file_path = self.index.representation(asset, accept_encoding)
+        headers = cache_headers(asset, is_versioned(path, request.query), encoding)
+        if is_not_modified(asset, request.headers.get('if-none-match'),
+                           request.headers.get('if-modified-since'), headers['ETag']):
+            self.start_response(writer, 304, headers, request.keep_alive)
+            await writer.drain()
+            return
+
+        status, ranges = plan_ranges(asset, range_header, request.headers.get('if-range'))
+        if status == 416:
+            headers.update(unsatisfiable_headers(asset))
+            self.start_response(writer, 416, headers, request.keep_alive)
+            await writer.drain()
+            return
+        if status == 206:
+            await self.send_ranges(request, writer, asset, ranges, headers, body, file_path)
+            return
+
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        headers['Content-Type'] = asset.content_type
+        if body is not None:
+            headers['Content-Length'] = str(len(body))
+            self.start_response(writer, 200, headers, request.keep_alive, body if request.method == 'GET' else b'')
+            await writer.drain()
+            return
+
+        with open(file_path, 'rb') as f:
+            headers['Content-Length'] = str(os.fstat(f.fileno()).st_size)
+            self.start_response(writer, 200, headers, request.keep_alive)
+            await writer.drain()
+            if request.method == 'GET':
+                await asyncio.get_running_loop().sendfile(writer.transport, f)
+
+    async def send_ranges(self, request, writer, asset, ranges, headers, body, file_path):
+        range_headers, parts, trailer = range_layout(asset, ranges, secrets.token_hex(12))
+        headers.update(range_headers)
+        self.start_response(writer, 206, headers, request.keep_alive)
+        if request.method != 'GET':
+            await writer.drain()
+            return
+        if body is not None:
+            for head, start, end in parts:
+                writer.write(head + body[start:end + 1])
+                await writer.drain()
+            writer.write(trailer)
+            await writer.drain()
+            return
+        loop = asyncio.get_running_loop()
+        with open(file_path, 'rb') as f:
+            for head, start, end in parts:
+                writer.write(head)
+                await writer.drain()
+                await loop.sendfile(writer.transport, f, start, end - start + 1)
+            writer.write(trailer)
+            await writer.drain()
+
+
+async def run_worker(sock, index, max_connections):
+    server = AssetServer(index, max_connections)
+    listener = await asyncio.start_server(server.handle_connection, sock=sock, limit=MAX_HEADER_BYTES)
+    async with listener:
+        await listener.serve_forever()
+
+
+def worker_main(sock, index, max_connections):
+    try:
+        asyncio.run(run_worker(sock, index, max_connections))
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(root, host='0.0.0.0', port=8000, workers=1, max_connections=256, warm=()):
+    sock = socket.create_server((host, port), backlog=1024)
+    sock.setblocking(False)
+
+    index = AssetIndex(root)
+    # Hash before forking so every worker shares the warm pages copy-on-write
+    index.warm(warm)
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        print('Serving %s on http://%s:%d (1 worker)' % (root, host, port))
+        worker_main(sock, index, max_connections)
+        return
+
+    # Flush before forking or every worker repeats the buffered output
+    print('Serving %s on http://%s:%d (%d workers, %d requests at once each)' % (root, host, port, workers, max_connections),
+          flush=True)
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            worker_main(sock, index, max_connections)
+            os._exit(0)
+        children.append(pid)
+    sock.close()
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the whole process group; just reap the workers
+        stop(signal.SIGINT, None)
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
@@ -0,0 +1,236 @@
+import argparse
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+try:
+    import sounddevice
+except ImportError:  # Optional: without it the synth falls back to the null backend
+    sounddevice = None
+
+# Continuous, callback-driven sine synth for advanced_blob_trigger.py. One
+# output stream stays open; each callback renders a block with NumPy and
+# glides frequency/volume towards the latest targets. The vision thread hands
+# over targets by plain attribute stores (atomic under the GIL), so the audio
+# callback never takes a lock.
+
+SAMPLE_RATE = 48000
+BLOCK_SIZE = 256  # 5.3 ms at 48 kHz
+
+
+class StreamingSynth:
+    def __init__(self, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE, glide=0.03, volume=0.3):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.volume = volume
+        # Targets written by any thread, read once per block by the callback
+        self.target_frequency = 440.0
+        self.target_amplitude = 0.0
+        # Callback-private state
+        self._frequency = self.target_frequency
+        self._amplitude = 0.0
+        self._phase = 0.0
+        # One-pole glide coefficient per block (time constant `glide` seconds)
+        self._glide_step = 1.0 - np.exp(-block_size / (glide * sample_rate))
+        self._allocate(block_size)
+        self.blocks_rendered = 0
+
+    def _allocate(self, frames):
+        self._ramp = np.arange(1, frames + 1, dtype=np.float64) / frames
+        self._buffer = np.empty(frames, dtype=np.float64)
+
+    def set_tone(self, frequency):
+        # None fades the tone out instead of cutting it (no clicks)
+        if frequency is None:
+            self.target_amplitude = 0.0
+        else:
+            self.target_frequency = float(frequency)
+            self.target_amplitude = 1.0
+
+    def render(self, out):
+        # Fills out (frames, channels) float32 in place
+        frames = len(out)
+        if frames != len(self._ramp):
+            self._allocate(frames)
+        ramp, buf = self._ramp, self._buffer
+
+        # Glide this block's end values towards the targets, then interpolate
+        # linearly across the block so there are no steps at block borders
+        start_freq, start_amp = self._frequency, self._amplitude
+        end_freq = start_freq + (self.target_frequency - start_freq) * self._glide_step
+        end_amp = start_amp + (self.target_amplitude - start_amp) * self._glide_step
+        self._frequency, self._amplitude = end_freq, end_amp
+
+        # Phase accumulator: integrate the per-sample frequency
+        np.multiply(ramp, end_freq - start_freq, out=buf)
+        buf += start_freq
+        buf *= 2 * np.pi / self.sample_rate
+        np.cumsum(buf, out=buf)
+        buf += self._phase
+        self._phase = float(buf[-1] % (2 * np.pi))
+        np.sin(buf, out=buf)
+
+        # Amplitude envelope
+        buf *= start_amp + (end_amp - start_amp) * ramp
+        buf *= self.volume
+        out[:] = buf[:, None]
+        self.blocks_rendered += 1
+
+
+class SoundDeviceBackend:
+    def __init__(self, synth, channels=1, latency="low"):
+        self.synth = synth
+        self.stream = sounddevice.OutputStream(
+            samplerate=synth.sample_rate, blocksize=synth.block_size, channels=channels,
+            dtype="float32", latency=latency, callback=self._callback)
+
+    def _callback(self, outdata, frames, time_info, status):
+        self.synth.render(outdata)
+
+    @property
+    def latency(self):
+        return self.stream.latency
+
+    @property
+    def alive(self):
+        # False once the stream stops, e.g. after an error in the callback
+        return self.stream.active
+
+    def start(self):
+        self.stream.start()
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+class SilentBackend:
+    # No audio device: nothing renders, set_tone() just updates the targets
+    latency = 0.0
+
+    def __init__(self, synth):
+        self.synth = synth
+        self.alive = False
+
+    def start(self):
+        self.alive = True
+
+    def close(self):
+        self.alive = False
+
+
+class NullBackend:
+    # Drives the callback from a thread, paced like a sound card (or as fast
+    # as possible with realtime=False) and throws the samples away. Lets the
+    # synth run and be measured on machines without audio hardware; with
+    # record=True every block's render time is kept in render_times.
+    def __init__(self, synth, channels=1, realtime=True, record=False):
+        self.synth = synth
+        self.realtime = realtime
+        self.out = np.zeros((synth.block_size, channels), dtype=np.float32)
+        self.render_times = [] if record else None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="audio", daemon=True)
+        self.latency = synth.block_size / synth.sample_rate
+
+    def _run(self):
+        interval = self.synth.block_size / self.synth.sample_rate
+        deadline = time.perf_counter()
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            self.synth.render(self.out)
+            self.consume(self.out)
+            if self.render_times is not None:
+                self.render_times.append(time.perf_counter() - start)
+            if self.realtime:
+                deadline += interval
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def consume(self, block):
+        pass
+
+    @property
+    def alive(self):
+        # False once the render thread ends, after close() or an error
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+class WaveFileBackend(NullBackend):
+    # Like the null backend, but records the output as 16-bit PCM
+    def __init__(self, synth, path, channels=1, realtime=True, record=False):
+        super().__init__(synth, channels, realtime, record)
+        self.wav = wave.open(path, "wb")
+        self.wav.setnchannels(channels)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(synth.sample_rate)
+
+    def consume(self, block):
+        self.wav.writeframes((np.clip(block, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+
+    def close(self):
+        super().close()
+        self.wav.close()
+
+
+def open_backend(synth, kind="auto", path=None, realtime=True, record=False):
+    # auto: the sound card, or silence when sounddevice isn't installed
+    if kind == "auto":
+        kind = "sounddevice" if sounddevice is not None else "silent"
+    if kind == "sounddevice":
+        return SoundDeviceBackend(synth)
+    if kind == "silent":
+        return SilentBackend(synth)
+    if kind == "wav":
+        return WaveFileBackend(synth, path or "synth.wav", realtime=realtime, record=record)
+    return NullBackend(synth, realtime=realtime, record=record)
+
+
+def main():
+    # Headless check: render a hand-like frequency sweep and report how much
+    # of each block's time budget rendering takes
+    parser = argparse.ArgumentParser(description="Benchmark the streaming synth without audio hardware")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--wav", help="also record the sweep to this file")
+    args = parser.parse_args()
+
+    synth = StreamingSynth(block_size=args.block_size)
+    backend = open_backend(synth, "wav" if args.wav else "null", args.wav, realtime=False, record=True)
+    start = time.perf_counter()
+    backend.start()
+    blocks = int(args.seconds * synth.sample_rate / synth.block_size)
+    while synth.blocks_rendered < blocks:
+        if not backend.alive:
+            # The audio thread died (its traceback is already printed); don't wait on it forever
+            backend.close()
+            sys.exit("audio thread stopped after %d of %d blocks" % (synth.blocks_rendered, blocks))
+        # Sweep 200-1000 Hz like the y-position mapping, with a gap mid-way
+        t = synth.blocks_rendered * synth.block_size / synth.sample_rate
+        synth.set_tone(None if 0.45 < (t % 2) / 2 < 0.55 else 600 + 400 * np.sin(t * 2))
+        time.sleep(0)
+    backend.close()
+    elapsed = time.perf_counter() - start
+
+    renders = np.asarray(backend.render_times) * 1e6
+    budget = synth.block_size / synth.sample_rate * 1e6
+    print("rendered %.1f s of audio in %.3f s (%.0fx real time)" % (args.seconds, elapsed, args.seconds / elapsed))
+    print("block %d frames = %.0f us budget; render mean %.1f us, p99 %.1f us (%.1f%% of budget)" % (
+        synth.block_size, budget, renders.mean(), np.percentile(renders, 99), 100 * renders.mean() / budget))
+    print("control-to-sound latency ~ %.1f ms (one block) + output device latency" % (budget / 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from frame_source import open_source
+from perf_metrics import StageTimer
+
+# Headless benchmark for the webcam apps' processing paths. Pushes N frames
+# from a recording or the synthetic source through each app and reports
+# per-stage timings, throughput and memory. Needs no camera and no display:
+#
+#   python bench_pipeline.py --source synthetic:1280x720 --frames 300
+#   python bench_pipeline.py --source clip.mp4 --apps blob glitch --json bench.json
+
+WARMUP_FRAMES = 10
+
+
+def make_blob(timer, args):
+    from blob_detector import BlobDetector
+    detector = BlobDetector()
+    detector.timer = timer
+    # Slider defaults from blob_trigger.py
+    params = {"threshold": 50, "blur_size": 5, "blob_size": 20, "multi": args.multi, "scale": args.scale}
+
+    def process(frame):
+        # Done with the result at once, like a GUI that keeps up
+        result = detector.process(frame, params)
+        if result is not None:
+            detector.release(result)
+        return result
+    return process, None
+
+
+def make_pose(timer, args):
+    from pose_tracker import PoseTracker
+    tracker = PoseTracker()
+    tracker.timer = timer
+    return tracker.process, tracker.close
+
+
+def make_glitch(timer, args):
+    from cybernetic_glitch_feed import GlitchPipeline, default_params
+    pipeline = GlitchPipeline()
+    pipeline.timer = timer
+    params = default_params()
+    return lambda frame: pipeline.process(frame, params), None
+
+
+def make_glitch_parallel(timer, args):
+    from cybernetic_glitch_feed import default_params
+    from glitch_parallel import ParallelGlitchPipeline
+    pipeline = ParallelGlitchPipeline(args.workers)
+    pipeline.timer = timer
+    params = default_params()
+    return lambda frame: pipeline.process(frame, params), pipeline.close
+
+
+def make_glitch_reference(timer, args):
+    # The original one-function-per-effect chain, for comparison
+    from cybernetic_glitch_feed import apply_effects, default_params
+    params = default_params()
+    return lambda frame: apply_effects(frame, params, timer), None
+
+
+APPS = {
+    "blob": make_blob,
+    "pose": make_pose,
+    "glitch": make_glitch,
+    "glitch_parallel": make_glitch_parallel,
+    "glitch_reference": make_glitch_reference,
+}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(samples, skip):
+    values = np.asarray(samples[skip:] or samples) * 1000
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "max_ms": float(values.max()),
+    }
+
+
+def bench_app(name, args):
+    timer = StageTimer()
+    try:
+        process, close = APPS[name](timer, args)
+    except ImportError as exc:
+        return {"app": name, "skipped": str(exc)}
+
+    source = open_source(args.source, realtime=False)
+    if not source.isOpened():
+        raise SystemExit("Cannot open video source %r" % args.source)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    frame_times = []
+    try:
+        for _ in range(args.frames + WARMUP_FRAMES):
+            start = time.perf_counter()
+            with timer.stage("capture"):
+                ret, frame = source.read()
+            if not ret:
+                break
+            process(frame)
+            frame_times.append(time.perf_counter() - start)
+    finally:
+        source.release()
+        if close is not None:
+            close()
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+    if args.trace_memory:
+        tracemalloc.stop()
+
+    measured = frame_times[WARMUP_FRAMES:] or frame_times
+    result = {
+        "app": name,
+        "frames": len(measured),
+        "fps": len(measured) / sum(measured),
+        "frame": summarize(frame_times, WARMUP_FRAMES),
+        "stages": {stage: summarize(samples, WARMUP_FRAMES) for stage, samples in timer.samples.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if traced_peak is not None:
+        result["traced_peak_mb"] = traced_peak / 1024 / 1024
+    return result
+
+
+def print_result(result):
+    if "skipped" in result:
+        print("\n== %s: skipped (%s)" % (result["app"], result["skipped"]))
+        return
+    print("\n== %s: %d frames, %.1f fps, peak RSS %.0f MB%s" % (
+        result["app"], result["frames"], result["fps"], result["peak_rss_mb"],
+        ", traced peak %.1f MB" % result["traced_peak_mb"] if "traced_peak_mb" in result else ""))
+    print("%-14s %9s %9s %9s %9s" % ("stage", "mean ms", "p50 ms", "p95 ms", "max ms"))
+    for stage, stats in list(result["stages"].items()) + [("total", result["frame"])]:
+        print("%-14s %9.2f %9.2f %9.2f %9.2f" % (stage, stats["mean_ms"], stats["p50_ms"], stats["p95_ms"],
+                                                 stats["max_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmark for the webcam apps")
+    parser.add_argument("--source", default="synthetic", help="video file or synthetic[:WxH]")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--apps", nargs="+", choices=list(APPS), default=["blob", "pose", "glitch"])
+    parser.add_argument("--scale", type=float, default=1.0, help="blob detection scale (1, 0.5, 0.25)")
+    parser.add_argument("--multi", action="store_true", help="blob multi-target mode")
+    parser.add_argument("--workers", type=int, default=4, help="glitch_parallel worker processes")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="track Python/NumPy allocation peak (slows processing down)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.apps:
+        result = bench_app(name, args)
+        print_result(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"source": args.source, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
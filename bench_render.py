@@ -0,0 +1,135 @@
+import argparse
+import time
+
+import numpy as np
+
+from gl_offscreen import OffscreenContext  # first: selects the headless GL platform
+
+from OpenGL.GL import *  # noqa: E402
+from gl_batch import BlobRenderer  # noqa: E402
+from particle_engine import ParticleSystem  # noqa: E402
+
+# Headless FPS benchmark for the advanced_blob_trigger.py GL effects. Renders
+# a hand moving in a circle into an offscreen EGL surface, with the batched
+# VBO renderer and with the old immediate-mode code for comparison:
+#
+#   python bench_render.py --effects glow particles --trail 500 --particles 50000
+#
+# Each frame ends with glFinish, so the timing covers the GPU work too. The
+# particles effect also steps the simulation, as the app does every frame.
+
+WIDTH, HEIGHT = 640, 480
+
+
+class ImmediateRenderer(BlobRenderer):
+    # The glBegin/glEnd drawing GLWidget used before gl_batch.py, kept only
+    # as the benchmark baseline
+    def paint(self, blob_pos, prev_pos, blob_size, effect_type, particles=None):
+        glClear(GL_COLOR_BUFFER_BIT)
+        glLoadIdentity()
+        glColor3f(1.0, 1.0, 1.0)
+        glBegin(GL_LINES)
+        glVertex2f(320, 0)
+        glVertex2f(320, 480)
+        glEnd()
+        if effect_type == "particles":
+            glPointSize(5)
+            alpha = particles.alpha()
+            for i in range(particles.count):
+                glColor4f(*particles.color[i], alpha[i])
+                glBegin(GL_POINTS)
+                glVertex2f(*particles.pos[i])
+                glEnd()
+            return
+        if not blob_pos:
+            return
+        x, y = blob_pos
+        if effect_type == "glow":
+            for i, pos in enumerate(prev_pos):
+                alpha = 1.0 - (i / len(prev_pos))
+                glColor4f(1.0, 0.5, 0.0, alpha)
+                glBegin(GL_QUADS)
+                r = blob_size * (1 - i / len(prev_pos))
+                px, py = pos
+                glVertex2f(px - r, py - r)
+                glVertex2f(px + r, py - r)
+                glVertex2f(px + r, py + r)
+                glVertex2f(px - r, py + r)
+                glEnd()
+        else:
+            r = blob_size / 2
+            glColor3f(0.0, 1.0, 1.0)
+            glBegin(GL_QUADS)
+            glVertex2f(x - r, y - r)
+            glVertex2f(x + r, y - r)
+            glVertex2f(x + r, y + r)
+            glVertex2f(x - r, y + r)
+            glEnd()
+
+
+RENDERERS = {
+    "batched": BlobRenderer,
+    "immediate": ImmediateRenderer,
+}
+
+
+def hand_path(frame):
+    t = frame / 60.0
+    return (int(320 + 200 * np.cos(t * 2)), int(240 + 150 * np.sin(t * 3)))
+
+
+def bench(renderer_name, effect, args):
+    renderer = RENDERERS[renderer_name]()
+    renderer.initialize()
+    renderer.resize(WIDTH, HEIGHT)
+    blob_size = 80 if effect == "glow" else 30
+
+    # Pre-fill the trail so every measured frame draws the full length
+    trail = [hand_path(i) for i in range(args.trail)]
+    particles = ParticleSystem(args.particles, gravity=(0.0, 400.0), seed=0)
+    dt = 1 / 60.0
+    frame_times = []
+    for frame in range(args.frames):
+        start = time.perf_counter()
+        blob_pos = hand_path(args.trail + frame)
+        trail.append(blob_pos)
+        del trail[:-args.trail]
+        if effect == "particles":
+            # Same emission as the app: enough to keep the pool full
+            particles.burst(blob_pos, args.particles * dt, (blob_size, 4 * blob_size), (0.6, 1.4),
+                            (0.0, 1.0, 0.0), spread=blob_size / 4)
+            particles.update(dt)
+        renderer.paint(blob_pos, trail, blob_size, effect, particles)
+        glFinish()
+        frame_times.append(time.perf_counter() - start)
+    renderer.delete()
+
+    times = np.asarray(frame_times[10:] or frame_times) * 1000
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offscreen FPS benchmark for the blob GL effects")
+    parser.add_argument("--renderers", nargs="+", choices=list(RENDERERS), default=list(RENDERERS))
+    parser.add_argument("--effects", nargs="+", choices=["default", "glow", "particles"],
+                        default=["glow", "particles"])
+    parser.add_argument("--trail", type=int, default=50, help="glow trail length")
+    parser.add_argument("--particles", type=int, default=50000, help="particle pool size")
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    context = OffscreenContext(WIDTH, HEIGHT)
+    print("GL renderer: %s" % glGetString(GL_RENDERER).decode())
+    print("%-10s %-10s %9s %9s %9s" % ("renderer", "effect", "fps", "p50 ms", "p99 ms"))
+    try:
+        for effect in args.effects:
+            for name in args.renderers:
+                times = bench(name, effect, args)
+                print("%-10s %-10s %9.0f %9.2f %9.2f" % (name, effect, 1000 / times.mean(),
+                                                          np.percentile(times, 50), np.percentile(times, 99)))
+    finally:
+        context.close()
+
+
+if __name__ == "__main__":
+    main()
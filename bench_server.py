@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# Local load generator for server.py. Opens N keep-alive connections per page
+# and reports requests/sec and p50/p99 latency, either against a running
+# server (--url) or against engines it starts itself (--engines).
+#
+#   python bench_server.py --engines flask,production,asyncio --concurrency 32 --duration 10
+
+PAGES = ['virtualPark.html', 'worldmemory.html', 'parkrpg.html', 'parkVR.html', 'index.html']
+
+ENGINE_ARGS = {
+    'flask': [],  # the old debug=True path, reloader and all
+    'production': ['--production'],
+    'asyncio': ['--engine', 'asyncio'],
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head[9:12])
+    length = 0
+    chunked = False
+    close = False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding' and b'chunked' in value.lower():
+            chunked = True
+        elif name == b'connection' and value.strip().lower() == b'close':
+            close = True
+    body_bytes = 0
+    if chunked:
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            body_bytes += size
+            if size == 0:
+                break
+    elif status != 304 and length:
+        await reader.readexactly(length)
+        body_bytes = length
+    return status, body_bytes, close
+
+
+async def client(host, port, request, deadline, latencies, stats):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            writer.write(request)
+            status, body_bytes, close = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            stats['bytes'] += body_bytes
+            if status >= 400:
+                stats['errors'] += 1
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            stats['errors'] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def bench_page(host, port, page, concurrency, duration, headers):
+    extra = ''.join('%s: %s\r\n' % h for h in headers)
+    request = ('GET /%s HTTP/1.1\r\nHost: %s:%d\r\n%s\r\n' % (page, host, port, extra)).encode('latin-1')
+    latencies = []
+    stats = {'bytes': 0, 'errors': 0}
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(client(host, port, request, deadline, latencies, stats) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'page': page,
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'kb_per_req': stats['bytes'] / max(1, len(latencies)) / 1024,
+        'errors': stats['errors'],
+    }
+
+
+def print_results(label, results):
+    print('\n== %s' % label)
+    print('%-20s %9s %10s %9s %9s %10s %7s' % ('page', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'KB/req', 'errors'))
+    for r in results:
+        print('%-20s %9d %10.1f %9.2f %9.2f %10.1f %7d' % (
+            r['page'], r['requests'], r['rps'], r['p50'], r['p99'], r['kb_per_req'], r['errors']))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def start_engine(engine, port, workers):
+    root = os.path.dirname(os.path.abspath(__file__))
+    cmd = [sys.executable, os.path.join(root, 'server.py'), '--host', '127.0.0.1', '--port', str(port)]
+    cmd += ENGINE_ARGS[engine]
+    if engine == 'asyncio':
+        cmd += ['--workers', str(workers)]
+    return subprocess.Popen(cmd, cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def run(host, port, args, headers):
+    return [asyncio.run(bench_page(host, port, page, args.concurrency, args.duration, headers))
+            for page in args.pages]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test server.py engines')
+    parser.add_argument('--url', help='benchmark an already running server, e.g. http://127.0.0.1:8000')
+    parser.add_argument('--engines', default='flask,asyncio',
+                        help='comma separated engines to start and compare: ' + ', '.join(ENGINE_ARGS))
+    parser.add_argument('--pages', nargs='+', default=PAGES)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per page')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--gzip', action='store_true', help='send Accept-Encoding: gzip, br')
+    args = parser.parse_args()
+
+    headers = [('Accept-Encoding', 'gzip, br')] if args.gzip else []
+
+    if args.url:
+        hostport = args.url.split('://', 1)[-1].rstrip('/')
+        host, _, port = hostport.partition(':')
+        print_results(args.url, run(host, int(port or 80), args, headers))
+        return
+
+    for engine in args.engines.split(','):
+        port = free_port()
+        proc = start_engine(engine, port, args.workers)
+        try:
+            if not wait_for_port(port):
+                print('\n== %s: server did not start' % engine)
+                continue
+            print_results('%s (concurrency %d)' % (engine, args.concurrency), run('127.0.0.1', port, args, headers))
+        finally:
+            # The debug reloader and the asyncio workers live in their own group
+            os.killpg(proc.pid, 15)
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+from collections import deque
+
+import cv2
+import numpy as np
+
+from perf_metrics import NULL_TIMER
+
+# Motion blob detection for blob_trigger.py, kept free of Qt so it can run
+# on a worker thread (and without a display at all)
+
+FRAME_WIDTH, FRAME_HEIGHT = 640, 480
+MIN_BLOB_AREA = 500
+# Band around the vertical trigger line at x=320, as (x, y, w, h)
+TRIGGER_ZONE = (240, 0, 160, 480)
+
+
+# Colors cycled by track ID in multi-target mode (RGB, like the blob pane)
+TRACK_COLORS = [(0, 255, 255), (255, 0, 255), (255, 255, 0), (0, 255, 0),
+                (255, 128, 0), (0, 128, 255), (255, 0, 0), (128, 255, 128)]
+
+
+class BlobResult:
+    __slots__ = ('frame', 'blob_frame', 'blobs')
+
+    def __init__(self, frame, blob_frame, blobs):
+        self.frame = frame  # BGR, shown without conversion
+        self.blob_frame = blob_frame  # RGB
+        self.blobs = blobs  # [(track_id, cx, cy), ...]
+
+
+def find_blobs(thresh, min_area=MIN_BLOB_AREA):
+    # One vectorized pass: areas and centroids for every blob at once,
+    # instead of contourArea/moments per contour
+    _, _, stats, centroids = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+    areas = stats[1:, cv2.CC_STAT_AREA]  # Label 0 is the background
+    keep = areas > min_area
+    return centroids[1:][keep], areas[keep]
+
+
+class BlobTracker:
+    # Greedy nearest-neighbour assignment: with the handful of people in
+    # frame this matches what Hungarian would pick at a fraction of the cost
+    def __init__(self, max_distance=80.0, max_missed=5):
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.next_id = 1
+        self.ids = np.empty(0, dtype=np.int64)
+        self.positions = np.empty((0, 2), dtype=np.float64)
+        self.missed = np.empty(0, dtype=np.int64)
+
+    def update(self, centroids):
+        n_tracks, n_blobs = len(self.ids), len(centroids)
+        blob_ids = np.zeros(n_blobs, dtype=np.int64)
+        matched = np.zeros(n_tracks, dtype=bool)
+
+        if n_tracks and n_blobs:
+            dist = np.linalg.norm(self.positions[:, None, :] - centroids[None, :, :], axis=2)
+            for flat in np.argsort(dist, axis=None):
+                track, blob = divmod(int(flat), n_blobs)
+                if dist[track, blob] > self.max_distance:
+                    break
+                if matched[track] or blob_ids[blob]:
+                    continue
+                matched[track] = True
+                blob_ids[blob] = self.ids[track]
+                self.positions[track] = centroids[blob]
+
+        # Tracks that went unseen for too long are retired
+        self.missed = np.where(matched, 0, self.missed + 1)
+        alive = self.missed <= self.max_missed
+        self.ids, self.positions, self.missed = self.ids[alive], self.positions[alive], self.missed[alive]
+
+        # Unmatched blobs start new tracks
+        new = blob_ids == 0
+        if new.any():
+            new_ids = np.arange(self.next_id, self.next_id + new.sum())
+            self.next_id += len(new_ids)
+            blob_ids[new] = new_ids
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.positions = np.concatenate([self.positions, centroids[new]])
+            self.missed = np.concatenate([self.missed, np.zeros(len(new_ids), dtype=np.int64)])
+
+        return [(int(track_id), int(cx), int(cy)) for track_id, (cx, cy) in zip(blob_ids, centroids)]
+
+
+class BlobDetector:
+    # Buffers are allocated once per processing size and reused every frame.
+    # Display frames come from a small pool: a result's buffers are not
+    # written again until the consumer hands them back with release(). With
+    # none free (the GUI fell behind) the frame is dropped instead of
+    # overwriting one that may still be on screen. Three covers the frame
+    # shown, the one waiting for the GUI and the one being processed.
+    def __init__(self, pool_size=3):
+        # Background for motion detection
+        self.background = None
+        self.tracker = BlobTracker()
+        self._detect_key = None
+        # deque append/popleft are atomic: release() may come from the GUI thread
+        self._free = deque((np.empty((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8),
+                            np.empty((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)) for _ in range(pool_size))
+        self.dropped = 0
+        self._canvas_rois = False
+        self._canvas = None
+        self.timer = NULL_TIMER
+
+    def _allocate(self, key, rois, scale):
+        x0, y0, x1, y1, sw, sh = key
+        self._detect_key = key
+        self.background = None  # Different geometry: start a fresh background
+        self.small_bgr = np.empty((sh, sw, 3), dtype=np.uint8)
+        self.small = np.empty((sh, sw), dtype=np.uint8)
+        self.bg_u8 = np.empty((sh, sw), dtype=np.uint8)
+        self.diff = np.empty((sh, sw), dtype=np.uint8)
+        self.blur = np.empty((sh, sw), dtype=np.uint8)
+        self.thresh = np.empty((sh, sw), dtype=np.uint8)
+        # Several zones share one crop (their bounding box); pixels between
+        # the zones are masked out after thresholding
+        self.mask = None
+        if rois and len(rois) > 1:
+            self.mask = np.zeros((sh, sw), dtype=np.uint8)
+            for x, y, w, h in rois:
+                self.mask[int((y - y0) * scale):int(np.ceil((y + h - y0) * scale)),
+                          int((x - x0) * scale):int(np.ceil((x + w - x0) * scale))] = 255
+
+    def detect(self, frame, threshold, blur_size, multi=False, scale=1.0, rois=None):
+        # Only the bounding box of the trigger zones is processed
+        if rois:
+            x0 = max(0, min(x for x, _, _, _ in rois))
+            y0 = max(0, min(y for _, y, _, _ in rois))
+            x1 = min(FRAME_WIDTH, max(x + w for x, _, w, _ in rois))
+            y1 = min(FRAME_HEIGHT, max(y + h for _, y, _, h in rois))
+        else:
+            x0, y0, x1, y1 = 0, 0, FRAME_WIDTH, FRAME_HEIGHT
+        sw, sh = max(1, round((x1 - x0) * scale)), max(1, round((y1 - y0) * scale))
+        key = (x0, y0, x1, y1, sw, sh)
+        if key != self._detect_key:
+            self._allocate(key, rois, scale)
+
+        with self.timer.stage("motion"):
+            crop = frame[y0:y1, x0:x1]
+            if scale != 1.0:
+                # Downscale first so the gray conversion only touches the small image
+                cv2.resize(crop, (sw, sh), dst=self.small_bgr, interpolation=cv2.INTER_AREA)
+                crop = self.small_bgr
+            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY, dst=self.small)
+
+            # Initialize background
+            if self.background is None:
+                self.background = gray.astype(np.float32)
+                return None
+
+            # Motion detection; the blur kernel shrinks with the image
+            cv2.accumulateWeighted(gray, self.background, 0.5)
+            cv2.convertScaleAbs(self.background, dst=self.bg_u8)
+            diff = cv2.absdiff(gray, self.bg_u8, dst=self.diff)
+            blur_size = max(1, int(blur_size * scale)) | 1
+            blur = cv2.GaussianBlur(diff, (blur_size, blur_size), 0, dst=self.blur) if blur_size > 1 else diff
+            _, thresh = cv2.threshold(blur, threshold, 255, cv2.THRESH_BINARY, dst=self.thresh)
+            if self.mask is not None:
+                cv2.bitwise_and(thresh, self.mask, dst=thresh)
+
+        # Blob detection at the processing scale, mapped back to display
+        # pixels; the area threshold scales with the pixel count
+        with self.timer.stage("blobs"):
+            centroids, areas = find_blobs(thresh, MIN_BLOB_AREA * scale * scale)
+            if not multi and len(areas):
+                largest = int(np.argmax(areas))
+                centroids = centroids[largest:largest + 1]
+            centroids = (centroids + 0.5) / scale - 0.5 + (x0, y0)
+            return self.tracker.update(centroids)
+
+    def _blank_canvas(self, rois):
+        # Static background of the blob pane, redrawn only when zones change
+        if self._canvas is None or self._canvas_rois != rois:
+            canvas = np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+            for x, y, w, h in rois or ():
+                cv2.rectangle(canvas, (x, y), (x + w - 1, y + h - 1), (60, 60, 60), 1)
+            cv2.line(canvas, (320, 0), (320, 480), (255, 255, 255), 2)  # Vertical line
+            self._canvas, self._canvas_rois = canvas, rois
+        return self._canvas
+
+    def release(self, result):
+        # The consumer is done showing result; its buffers can be reused
+        self._free.append((result.frame, result.blob_frame))
+
+    def process(self, frame, params):
+        try:
+            frame_buf, blob_frame = self._free.popleft()
+        except IndexError:
+            self.dropped += 1
+            return None
+
+        # Resize frame to match display
+        with self.timer.stage("resize"):
+            cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT), dst=frame_buf)
+        frame = frame_buf
+        multi = params.get("multi", False)
+        rois = params.get("rois")
+        blobs = self.detect(frame, params["threshold"], params["blur_size"] | 1, multi,  # Ensure odd blur
+                            params.get("scale", 1.0), rois)
+        if blobs is None:
+            self._free.append((frame_buf, blob_frame))
+            return None
+
+        with self.timer.stage("draw"):
+            np.copyto(blob_frame, self._blank_canvas(rois))
+            for track_id, cx, cy in blobs:
+                if multi:
+                    color = TRACK_COLORS[track_id % len(TRACK_COLORS)]
+                    cv2.circle(blob_frame, (cx, cy), params["blob_size"], color, -1)
+                    cv2.putText(blob_frame, str(track_id), (cx - 6, cy + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                                (0, 0, 0), 2)
+                else:
+                    cv2.circle(blob_frame, (cx, cy), params["blob_size"], (0, 255, 255), -1)  # Yellow blob
+
+        # The resized frame is displayed as BGR (frame_view.py), no conversion
+        return BlobResult(frame, blob_frame, blobs)
@@ -1,34 +1,42 @@
-import cv2
-import numpy as np
-from PyQt5 import QtWidgets, QtGui, QtCore
+from PyQt5 import QtWidgets, QtCore
+import argparse
 import sys
 
+from blob_detector import TRIGGER_ZONE, BlobDetector
+from frame_source import open_source
+from frame_pipeline import CaptureThread, FrameQueue, LatestValue, ProcessingWorker, SharedParams
+from frame_view import FrameView
+from perf_metrics import NULL_TIMER, start_metrics
+from video_broadcast import FramePublisher
+
 class BlobTriggerApp(QtWidgets.QMainWindow):
-    def __init__(self):
+    # Emitted from the processing thread; Qt queues it onto the GUI thread
+    result_ready = QtCore.pyqtSignal()
+
+    def __init__(self, source=0, metrics=None, broadcast=None):
         super().__init__()
         self.setWindowTitle("Blob Trigger Interactive")
         self.setGeometry(100, 100, 1280, 720)
 
-        # Video capture
-        self.cap = cv2.VideoCapture(0)  # Use default webcam
+        # Video capture (default webcam, a recording or a synthetic feed)
+        self.cap = open_source(source)
         if not self.cap.isOpened():
-            raise RuntimeError("Cannot open webcam")
+            raise RuntimeError("Cannot open video source %r" % source)
 
         # Widget setup
         self.central_widget = QtWidgets.QWidget()
         self.setCentralWidget(self.central_widget)
         self.layout = QtWidgets.QHBoxLayout(self.central_widget)
 
-        # Left: Video feed
-        self.video_label = QtWidgets.QLabel()
-        self.video_label.setFixedSize(640, 480)
-        self.layout.addWidget(self.video_label)
+        # Left: Video feed (BGR frames, painted without conversion)
+        self.video_view = FrameView()
+        self.video_view.setFixedSize(640, 480)
+        self.layout.addWidget(self.video_view)
 
         # Right: Blob effect
-        self.blob_label = QtWidgets.QLabel()
-        self.blob_label.setFixedSize(640, 480)
-        self.blob_label.setStyleSheet("background-color: black;")
-        self.layout.addWidget(self.blob_label)
+        self.blob_view = FrameView(stage="present_blob")
+        self.blob_view.setFixedSize(640, 480)
+        self.layout.addWidget(self.blob_view)
 
         # Controls
         self.controls_widget = QtWidgets.QWidget()
@@ -39,7 +47,7 @@ class BlobTriggerApp(QtWidgets.QMainWindow):
         self.threshold_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
         self.threshold_slider.setRange(10, 255)
         self.threshold_slider.setValue(50)
-        self.threshold_slider.valueChanged.connect(self.update_frame)
+        self.threshold_slider.valueChanged.connect(self.update_params)
         self.controls_layout.addWidget(QtWidgets.QLabel("Threshold"))
         self.controls_layout.addWidget(self.threshold_slider)
 
@@ -48,7 +56,7 @@ class BlobTriggerApp(QtWidgets.QMainWindow):
         self.blur_slider.setRange(1, 31)
         self.blur_slider.setValue(5)
         self.blur_slider.setSingleStep(2)
-        self.blur_slider.valueChanged.connect(self.update_frame)
+        self.blur_slider.valueChanged.connect(self.update_params)
         self.controls_layout.addWidget(QtWidgets.QLabel("Blur Size"))
         self.controls_layout.addWidget(self.blur_slider)
 
@@ -56,78 +64,121 @@ class BlobTriggerApp(QtWidgets.QMainWindow):
         self.blob_size_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
         self.blob_size_slider.setRange(5, 100)
         self.blob_size_slider.setValue(20)
-        self.blob_size_slider.valueChanged.connect(self.update_frame)
+        self.blob_size_slider.valueChanged.connect(self.update_params)
         self.controls_layout.addWidget(QtWidgets.QLabel("Blob Size"))
         self.controls_layout.addWidget(self.blob_size_slider)
 
-        # Background for motion detection
-        self.background = None
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update_frame)
-        self.timer.start(30)  # Update every ~33ms (~30 FPS)
-
-    def update_frame(self):
-        ret, frame = self.cap.read()
-        if not ret:
+        # Multi-target mode: every blob gets its own tracked ID
+        self.multi_checkbox = QtWidgets.QCheckBox("Track All Blobs")
+        self.multi_checkbox.toggled.connect(self.update_params)
+        self.controls_layout.addWidget(self.multi_checkbox)
+
+        # Detection runs at a fraction of the display resolution
+        self.scale_combo = QtWidgets.QComboBox()
+        self.scale_combo.addItems(["Full", "1/2", "1/4"])
+        self.scale_combo.currentIndexChanged.connect(self.update_params)
+        self.controls_layout.addWidget(QtWidgets.QLabel("Detection Scale"))
+        self.controls_layout.addWidget(self.scale_combo)
+
+        # Only look for motion around the vertical trigger line
+        self.zone_checkbox = QtWidgets.QCheckBox("Trigger Zone Only")
+        self.zone_checkbox.toggled.connect(self.update_params)
+        self.controls_layout.addWidget(self.zone_checkbox)
+
+        # Capture -> processing pipeline; the GUI thread only paints results
+        self.params = SharedParams()
+        self.update_params()
+        self.detector = BlobDetector()
+        self.frame_queue = FrameQueue(maxsize=2)
+        self.latest_result = LatestValue()
+        self.result_ready.connect(self.show_result)
+        # Live stage metrics (see perf_metrics.py); NULL_TIMER when off
+        self.metrics = metrics
+        timer = metrics or NULL_TIMER
+        self.detector.timer = timer
+        self.video_view.timer = self.blob_view.timer = timer
+        if metrics is not None:
+            metrics.watch("queue_dropped", lambda: self.frame_queue.dropped)
+            metrics.watch("buffers_dropped", lambda: self.detector.dropped)
+        self.shown_result = None  # Its buffers are on screen until the next one
+        self.timer = timer
+        # Blob pane for server.py --stream (see video_broadcast.py)
+        self.broadcast = broadcast
+        self.capture_thread = CaptureThread(self.cap, self.frame_queue, timer)
+        self.worker = ProcessingWorker(self.frame_queue, self.detector.process, self.params, self.publish_result,
+                                       timer, "inference")
+        self.capture_thread.start()
+        self.worker.start()
+
+    def update_params(self):
+        self.params.update(
+            threshold=self.threshold_slider.value(),
+            blur_size=self.blur_slider.value(),
+            blob_size=self.blob_size_slider.value(),
+            multi=self.multi_checkbox.isChecked(),
+            scale=1.0 / (2 ** self.scale_combo.currentIndex()),
+            rois=[TRIGGER_ZONE] if self.zone_checkbox.isChecked() else None,
+        )
+
+    def publish_result(self, result, frame):
+        # Processing thread: only signal when the GUI has caught up, so a busy
+        # UI never accumulates a backlog of stale frames
+        if self.metrics is not None:
+            self.metrics.observe("latency", self.worker.last_latency)
+        if self.broadcast is not None:
+            with self.timer.stage("broadcast"):
+                self.broadcast.send(result.blob_frame, rgb=True)
+        previous = self.latest_result.exchange(result)
+        if previous is None:
+            self.result_ready.emit()
+        else:
+            # Never shown: its buffers go straight back to the detector
+            self.detector.release(previous)
+            if self.metrics is not None:
+                self.metrics.count("results_skipped")
+
+    def show_result(self):
+        result = self.latest_result.take()
+        if result is None:
             return
-
-        # Resize frame to match display
-        frame = cv2.resize(frame, (640, 480))
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        # Initialize background
-        if self.background is None:
-            self.background = gray.astype("float")
-            return
-
-        # Parameters from sliders
-        threshold = self.threshold_slider.value()
-        blur_size = self.blur_slider.value() | 1  # Ensure odd number
-        blob_size = self.blob_size_slider.value()
-
-        # Motion detection
-        cv2.accumulateWeighted(gray, self.background, 0.5)
-        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
-        blur = cv2.GaussianBlur(diff, (blur_size, blur_size), 0)
-        _, thresh = cv2.threshold(blur, threshold, 255, cv2.THRESH_BINARY)
-
-        # Blob detection
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        blob_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-        cv2.line(blob_frame, (320, 0), (320, 480), (255, 255, 255), 2)  # Vertical line
-
-        if contours:
-            largest_contour = max(contours, key=cv2.contourArea)
-            if cv2.contourArea(largest_contour) > 500:  # Minimum area filter
-                M = cv2.moments(largest_contour)
-                if M["m00"] != 0:
-                    cx = int(M["m10"] / M["m00"])
-                    cy = int(M["m01"] / M["m00"])
-                    # Draw blob effect
-                    cv2.circle(blob_frame, (cx, cy), blob_size, (0, 255, 255), -1)  # Yellow blob
-
-        # Display video feed
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_frame.shape
-        bytes_per_line = ch * w
-        qt_image = QtGui.QImage(rgb_frame.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-        self.video_label.setPixmap(QtGui.QPixmap.fromImage(qt_image))
-
-        # Display blob effect
-        h, w, ch = blob_frame.shape
-        bytes_per_line = ch * w
-        qt_blob_image = QtGui.QImage(blob_frame.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-        self.blob_label.setPixmap(QtGui.QPixmap.fromImage(qt_blob_image))
+        # Both panes repaint from the detector's buffers; only a new result
+        # schedules a paint
+        self.video_view.set_frame(result.frame)
+        self.blob_view.set_frame(result.blob_frame, bgr=False)
+        # The previous result is no longer painted; the worker may reuse it
+        if self.shown_result is not None:
+            self.detector.release(self.shown_result)
+        self.shown_result = result
+        if self.metrics is not None:
+            self.metrics.frame()
 
     def closeEvent(self, event):
+        self.capture_thread.stop()
+        self.worker.stop()
+        self.capture_thread.join()
+        self.worker.join()
         self.cap.release()
+        if self.broadcast is not None:
+            self.broadcast.close()
         event.accept()
 
 def main():
-    app = QtWidgets.QApplication(sys.argv)
-    window = BlobTriggerApp()
+    parser = argparse.ArgumentParser(description="Blob Trigger Interactive")
+    parser.add_argument("--source", default="0", help="webcam index, video file or synthetic[:WxH]")
+    parser.add_argument("--metrics", metavar="SPEC", help="publish stage metrics to udp:HOST[:PORT] or shm:NAME")
+    parser.add_argument("--broadcast", metavar="NAME",
+                        help="publish the blob pane to shared memory for server.py --stream NAME")
+    args, qt_args = parser.parse_known_args()
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    metrics, publisher = start_metrics("blob_trigger", args.metrics) if args.metrics else (None, None)
+    broadcast = FramePublisher(args.broadcast) if args.broadcast else None
+    window = BlobTriggerApp(args.source, metrics, broadcast)
     window.show()
-    sys.exit(app.exec_())
+    status = app.exec_()
+    if publisher is not None:
+        publisher.stop()
+        publisher.join()
+    sys.exit(status)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,16 +1,48 @@
-import pygame
-from pygame.locals import *
+import argparse
+import functools
+import sys
+import time
+import math
+
+parser = argparse.ArgumentParser(description="Cylindrical LED generative art simulation")
+parser.add_argument("--particles", type=int, default=1000, help="particle count (hundreds of thousands are fine on a GPU)")
+parser.add_argument("--fps", type=int, default=60, help="target frame rate, 0 = unpaced")
+parser.add_argument("--overlay", action="store_true", help="show frame timings (toggle with O)")
+parser.add_argument("--stats", metavar="CSV", help="append frame-time percentiles to this file every second")
+parser.add_argument("--no-gpu-timing", action="store_true", help="skip GL timer queries")
+parser.add_argument("--offscreen", action="store_true",
+                    help="render headless (EGL, software GL is fine) with no window")
+parser.add_argument("--unwrap", action="store_true",
+                    help="render the cylinder surface flattened, full circumference across the frame")
+parser.add_argument("--leds", default="128x32", help="LED grid COLUMNSxROWS around the cylinder")
+parser.add_argument("--serpentine", action="store_true", help="every other LED strip is wired bottom-up")
+parser.add_argument("--sink", default="none", help="LED output: none, file:PATH, shm:NAME or udp:HOST:PORT")
+parser.add_argument("--frames", type=int, default=0, help="stop after this many frames (0 = run until closed)")
+parser.add_argument("--metrics", metavar="SPEC", help="publish stage metrics to udp:HOST[:PORT] or shm:NAME")
+args = parser.parse_args()
+
+if args.offscreen:
+    from gl_offscreen import OffscreenContext  # before OpenGL: selects the EGL platform
+else:
+    import pygame
+    from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GL.shaders import compileProgram, compileShader
 import numpy as np
-import time
-import math
+
+from led_output import AsyncReadback, Framebuffer, LedMap, NullSink, open_sink
+from particle_engine import ParticleSystem
+from perf_metrics import start_metrics
+from render_loop import RenderLoop, TextOverlay, UniformCache, format_report
 
 # Initialize Pygame and OpenGL
-pygame.init()
 WIDTH, HEIGHT = 1200, 600
-pygame.display.set_mode((WIDTH, HEIGHT), DOUBLEBUF | OPENGL | OPENGLBLIT)
+if args.offscreen:
+    context = OffscreenContext(WIDTH, HEIGHT)
+else:
+    pygame.init()
+    pygame.display.set_mode((WIDTH, HEIGHT), DOUBLEBUF | OPENGL | OPENGLBLIT)
 glViewport(0, 0, WIDTH, HEIGHT)
 glEnable(GL_DEPTH_TEST)
 glEnable(GL_BLEND)
@@ -23,11 +55,13 @@ in vec3 position;
 in vec3 normal;
 in vec2 texCoord;
 uniform mat4 mvp;
+uniform bool unwrap;
 out vec2 fragTexCoord;
 out vec3 fragNormal;
 out vec3 fragPos;
 void main() {
-    gl_Position = mvp * vec4(position, 1.0);
+    // unwrap: the surface's (u, v) fills the frame, as the LEDs see it
+    gl_Position = unwrap ? vec4(texCoord * 2.0 - 1.0, 0.0, 1.0) : mvp * vec4(position, 1.0);
     fragTexCoord = texCoord;
     fragNormal = normal;
     fragPos = position;
@@ -72,11 +106,45 @@ void main() {
 }
 """
 
+# Particles: position plus remaining life (1 -> 0) per vertex, colored and
+# faded in the shader
+particle_vertex_shader = """
+#version 330
+in vec3 position;
+in float life;
+uniform mat4 mvp;
+uniform bool unwrap;
+out vec4 color;
+void main() {
+    if (unwrap) {
+        // Same (angle, height) mapping as the cylinder's texCoord, in front of it
+        float u = fract(atan(position.z, position.x) / 6.2832 + 1.0);
+        gl_Position = vec4(u * 2.0 - 1.0, position.y, -0.5, 1.0);
+    } else {
+        gl_Position = mvp * vec4(position, 1.0);
+    }
+    color = vec4(1.0, 1.0 - life, 0.5, life);
+}
+"""
+
+particle_fragment_shader = """
+#version 330
+in vec4 color;
+out vec4 fragColor;
+void main() {
+    fragColor = color;
+}
+"""
+
 # Compile shaders
 shader = compileProgram(
     compileShader(vertex_shader, GL_VERTEX_SHADER),
     compileShader(fragment_shader, GL_FRAGMENT_SHADER)
 )
+particle_shader = compileProgram(
+    compileShader(particle_vertex_shader, GL_VERTEX_SHADER),
+    compileShader(particle_fragment_shader, GL_FRAGMENT_SHADER)
+)
 
 # Generate cylinder geometry
 def create_cylinder(radius=1.0, height=2.0, segments=64):
@@ -124,11 +192,14 @@ glVertexAttribPointer(texcoord_loc, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(2
 mvp_loc = glGetUniformLocation(shader, "mvp")
 time_loc = glGetUniformLocation(shader, "time")
 resolution_loc = glGetUniformLocation(shader, "resolution")
+unwrap_loc = glGetUniformLocation(shader, "unwrap")
 
-# Camera and projection (frustum)
-def get_mvp():
+# Camera and projection (frustum). The camera is fixed, so this is computed
+# once per window size and the cached matrix reused every frame.
+@functools.lru_cache(maxsize=None)
+def get_mvp(width=WIDTH, height=HEIGHT):
     projection = np.array([
-        [1.0 / (WIDTH/HEIGHT), 0, 0, 0],
+        [1.0 / (width/height), 0, 0, 0],
         [0, 1.0, 0, 0],
         [0, 0, -1.0 / (5.0 - 1.0), -5.0 / (5.0 - 1.0)],
         [0, 0, -1.0, 0]
@@ -136,59 +207,210 @@ def get_mvp():
     view = np.eye(4, dtype=np.float32)
     view[2, 3] = -3.0  # Move camera back
     model = np.eye(4, dtype=np.float32)
-    return projection @ view @ model
+    mvp = projection @ view @ model
+    mvp.flags.writeable = False  # Shared by every caller
+    return mvp
+
+# Particle system: a pooled structure-of-arrays simulation (particle_engine.py)
+# streamed into one VBO each frame and drawn with a single call. Particles
+# spawn anywhere in the [-1, 1] cube, drift at up to 0.6 units/s and live
+# 100 frames; dead ones are replaced straight away so the count stays fixed.
+PARTICLE_LIFE = 100 / 60.0  # seconds
+PARTICLE_SPEED = 0.6  # units/s per axis
+
+particles = ParticleSystem(args.particles, dims=3)
+
+def respawn_particles(first_frame=False):
+    n = particles.capacity - particles.count
+    if not n:
+        return
+    rng = particles.rng
+    life = PARTICLE_LIFE
+    if first_frame:
+        # Stagger the first generation so they don't all expire together
+        life = rng.uniform(0, PARTICLE_LIFE, n).astype(np.float32)
+    particles.emit(rng.uniform(-1, 1, (n, 3)).astype(np.float32),
+                   rng.uniform(-PARTICLE_SPEED, PARTICLE_SPEED, (n, 3)).astype(np.float32),
+                   life, (1.0, 0.0, 0.5))
+    if first_frame:
+        particles.max_life[:particles.count] = PARTICLE_LIFE
+
+respawn_particles(first_frame=True)
+
+# x, y, z, life fraction per particle
+particle_vertices = np.empty((particles.capacity, 4), dtype=np.float32)
+particle_vbo = glGenBuffers(1)
+particle_vao = glGenVertexArrays(1)
+glBindVertexArray(particle_vao)
+glBindBuffer(GL_ARRAY_BUFFER, particle_vbo)
+glBufferData(GL_ARRAY_BUFFER, particle_vertices.nbytes, None, GL_STREAM_DRAW)
+particle_position_loc = glGetAttribLocation(particle_shader, "position")
+particle_life_loc = glGetAttribLocation(particle_shader, "life")
+glEnableVertexAttribArray(particle_position_loc)
+glEnableVertexAttribArray(particle_life_loc)
+glVertexAttribPointer(particle_position_loc, 3, GL_FLOAT, GL_FALSE, 16, None)
+glVertexAttribPointer(particle_life_loc, 1, GL_FLOAT, GL_FALSE, 16, ctypes.c_void_p(12))
+glBindVertexArray(0)
+glBindBuffer(GL_ARRAY_BUFFER, vbo)
+particle_mvp_loc = glGetUniformLocation(particle_shader, "mvp")
+particle_unwrap_loc = glGetUniformLocation(particle_shader, "unwrap")
+glUseProgram(particle_shader)
+glUniform1i(particle_unwrap_loc, args.unwrap)
+
+# Uniform values only go to GL when they change (one cache per program)
+uniforms = UniformCache()
+particle_uniforms = UniformCache()
+
+def draw_particles(mvp):
+    n = particles.count
+    vertices = particle_vertices[:n]
+    vertices[:, :3] = particles.pos[:n]
+    particles.alpha(out=vertices[:, 3])
+    glBindBuffer(GL_ARRAY_BUFFER, particle_vbo)
+    # Orphan last frame's storage instead of waiting for the GPU to release it
+    glBufferData(GL_ARRAY_BUFFER, particle_vertices.nbytes, None, GL_STREAM_DRAW)
+    glBufferSubData(GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
+    glUseProgram(particle_shader)
+    particle_uniforms.matrix4(particle_mvp_loc, mvp)
+    glBindVertexArray(particle_vao)
+    glDrawArrays(GL_POINTS, 0, n)
+    glBindVertexArray(0)
+    glBindBuffer(GL_ARRAY_BUFFER, vbo)
+
+# Frame timing: per-stage CPU and GPU times, reported once a second to the
+# overlay and the optional CSV (and stdout when offscreen),
+# and, with --metrics, published live for server.py's dashboard
+metrics, publisher = start_metrics("cilindrical_led", args.metrics, target_fps=args.fps) if args.metrics \
+    else (None, None)
+loop = RenderLoop(target_fps=args.fps, gpu_timing=not args.no_gpu_timing, csv_path=args.stats, metrics=metrics)
+show_overlay = args.overlay and not args.offscreen
+if not args.offscreen:
+    overlay = TextOverlay((WIDTH, HEIGHT))
+    font = pygame.font.SysFont("monospace", 14)
 
-# Particle system (simplified for brevity)
-class Particle:
-    def __init__(self):
-        self.pos = np.array([random.uniform(-1, 1), random.uniform(-1, 1), random.uniform(-1, 1)], dtype=np.float32)
-        self.vel = np.array([random.uniform(-0.01, 0.01), random.uniform(-0.01, 0.01), random.uniform(-0.01, 0.01)], dtype=np.float32)
-        self.life = 100
+def render_text(lines):
+    # RGBA pixels, top row first, for TextOverlay
+    surfaces = [font.render(line, True, (255, 255, 255)) for line in lines]
+    width = max(surface.get_width() for surface in surfaces) + 8
+    height = sum(surface.get_height() for surface in surfaces) + 8
+    panel = pygame.Surface((width, height), pygame.SRCALPHA)
+    panel.fill((0, 0, 0, 160))
+    y = 4
+    for surface in surfaces:
+        panel.blit(surface, (4, y))
+        y += surface.get_height()
+    return np.frombuffer(pygame.image.tostring(panel, "RGBA"), dtype=np.uint8).reshape(height, width, 4)
 
-particles = [Particle() for _ in range(1000)]
+# LED output: the scene renders into an offscreen framebuffer, which is read
+# back asynchronously (one frame late), sampled down to the LED grid and
+# sent to the sink. In windowed mode the framebuffer is also blitted to the
+# window, and the overlay drawn on top there only. Without a sink the scene
+# renders straight to the window (or pbuffer) and nothing is read back.
+columns, rows = (int(n) for n in args.leds.lower().split("x"))
+sink = open_sink(args.sink, columns * rows)
+led_output = not isinstance(sink, NullSink)
+if led_output:
+    if not args.unwrap:
+        print("LED sink without --unwrap: the LEDs sample the perspective view, not the cylinder surface",
+              file=sys.stderr)
+    framebuffer = Framebuffer(WIDTH, HEIGHT)
+    readback = AsyncReadback(WIDTH, HEIGHT)
+    led_map = LedMap(columns, rows, WIDTH, HEIGHT, serpentine=args.serpentine)
+
+def send_leds(pixels):
+    sink.send(led_map.resample(pixels))
 
 # Main loop
 glUseProgram(shader)
 glUniform2f(resolution_loc, WIDTH, HEIGHT)
+glUniform1i(unwrap_loc, args.unwrap)
 running = True
 start_time = time.time()
-clock = pygame.time.Clock()
+dt = 1 / 60.0
+last_frame = time.perf_counter()
+
+try:
+    while running:
+        if not args.offscreen:
+            for event in pygame.event.get():
+                if event.type == QUIT:
+                    running = False
+                elif event.type == KEYDOWN and event.key == K_o:
+                    show_overlay = not show_overlay
+
+        with loop.frame():
+            if led_output:
+                framebuffer.bind()
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            glUseProgram(shader)
+            current_time = time.time() - start_time
+            uniforms.float1(time_loc, current_time)
+
+            # Update particles
+            with loop.stage("particle_update"):
+                particles.update(dt)
+                respawn_particles()
+
+            # Draw cylinder
+            with loop.stage("cylinder_draw"):
+                mvp = get_mvp(WIDTH, HEIGHT)
+                uniforms.matrix4(mvp_loc, mvp)
+                glDrawElements(GL_TRIANGLES, len(indices), GL_UNSIGNED_INT, None)
+
+            # Draw particles
+            with loop.stage("particle_draw"):
+                glPointSize(3)
+                draw_particles(mvp)
+
+            if led_output:
+                with loop.stage("readback"):
+                    readback.read(send_leds)
+
+            if not args.offscreen:
+                if led_output:
+                    framebuffer.blit_to_screen()
+                    glBindFramebuffer(GL_FRAMEBUFFER, 0)
+                if show_overlay:
+                    with loop.stage("overlay"):
+                        overlay.draw()
+
+                with loop.stage("flip"):
+                    pygame.display.flip()
+
+        report = loop.poll_report()
+        if report is not None:
+            if show_overlay:
+                overlay.set_image(render_text(format_report(report)))
+            elif args.offscreen:
+                print(format_report(report)[0], flush=True)
 
-while running:
-    for event in pygame.event.get():
-        if event.type == QUIT:
+        if args.frames and loop.frames >= args.frames:
             running = False
 
-    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-    current_time = time.time() - start_time
-    glUniform1f(time_loc, current_time)
-
-    # Update particles
-    for p in particles[:]:
-        p.pos += p.vel
-        p.life -= 1
-        if p.life <= 0:
-            particles.remove(p)
-            particles.append(Particle())
-
-    # Draw cylinder
-    mvp = get_mvp()
-    glUniformMatrix4fv(mvp_loc, 1, GL_FALSE, mvp)
-    glDrawElements(GL_TRIANGLES, len(indices), GL_UNSIGNED_INT, None)
-
-    # Draw particles
-    glPointSize(3)
-    glBegin(GL_POINTS)
-    for p in particles:
-        glColor4f(1.0, 1.0 - p.life/100, 0.5, p.life/100)
-        glVertex3fv(p.pos)
-    glEnd()
-
-    pygame.display.flip()
-    clock.tick(60)
+        # Clamped so a stall doesn't fling every particle out of view
+        now = time.perf_counter()
+        dt, last_frame = min(now - last_frame, 0.05), now
+except KeyboardInterrupt:
+    pass
 
 # Cleanup
+if publisher is not None:
+    publisher.stop()
+    publisher.join()
+sink.close()
+if led_output:
+    readback.delete()
+    framebuffer.delete()
+loop.close()
+if not args.offscreen:
+    overlay.delete()
 glDeleteBuffers(1, [vbo])
 glDeleteBuffers(1, [ibo])
+glDeleteBuffers(1, [particle_vbo])
+glDeleteVertexArrays(1, [particle_vao])
 glDeleteProgram(shader)
-pygame.quit()
\ No newline at end of file
+glDeleteProgram(particle_shader)
+if args.offscreen:
+    context.close()
+else:
+    pygame.quit()
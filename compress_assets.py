@@ -0,0 +1,82 @@
+import argparse
+import gzip
+import os
+import sys
+
+from static_assets import COMPRESSIBLE_EXTENSIONS, MIN_COMPRESS_SIZE, brotli
+
+# Build step: write .gz/.br siblings next to every compressible asset so
+# server.py --production can send them without compressing per request.
+# Run it again after editing a page; stale siblings are ignored by the server.
+
+def iter_assets(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Skip .git and friends, same rule as the server
+        dirnames[:] = [d for d in dirnames if not d.startswith('.') and d != '__pycache__']
+        for name in sorted(filenames):
+            if name.startswith('.') or not name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            yield os.path.join(dirpath, name)
+
+
+def write_variant(path, suffix, data, force):
+    target = path + suffix
+    if not force and os.path.exists(target) and os.stat(target).st_mtime_ns >= os.stat(path).st_mtime_ns:
+        return os.path.getsize(target), False
+    tmp = target + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data())
+    os.replace(tmp, target)
+    return os.path.getsize(target), True
+
+
+def remove_variant(path, suffix):
+    if os.path.exists(path + suffix):
+        os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompress static assets for server.py')
+    parser.add_argument('root', nargs='?', default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument('--force', action='store_true', help='rebuild siblings even if up to date')
+    parser.add_argument('--clean', action='store_true', help='delete all .gz/.br siblings instead')
+    args = parser.parse_args()
+
+    if brotli is None and not args.clean:
+        print('brotli not installed (pip install brotli); writing .gz only', file=sys.stderr)
+
+    total_raw = total_best = 0
+    for path in iter_assets(args.root):
+        if args.clean:
+            remove_variant(path, '.gz')
+            remove_variant(path, '.br')
+            continue
+
+        size = os.path.getsize(path)
+        if size < MIN_COMPRESS_SIZE:
+            continue
+        with open(path, 'rb') as f:
+            raw = f.read()
+
+        # Maximum effort is affordable here, unlike the on-the-fly path
+        sizes = {}
+        sizes['gzip'], gz_written = write_variant(
+            path, '.gz', lambda: gzip.compress(raw, compresslevel=9, mtime=0), args.force)
+        br_written = False
+        if brotli is not None:
+            sizes['br'], br_written = write_variant(
+                path, '.br', lambda: brotli.compress(raw, quality=11), args.force)
+
+        best = min(sizes.values())
+        total_raw += size
+        total_best += best
+        status = 'built' if gz_written or br_written else 'fresh'
+        detail = '  '.join('%s %d (%.1fx)' % (enc, n, size / n) for enc, n in sorted(sizes.items()))
+        print('%-6s %-32s %8d  %s' % (status, os.path.relpath(path, args.root), size, detail))
+
+    if total_raw:
+        print('total %d -> %d bytes (%.1fx smaller)' % (total_raw, total_best, total_raw / total_best))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,46 +1,77 @@
 import cv2
 import numpy as np
 import random
+import argparse
+import json
+from functools import lru_cache
 
-# Initialize webcam
-cap = cv2.VideoCapture(0)
-if not cap.isOpened():
-    print("Error: Could not open webcam.")
-    exit()
+from frame_pipeline import CaptureThread, FrameQueue, LatestValue, ProcessingWorker, SharedParams
+from frame_source import open_source
+from particle_engine import ParticleSystem
+from perf_metrics import NULL_TIMER, start_metrics
+from video_broadcast import FramePublisher
 
-# Get frame dimensions
-frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+WINDOW_NAME = "Cybernetic Glitch Feed"
+BOARD_NAME = "Fine Tuning Board"
+
+# Trackbars for fine-tuning (10x more parameters for detailed control): name -> (default, max)
+TRACKBARS = {
+    "Pixel Size": (5, 50),  # Pixelation block size
+    "Glitch Shift X": (5, 30),  # Horizontal glitch shift
+    "Glitch Shift Y": (5, 30),  # Vertical glitch shift
+    "Noise Intensity": (50, 255),  # Base noise strength
+    "Red Noise": (30, 100),  # Red channel noise intensity
+    "Green Noise": (40, 100),  # Green channel noise intensity
+    "Blue Noise": (20, 100),  # Blue channel noise intensity
+    "Scan Line Freq": (10, 50),  # Scan line frequency
+    "Particle Density": (20, 1000),  # Density of glowing particles
+    "Particle Speed": (5, 20),  # Speed of particle movement
+    "Streak Intensity": (30, 100),  # Percentage of particles that trail a fading streak
+    "Binary Code Opacity": (20, 100),  # Binary overlay opacity
+    "Binary Refresh": (100, 100),  # Percentage of binary cells redrawn per frame
+    "Binary Scroll": (0, 10),  # Binary rows scrolled down per frame (code rain)
+    "Color Shift Freq": (10, 50),  # Frequency of color channel shifts
+    "Contrast Boost": (100, 200),  # Contrast enhancement
+    "Blur Radius": (0, 10),  # Subtle blur for depth
+}
 
 # Callback function for trackbars (does nothing, just required)
 def nothing(x):
     pass
 
-# Create windows for display and control
-cv2.namedWindow("Cybernetic Glitch Feed")
-cv2.namedWindow("Fine Tuning Board", cv2.WINDOW_NORMAL)
-
-# Create trackbars for fine-tuning (10x more parameters for detailed control)
-cv2.createTrackbar("Pixel Size", "Fine Tuning Board", 5, 50, nothing)  # Pixelation block size
-cv2.createTrackbar("Glitch Shift X", "Fine Tuning Board", 5, 30, nothing)  # Horizontal glitch shift
-cv2.createTrackbar("Glitch Shift Y", "Fine Tuning Board", 5, 30, nothing)  # Vertical glitch shift
-cv2.createTrackbar("Noise Intensity", "Fine Tuning Board", 50, 255, nothing)  # Base noise strength
-cv2.createTrackbar("Red Noise", "Fine Tuning Board", 30, 100, nothing)  # Red channel noise intensity
-cv2.createTrackbar("Green Noise", "Fine Tuning Board", 40, 100, nothing)  # Green channel noise intensity
-cv2.createTrackbar("Blue Noise", "Fine Tuning Board", 20, 100, nothing)  # Blue channel noise intensity
-cv2.createTrackbar("Scan Line Freq", "Fine Tuning Board", 10, 50, nothing)  # Scan line frequency
-cv2.createTrackbar("Particle Density", "Fine Tuning Board", 20, 100, nothing)  # Density of glowing particles
-cv2.createTrackbar("Particle Speed", "Fine Tuning Board", 5, 20, nothing)  # Speed of particle movement
-cv2.createTrackbar("Streak Intensity", "Fine Tuning Board", 30, 100, nothing)  # Red/green streaks intensity
-cv2.createTrackbar("Binary Code Opacity", "Fine Tuning Board", 20, 100, nothing)  # Binary overlay opacity
-cv2.createTrackbar("Color Shift Freq", "Fine Tuning Board", 10, 50, nothing)  # Frequency of color channel shifts
-cv2.createTrackbar("Contrast Boost", "Fine Tuning Board", 100, 200, nothing)  # Contrast enhancement
-cv2.createTrackbar("Blur Radius", "Fine Tuning Board", 0, 10, nothing)  # Subtle blur for depth
+def default_params():
+    return {name: default for name, (default, _) in TRACKBARS.items()}
+
+def create_trackbars(params=None):
+    params = params or default_params()
+    for name, (_, maximum) in TRACKBARS.items():
+        cv2.createTrackbar(name, BOARD_NAME, params[name], maximum, nothing)
+
+def read_trackbars():
+    return {name: cv2.getTrackbarPos(name, BOARD_NAME) for name in TRACKBARS}
+
+# Presets are JSON objects of trackbar name -> value; missing names keep
+# their defaults, so a preset only needs the values it changes
+def load_preset(path):
+    with open(path) as f:
+        preset = json.load(f)
+    unknown = sorted(set(preset) - set(TRACKBARS))
+    if unknown:
+        raise ValueError("Unknown parameters in %s: %s" % (path, ", ".join(unknown)))
+    params = default_params()
+    for name, value in preset.items():
+        params[name] = min(max(int(value), 0), TRACKBARS[name][1])
+    return params
+
+def save_preset(path, params):
+    with open(path, "w") as f:
+        json.dump(params, f, indent=2)
 
 # Function to apply pixelation
 def pixelate_frame(frame, pixel_size):
     if pixel_size <= 1:
         return frame
+    frame_height, frame_width = frame.shape[:2]
     small = cv2.resize(frame, (frame_width // pixel_size, frame_height // pixel_size), interpolation=cv2.INTER_LINEAR)
     return cv2.resize(small, (frame_width, frame_height), interpolation=cv2.INTER_NEAREST)
 
@@ -49,38 +80,99 @@ def apply_glitch(frame, shift_x, shift_y):
     glitched = frame.copy()
     for _ in range(np.random.randint(1, 5)):  # Random glitch occurrences
         if np.random.rand() > 0.5:  # Horizontal glitch
-            x_shift = np.random.randint(-shift_x, shift_x)
+            x_shift = np.random.randint(-shift_x, shift_x) if shift_x else 0
             glitched = np.roll(glitched, x_shift, axis=1)
         else:  # Vertical glitch
-            y_shift = np.random.randint(-shift_y, shift_y)
+            y_shift = np.random.randint(-shift_y, shift_y) if shift_y else 0
             glitched = np.roll(glitched, y_shift, axis=0)
     return glitched
 
+class NoiseBank:
+    # Uniform noise texture half again as large as the frame in each
+    # direction, generated once per frame size. A frame's noise is the
+    # frame-sized window at a random offset, so no random numbers are drawn
+    # per pixel. Intensity and per-channel tints are applied to the whole
+    # texture once and cached until they change.
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.shape = None
+        self.weights = None
+        self.scaled_texture = None
+
+    @staticmethod
+    def texture_shape(shape):
+        h, w = shape[:2]
+        return (h + h // 2, w + w // 2) + tuple(shape[2:])
+
+    def _generate(self, shape):
+        self.shape = shape[:2]
+        self.texture = self.rng.integers(0, 256, self.texture_shape(shape), dtype=np.uint8)
+        self.weights = None
+
+    def scale(self, shape, weights, out=None):
+        # texture * (blue, green, red) weights as uint8, into out if given
+        if self.shape != shape[:2]:
+            self._generate(shape)
+        if out is None:
+            if self.weights == tuple(weights):
+                return self.scaled_texture
+            self.weights = tuple(weights)
+            out = self.scaled_texture = np.empty_like(self.texture)
+        cv2.multiply(self.texture, tuple(weights) + (0,), dst=out)
+        return out
+
+    def offset(self, shape, rng=None):
+        # Random top-left corner of a frame-sized window
+        rng = rng or self.rng
+        h, w = shape[:2]
+        return int(rng.integers(0, h // 2 + 1)), int(rng.integers(0, w // 2 + 1))
+
+    def sample(self, shape, weights):
+        h, w = shape[:2]
+        texture = self.scale(shape, weights)
+        oy, ox = self.offset(shape)
+        return texture[oy:oy + h, ox:ox + w]
+
+NOISE_BANK = NoiseBank()
+
+def noise_weights(intensity, red_tint, green_tint, blue_tint):
+    # Per-channel (blue, green, red) weight of the bank's [0, 256) values:
+    # noise in [0, intensity), times the tint as a fraction, at the 0.2
+    # blend weight
+    return tuple(0.2 * intensity / 256 * tint / 100 for tint in (blue_tint, green_tint, red_tint))
+
 # Function to add colored noise with individual channel control
 def add_colored_noise(frame, intensity, red_tint, green_tint, blue_tint):
-    noise = np.random.randint(0, intensity, frame.shape, dtype=np.uint8)
-    noise[:, :, 0] = noise[:, :, 0] * (blue_tint // 100)  # Blue channel
-    noise[:, :, 1] = noise[:, :, 1] * (green_tint // 100)  # Green channel
-    noise[:, :, 2] = noise[:, :, 2] * (red_tint // 100)  # Red channel
-    return cv2.addWeighted(frame, 0.8, noise, 0.2, 0)
+    noise = NOISE_BANK.sample(frame.shape, noise_weights(intensity, red_tint, green_tint, blue_tint))
+    return cv2.scaleAdd(frame, 0.8, noise)
+
+# Scan lines: the two dark rows of every frequency rows, cached per height
+# and frequency, and a lookup table for the 0.7 darkening
+SCAN_LINE_LUT = np.floor(np.arange(256) * 0.7).astype(np.uint8)
+
+@lru_cache(maxsize=8)
+def scan_line_rows(height, frequency):
+    rows = np.flatnonzero(np.arange(height) % frequency < 2)
+    rows.flags.writeable = False
+    return rows
 
 # Function to add scan lines
 def add_scan_lines(frame, frequency):
     scan_lines = frame.copy()
-    for y in range(0, frame_height, frequency):
-        scan_lines[y:y+2, :, :] = scan_lines[y:y+2, :, :] * 0.7  # Darken scan lines
+    rows = scan_line_rows(frame.shape[0], frequency)
+    scan_lines[rows] = cv2.LUT(frame[rows], SCAN_LINE_LUT)
     return scan_lines
 
 # Function to add glowing particle effects (dots and streaks)
-def add_particles(frame, density, speed):
-    particles = np.zeros_like(frame, dtype=np.uint8)
-    num_particles = int(density * frame.size / 1000000)  # Scale density
+def draw_particles(layer, density):
+    frame_height, frame_width = layer.shape[:2]
+    num_particles = int(density * layer.size / 1000000)  # Scale density
     for _ in range(num_particles):
         x = random.randint(0, frame_width - 1)
         y = random.randint(0, frame_height - 1)
         color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
         radius = random.randint(1, 3)
-        cv2.circle(particles, (x, y), radius, color, -1)
+        cv2.circle(layer, (x, y), radius, color, -1)
         # Add streaks (horizontal/vertical lines with fading)
         if random.random() > 0.7:
             streak_len = random.randint(5, 15)
@@ -89,21 +181,109 @@ def add_particles(frame, density, speed):
                 px, py = x + direction[0] * i, y + direction[1] * i
                 if 0 <= px < frame_width and 0 <= py < frame_height:
                     intensity = int(255 * (1 - i / streak_len))
-                    cv2.circle(particles, (px, py), 1, color, -1, lineType=cv2.LINE_AA)
+                    cv2.circle(layer, (px, py), 1, color, -1, lineType=cv2.LINE_AA)
+    return num_particles
+
+def add_particles(frame, density, speed):
+    particles = np.zeros_like(frame, dtype=np.uint8)
+    draw_particles(particles, density)
     # Move particles based on speed
     particles = np.roll(particles, (speed, speed), axis=(0, 1))
     return cv2.addWeighted(frame, 0.8, particles, 0.2, 0)
 
 # Function to add binary code overlay
-def add_binary_overlay(frame, opacity):
-    binary_text = np.zeros_like(frame, dtype=np.uint8)
+def draw_binary(layer):
+    frame_height, frame_width = layer.shape[:2]
     for y in range(0, frame_height, 10):
         for x in range(0, frame_width, 10):
             text = random.choice(['0', '1'])
             color = (random.randint(100, 255), random.randint(100, 255), random.randint(100, 255))
-            cv2.putText(binary_text, text, (x, y + 8), cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1, cv2.LINE_AA)
+            cv2.putText(layer, text, (x, y + 8), cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1, cv2.LINE_AA)
+
+def add_binary_overlay(frame, opacity):
+    binary_text = np.zeros_like(frame, dtype=np.uint8)
+    draw_binary(binary_text)
     return cv2.addWeighted(frame, (100 - opacity) / 100, binary_text, opacity / 100, 0)
 
+class BinaryOverlay:
+    # Binary code layer from a prerendered glyph atlas: every '0'/'1' in each
+    # of palette_size colors is drawn once with cv2.putText, then the layer
+    # is one vectorized gather of those tiles by a grid of random indices.
+    # The grid persists between frames, so it can scroll down like code rain
+    # and only a fraction of the cells needs to change each frame.
+    def __init__(self, cell=10, palette_size=32, seed=None):
+        self.cell = cell
+        self.rng = np.random.default_rng(seed)
+        # Random colors in [100, 255] per channel, like the per-cell colors
+        # of draw_binary
+        palette = self.rng.integers(100, 256, (palette_size, 3))
+        self.tiles = np.zeros((2 * palette_size, cell, cell, 3), dtype=np.uint8)
+        for i, (text, color) in enumerate((text, color) for text in "01" for color in palette):
+            cv2.putText(self.tiles[i], text, (0, cell - 2), cv2.FONT_HERSHEY_SIMPLEX, 0.3,
+                        tuple(int(c) for c in color), 1, cv2.LINE_AA)
+        self.shape = None
+
+    def _allocate(self, height, width):
+        cell = self.cell
+        rows, cols = -(-height // cell), -(-width // cell)
+        self.shape = (height, width)
+        self.grid = self.rng.integers(0, len(self.tiles), (rows, cols))
+        # Canvas padded to whole cells
+        self.canvas = np.empty((rows * cell, cols * cell, 3), dtype=np.uint8)
+        self.cells = cell_view(self.canvas, cell)
+        gather_cells(self.tiles, self.grid, self.canvas, cell)
+
+    def update(self, height, width, refresh=1.0, scroll=0):
+        # Advances the grid one frame. Returns the (rows, cols) of the cells
+        # that changed, or None when the whole grid may have changed.
+        if self.shape != (height, width):
+            self._allocate(height, width)
+        rows, cols = self.grid.shape
+        tiles = len(self.tiles)
+        scroll = min(scroll, rows)
+        if refresh >= 1.0:
+            self.grid[:] = self.rng.integers(0, tiles, (rows, cols))
+            return None
+        if scroll:
+            # Rows move down, new ones enter at the top, then some cells change
+            self.grid[scroll:] = self.grid[:rows - scroll].copy()
+            self.grid[:scroll] = self.rng.integers(0, tiles, (scroll, cols))
+            self._refresh_cells(refresh)
+            return None
+        if refresh > 0:
+            return self._refresh_cells(refresh)
+        return (np.empty(0, dtype=np.intp),) * 2
+
+    def render(self, height, width, refresh=1.0, scroll=0):
+        # Returns the (height, width, 3) layer, a view valid until next call
+        changed = self.update(height, width, refresh, scroll)
+        if changed is None:
+            gather_cells(self.tiles, self.grid, self.canvas, self.cell)
+        elif len(changed[0]):
+            # Only the changed cells are written to the canvas
+            changed_rows, changed_cols = changed
+            self.cells[changed_rows, changed_cols] = self.tiles[self.grid[changed_rows, changed_cols]]
+        return self.canvas[:height, :width]
+
+    def _refresh_cells(self, fraction):
+        rows, cols = self.grid.shape
+        count = int(round(fraction * rows * cols))
+        flat = self.rng.choice(rows * cols, count, replace=False)
+        changed_rows, changed_cols = np.divmod(flat, cols)
+        self.grid[changed_rows, changed_cols] = self.rng.integers(0, len(self.tiles), count)
+        return changed_rows, changed_cols
+
+def cell_view(canvas, cell):
+    # cells[r, c] is the cell x cell tile at row r, column c of canvas
+    rows, cols = canvas.shape[0] // cell, canvas.shape[1] // cell
+    return canvas.reshape(rows, cell, cols, cell, 3).transpose(0, 2, 1, 3, 4)
+
+def gather_cells(tiles, grid, canvas, cell, first_row=0):
+    # Draw grid rows first_row: onward into canvas (starting at that cell
+    # row) as one gather of tiles
+    rows = len(canvas) // cell
+    np.take(tiles, grid[first_row:first_row + rows], axis=0, out=cell_view(canvas, cell), mode="clip")
+
 # Function to apply color channel shifts
 def apply_color_shift(frame, frequency):
     shifted = frame.copy()
@@ -125,48 +305,470 @@ def apply_blur(frame, radius):
         return cv2.GaussianBlur(frame, (radius * 2 + 1, radius * 2 + 1), 0)
     return frame
 
-# Main loop
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        print("Error: Could not read frame.")
-        break
-
-    # Get trackbar values
-    pixel_size = cv2.getTrackbarPos("Pixel Size", "Fine Tuning Board")
-    glitch_shift_x = cv2.getTrackbarPos("Glitch Shift X", "Fine Tuning Board")
-    glitch_shift_y = cv2.getTrackbarPos("Glitch Shift Y", "Fine Tuning Board")
-    noise_intensity = cv2.getTrackbarPos("Noise Intensity", "Fine Tuning Board")
-    red_noise = cv2.getTrackbarPos("Red Noise", "Fine Tuning Board")
-    green_noise = cv2.getTrackbarPos("Green Noise", "Fine Tuning Board")
-    blue_noise = cv2.getTrackbarPos("Blue Noise", "Fine Tuning Board")
-    scan_freq = cv2.getTrackbarPos("Scan Line Freq", "Fine Tuning Board")
-    particle_density = cv2.getTrackbarPos("Particle Density", "Fine Tuning Board")
-    particle_speed = cv2.getTrackbarPos("Particle Speed", "Fine Tuning Board")
-    streak_intensity = cv2.getTrackbarPos("Streak Intensity", "Fine Tuning Board")
-    binary_opacity = cv2.getTrackbarPos("Binary Code Opacity", "Fine Tuning Board")
-    color_shift_freq = cv2.getTrackbarPos("Color Shift Freq", "Fine Tuning Board")
-    contrast_boost = cv2.getTrackbarPos("Contrast Boost", "Fine Tuning Board")
-    blur_radius = cv2.getTrackbarPos("Blur Radius", "Fine Tuning Board")
-
-    # Apply effects in sequence (10x more complexity)
-    pixelated = pixelate_frame(frame, max(pixel_size, 1))
-    glitched = apply_glitch(pixelated, glitch_shift_x, glitch_shift_y)
-    noisy = add_colored_noise(glitched, noise_intensity, red_noise, green_noise, blue_noise)
-    scanned = add_scan_lines(noisy, max(scan_freq, 1))
-    particles = add_particles(scanned, particle_density, particle_speed)
-    binary = add_binary_overlay(particles, binary_opacity)
-    color_shifted = apply_color_shift(binary, color_shift_freq)
-    contrasted = boost_contrast(color_shifted, contrast_boost)
-    final_frame = apply_blur(contrasted, blur_radius)
-
-    # Display the result
-    cv2.imshow("Cybernetic Glitch Feed", final_frame)
-
-    # Exit on 'q' key press
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-# Release resources
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+# Apply effects in sequence (10x more complexity). Reference implementation:
+# one function and at least one full-frame copy per effect. The live feed
+# uses GlitchPipeline, which renders the same look in fewer passes.
+def apply_effects(frame, params, timer=NULL_TIMER):
+    with timer.stage("pixelate"):
+        pixelated = pixelate_frame(frame, max(params["Pixel Size"], 1))
+    with timer.stage("glitch"):
+        glitched = apply_glitch(pixelated, params["Glitch Shift X"], params["Glitch Shift Y"])
+    with timer.stage("noise"):
+        noisy = add_colored_noise(glitched, params["Noise Intensity"], params["Red Noise"],
+                                  params["Green Noise"], params["Blue Noise"])
+    with timer.stage("scan_lines"):
+        scanned = add_scan_lines(noisy, max(params["Scan Line Freq"], 1))
+    with timer.stage("particles"):
+        particles = add_particles(scanned, params["Particle Density"], params["Particle Speed"])
+    with timer.stage("binary"):
+        binary = add_binary_overlay(particles, params["Binary Code Opacity"])
+    with timer.stage("color_shift"):
+        color_shifted = apply_color_shift(binary, params["Color Shift Freq"])
+    with timer.stage("contrast"):
+        contrasted = boost_contrast(color_shifted, params["Contrast Boost"])
+    with timer.stage("blur"):
+        return apply_blur(contrasted, params["Blur Radius"])
+
+def as_pixels(image):
+    # Flat view with one 3-byte element per BGR pixel: fancy indexing moves
+    # whole pixels at once, much faster than indexing (n, 3) rows
+    return np.ascontiguousarray(image).view("V3").reshape(-1)
+
+def disc_offsets(radius):
+    # (dy, dx) of the pixels cv2.circle fills for a filled disc of radius
+    canvas = np.zeros((2 * radius + 1, 2 * radius + 1), dtype=np.uint8)
+    cv2.circle(canvas, (radius, radius), radius, 1, -1)
+    return (np.argwhere(canvas) - radius).astype(np.int32)
+
+class ParticleField:
+    # Persistent glowing particles for GlitchPipeline, kept in a
+    # particle_engine pool across frames. Dots drift diagonally and streaks
+    # along their axis by Particle Speed pixels per frame, wrapping at the
+    # edges; each lives LIFE frames and dead ones are replaced to hold the
+    # count set by the density. Drawing is a few fancy-indexed assignments of
+    # precomputed disc stencils (all dots of one radius, then every streak
+    # pixel at once) instead of a cv2.circle call per dot and streak pixel,
+    # and only the pixels drawn last frame are cleared.
+    LIFE = (30, 90)  # frames
+    STREAK_LENGTH = (5, 15)
+    DIRECTIONS = np.array([(1, 0), (-1, 0), (0, 1), (0, -1)], dtype=np.float32)  # (x, y)
+
+    def __init__(self, seed=None):
+        self.system = ParticleSystem(256, attributes={"radius": np.int8, "streak": np.int8}, seed=seed)
+        self.stencils = {radius: disc_offsets(radius) for radius in (1, 2, 3)}
+        self.drawn = np.empty(0, dtype=np.intp)
+
+    def clear(self, layer):
+        self.system.clear()
+        layer.fill(0)
+        self.drawn = np.empty(0, dtype=np.intp)
+
+    def _spawn(self, n, h, w, streak_chance):
+        system, rng = self.system, self.system.rng
+        positions = rng.uniform((0, 0), (w, h), (n, 2)).astype(np.float32)
+        streak = np.where(rng.random(n) < streak_chance,
+                          rng.integers(self.STREAK_LENGTH[0], self.STREAK_LENGTH[1] + 1, n), 0)
+        # Streaks move away from their tail; plain dots drift down-right
+        velocities = np.ones((n, 2), dtype=np.float32)
+        velocities[streak > 0] = -self.DIRECTIONS[rng.integers(0, 4, int(np.count_nonzero(streak)))]
+        system.emit(positions, velocities, rng.integers(self.LIFE[0], self.LIFE[1] + 1, n),
+                    rng.integers(0, 256, (n, 3)), radius=rng.integers(1, 4, n), streak=streak)
+
+    def _splat(self, pixels, ys, xs, colors, offsets, h, w):
+        # Stamp offsets around every (y, x), wrapping at the edges
+        index = ((ys[:, None] + offsets[:, 0]) % h * w + (xs[:, None] + offsets[:, 1]) % w).ravel()
+        pixels[index] = np.repeat(as_pixels(colors), len(offsets))
+        return index
+
+    def render(self, layer, density, speed, streak_chance):
+        # Advances the field one frame and redraws it into layer (which must
+        # hold last frame's drawing); returns the number of live particles
+        h, w = layer.shape[:2]
+        pixels = as_pixels(layer)
+        pixels[self.drawn] = np.zeros(1, pixels.dtype)
+        system = self.system
+        target = int(density * layer.size / 1000000)  # Same scale as draw_particles
+        if target > system.capacity:
+            system.resize(max(target, 2 * system.capacity))
+        system.count = min(system.count, target)
+
+        n = system.count
+        system.pos[:n] += system.vel[:n] * np.float32(speed)
+        np.mod(system.pos[:n], (w, h), out=system.pos[:n])
+        system.life[:n] -= 1
+        system.cull()
+        if system.count < target:
+            self._spawn(target - system.count, h, w, streak_chance)
+
+        n = system.count
+        if not n:
+            self.drawn = np.empty(0, dtype=np.intp)
+            return 0
+        xs = system.pos[:n, 0].astype(np.int32)
+        ys = system.pos[:n, 1].astype(np.int32)
+        colors = system.color[:n].astype(np.uint8)
+        radius, streak = system.attributes["radius"][:n], system.attributes["streak"][:n]
+        drawn = []
+
+        # Fading tails behind the streaks: pixel i of a streak of length L
+        # has 1 - i / L of the head's color
+        tails = np.flatnonzero(streak)
+        if len(tails):
+            lengths = streak[tails].astype(np.float32)
+            steps = np.arange(self.STREAK_LENGTH[1], dtype=np.float32)
+            keep = steps < lengths[:, None]
+            back = -system.vel[tails]
+            tail_xs = (xs[tails, None] + back[:, 0, None] * steps).astype(np.int32)[keep]
+            tail_ys = (ys[tails, None] + back[:, 1, None] * steps).astype(np.int32)[keep]
+            fade = (1 - steps / lengths[:, None])[keep]
+            tail_colors = (np.repeat(colors[tails], keep.sum(axis=1), axis=0) * fade[:, None]).astype(np.uint8)
+            drawn.append(self._splat(pixels, tail_ys, tail_xs, tail_colors, self.stencils[1], h, w))
+
+        # Dots on top, one stamp per radius
+        for r, offsets in self.stencils.items():
+            group = np.flatnonzero(radius == r)
+            if len(group):
+                drawn.append(self._splat(pixels, ys[group], xs[group], colors[group], offsets, h, w))
+        self.drawn = np.concatenate(drawn)
+        return n
+
+def roll_into(src, dst, dy, dx):
+    # dst = np.roll(src, (dy, dx), axis=(0, 1)) without a temporary; dst may
+    # be a strided view (e.g. one channel), but must not overlap src
+    h, w = src.shape[:2]
+    dy, dx = dy % h, dx % w
+    dst[dy:, dx:] = src[:h - dy, :w - dx]
+    dst[dy:, :dx] = src[:h - dy, w - dx:]
+    dst[:dy, dx:] = src[h - dy:, :w - dx]
+    dst[:dy, :dx] = src[h - dy:, w - dx:]
+
+# glitch_parallel.py splits frames into runs of bands of this many rows
+# (a multiple of the binary cell size, so bands hold whole cell rows)
+BAND_ROWS = 40
+
+def tone_rows(src, dst, noise, noise_texture, particles, binary, overlay, y0, y1, plan):
+    # The frame-local middle of GlitchPipeline for rows y0:y1: noise blend,
+    # gain/contrast/scan-line LUTs, then the particle and binary layers.
+    # Full-frame arrays in, dst[y0:y1] out; src is never written.
+    rows = slice(y0, y1)
+    current = src[rows]
+    if plan["noise_offset"] is not None:
+        # One blend with the pre-scaled noise window of this frame
+        oy, ox = plan["noise_offset"]
+        band = noise[rows]
+        cv2.scaleAdd(current, 0.8, noise_texture[oy + y0:oy + y1, ox:ox + src.shape[1]], dst=band)
+        current = band
+    target = dst[rows]
+    cv2.LUT(current, plan["lut"], dst=target)
+    frequency = plan["scan_frequency"]
+    for y in range(y0 - y0 % frequency, y1, frequency):
+        top, bottom = max(y, y0) - y0, min(y + 2, y1) - y0
+        if top < bottom:
+            cv2.LUT(current[top:bottom], plan["dark_lut"], dst=target[top:bottom])
+
+    contrast, opacity = plan["contrast"], plan["opacity"]
+    particle_weight = plan["particle_weight"]
+    if plan["has_particles"] and opacity > 0:
+        cv2.addWeighted(particles[rows], particle_weight * contrast, binary[rows], opacity * contrast, 0,
+                        dst=overlay[rows])
+        cv2.add(target, overlay[rows], dst=target)
+    elif plan["has_particles"]:
+        cv2.scaleAdd(particles[rows], particle_weight * contrast, target, dst=target)
+    elif opacity > 0:
+        cv2.scaleAdd(binary[rows], opacity * contrast, target, dst=target)
+
+def blur_rows(src, dst, y0, y1, radius):
+    # dst[y0:y1] = rows y0:y1 of GaussianBlur(src): the band is blurred with
+    # radius rows of context, so it matches blurring the whole frame
+    h = src.shape[0]
+    size = radius * 2 + 1
+    top, bottom = max(y0 - radius, 0), min(y1 + radius, h)
+    blurred = cv2.GaussianBlur(src[top:bottom], (size, size), 0)
+    dst[y0:y1] = blurred[y0 - top:y1 - top]
+
+class GlitchPipeline:
+    # Fused, allocation-free version of apply_effects. All full-frame buffers
+    # are allocated once per frame size and reused; geometric effects write
+    # into the other half of a ping-pong pair instead of copying; effects
+    # whose parameters make them no-ops are skipped. The blend weights of
+    # the noise, particle and binary passes, the scan-line darkening and the
+    # contrast boost are all per-pixel gains, so they are folded into two
+    # lookup tables applied in one pass, with the overlays added after.
+    #
+    # Every random choice of a frame is drawn up front into a plan from one
+    # seeded generator, so a given seed and input reproduce the output
+    # exactly; glitch_parallel.py relies on this to run the frame-local
+    # stages (tone_rows, blur_rows) on bands in worker processes.
+    def __init__(self, seed=None):
+        self.timer = NULL_TIMER
+        self.shape = None
+        self._luts = {}
+        seeds = np.random.SeedSequence(seed).spawn(4)
+        self.rng = np.random.default_rng(seeds[0])
+        self.binary_overlay = BinaryOverlay(seed=seeds[1])
+        self.particle_field = ParticleField(seed=seeds[2])
+        self.noise_bank = NoiseBank(seed=seeds[3])
+
+    def _buffer(self, name, shape):
+        return np.empty(shape, dtype=np.uint8)
+
+    def _allocate(self, shape):
+        h, w = shape[:2]
+        self.shape = shape
+        for name in ("ping", "pong", "noise", "particles", "overlay"):
+            setattr(self, name, self._buffer(name, shape))
+        self.noise_texture = self._buffer("noise_texture", NoiseBank.texture_shape(shape))
+        self.noise_weights = None
+        self.particle_field.clear(self.particles)
+        self.channel = np.empty((h, w), dtype=np.uint8)
+        self.small = {}
+
+    def _other(self, buffer):
+        return self.pong if buffer is self.ping else self.ping
+
+    def _tone_luts(self, gain, contrast):
+        # out = saturate(round(x * gain * contrast)), plain and for scan lines
+        key = (gain, contrast)
+        if key not in self._luts:
+            x = np.arange(256, dtype=np.float64)
+            self._luts[key] = tuple(np.clip(np.rint(x * g * contrast), 0, 255).astype(np.uint8)
+                                    for g in (gain, gain * 0.7))
+        return self._luts[key]
+
+    def _plan(self, params, h, w):
+        # All per-frame random draws and derived settings, in a fixed order
+        rng = self.rng
+        plan = {}
+
+        # Consecutive rolls add up: one roll by the net shift
+        shift_x, shift_y = params["Glitch Shift X"], params["Glitch Shift Y"]
+        dx = dy = 0
+        for _ in range(rng.integers(1, 5)):
+            if rng.random() > 0.5:
+                dx += int(rng.integers(-shift_x, shift_x)) if shift_x else 0
+            else:
+                dy += int(rng.integers(-shift_y, shift_y)) if shift_y else 0
+        plan["glitch"] = (dy, dx)
+
+        # Gain on the frame itself from the noise to the contrast stage
+        gain = 1.0
+        weights = noise_weights(params["Noise Intensity"], params["Red Noise"], params["Green Noise"],
+                                params["Blue Noise"])
+        if any(weights):
+            if weights != self.noise_weights:
+                self.noise_bank.scale(self.shape, weights, out=self.noise_texture)
+                self.noise_weights = weights
+            plan["noise_offset"] = self.noise_bank.offset(self.shape, rng)
+        else:
+            plan["noise_offset"] = None
+            gain *= 0.8
+
+        # The overlays are added after the tone pass with these weights
+        opacity = params["Binary Code Opacity"] / 100
+        plan["opacity"] = opacity
+        plan["particle_weight"] = 0.2 * (1 - opacity)
+        gain *= 0.8 * (1 - opacity)
+        plan["contrast"] = params["Contrast Boost"] / 100
+        plan["lut"], plan["dark_lut"] = self._tone_luts(gain, plan["contrast"])
+        plan["scan_frequency"] = max(params["Scan Line Freq"], 1)
+
+        # Per-pixel tone and channel rolls commute, so the shifts can run
+        # last; each channel is rolled once by its net shift
+        shifts = np.zeros((3, 2), dtype=np.int64)
+        for _ in range(params["Color Shift Freq"] // 10):
+            channel = rng.integers(0, 3)
+            shift = rng.integers(-10, 10)
+            shifts[channel, rng.integers(0, 2)] += shift
+        plan["color_shifts"] = shifts
+        plan["blur"] = params["Blur Radius"]
+        return plan
+
+    def process(self, frame, params):
+        if frame.shape != self.shape:
+            self._allocate(frame.shape)
+        timer = self.timer
+        h, w = frame.shape[:2]
+        plan = self._plan(params, h, w)
+        current = frame  # Never written to
+
+        with timer.stage("pixelate"):
+            pixel_size = max(params["Pixel Size"], 1)
+            if pixel_size > 1:
+                size = (w // pixel_size, h // pixel_size)
+                if size not in self.small:
+                    self.small[size] = np.empty((size[1], size[0], frame.shape[2]), dtype=np.uint8)
+                small = self.small[size]
+                cv2.resize(current, size, dst=small, interpolation=cv2.INTER_LINEAR)
+                cv2.resize(small, (w, h), dst=self.ping, interpolation=cv2.INTER_NEAREST)
+                current = self.ping
+
+        with timer.stage("glitch"):
+            dy, dx = plan["glitch"]
+            if dx % w or dy % h:
+                target = self._other(current)
+                roll_into(current, target, dy, dx)
+                current = target
+
+        with timer.stage("particles"):
+            plan["has_particles"] = self.particle_field.render(
+                self.particles, params["Particle Density"], params["Particle Speed"],
+                params["Streak Intensity"] / 100) > 0
+
+        with timer.stage("binary"):
+            self._binary = self._binary_layer(h, w, params) if plan["opacity"] > 0 else None
+
+        with timer.stage("tone"):
+            target = self._other(current) if current is not frame else self.ping
+            self._tone(current, target, plan)
+            current = target
+
+        with timer.stage("color_shift"):
+            for channel, (dy, dx) in enumerate(plan["color_shifts"]):
+                if dy % h or dx % w:
+                    np.copyto(self.channel, current[:, :, channel])
+                    roll_into(self.channel, current[:, :, channel], dy, dx)
+
+        with timer.stage("blur"):
+            if plan["blur"] > 0:
+                target = self._other(current)
+                self._blur(current, target, plan["blur"])
+                current = target
+        return current
+
+    def _binary_layer(self, h, w, params):
+        return self.binary_overlay.render(h, w, params["Binary Refresh"] / 100, params["Binary Scroll"])
+
+    def _tone(self, src, dst, plan):
+        tone_rows(src, dst, self.noise, self.noise_texture, self.particles, self._binary, self.overlay, 0,
+                  src.shape[0], plan)
+
+    def _blur(self, src, dst, radius):
+        size = radius * 2 + 1
+        cv2.GaussianBlur(src, (size, size), 0, dst=dst)
+
+def run_pipelined(cap, pipeline, preset_path, metrics=None, broadcast=None):
+    # Capture, processing and display each on their own thread, overlapping
+    # consecutive frames; the display shows the newest finished frame
+    timer = metrics or NULL_TIMER
+
+    def publish_result(result, frame):
+        if broadcast is not None:
+            with timer.stage("broadcast"):
+                broadcast.send(result)
+        # The pipeline reuses its output buffer, so hand the display a copy
+        latest_result.set(result.copy())
+
+    params = SharedParams(**read_trackbars())
+    frame_queue = FrameQueue(maxsize=2)
+    latest_result = LatestValue()
+    capture_thread = CaptureThread(cap, frame_queue, timer)
+    worker = ProcessingWorker(frame_queue, pipeline.process, params, publish_result, timer, "effect")
+    if metrics is not None:
+        metrics.watch("queue_dropped", lambda: frame_queue.dropped)
+    capture_thread.start()
+    worker.start()
+    try:
+        while worker.is_alive():
+            params.update(**read_trackbars())
+            final_frame = latest_result.take()
+            if final_frame is not None:
+                with timer.stage("present"):
+                    cv2.imshow(WINDOW_NAME, final_frame)
+                if metrics is not None:
+                    metrics.frame()
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                break
+            if key == ord('s'):
+                save_preset(preset_path, read_trackbars())
+                print("Saved preset to %s" % preset_path)
+    finally:
+        capture_thread.stop()
+        worker.stop()
+        capture_thread.join()
+        worker.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Cybernetic Glitch Live Feed")
+    parser.add_argument("--source", default="0", help="webcam index, video file or synthetic[:WxH]")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes for the frame-local effects (0: all on one core)")
+    parser.add_argument("--seed", type=int, help="fix the random effects, for reproducible output")
+    parser.add_argument("--preset", help="JSON preset for the initial trackbar values; 's' saves to it")
+    parser.add_argument("--metrics", metavar="SPEC", help="publish stage metrics to udp:HOST[:PORT] or shm:NAME")
+    parser.add_argument("--broadcast", metavar="NAME",
+                        help="publish the output to shared memory for server.py --stream NAME")
+    args = parser.parse_args()
+    preset_path = args.preset or "glitch_preset.json"
+    metrics, publisher = start_metrics("glitch", args.metrics, target_fps=30) if args.metrics else (None, None)
+    timer = metrics or NULL_TIMER
+    broadcast = FramePublisher(args.broadcast) if args.broadcast else None
+
+    # Initialize webcam
+    cap = open_source(args.source)
+    if not cap.isOpened():
+        print("Error: Could not open webcam.")
+        return
+
+    # Create windows for display and control
+    cv2.namedWindow(WINDOW_NAME)
+    cv2.namedWindow(BOARD_NAME, cv2.WINDOW_NORMAL)
+    create_trackbars(load_preset(args.preset) if args.preset else None)
+
+    if args.workers > 0:
+        from glitch_parallel import ParallelGlitchPipeline
+        pipeline = ParallelGlitchPipeline(args.workers, args.seed)
+        pipeline.timer = timer
+        try:
+            run_pipelined(cap, pipeline, preset_path, metrics, broadcast)
+        finally:
+            pipeline.close()
+            cap.release()
+            cv2.destroyAllWindows()
+            if broadcast is not None:
+                broadcast.close()
+            if publisher is not None:
+                publisher.stop()
+                publisher.join()
+        return
+
+    # Main loop
+    pipeline = GlitchPipeline(args.seed)
+    pipeline.timer = timer
+    while True:
+        with timer.stage("capture"):
+            ret, frame = cap.read()
+        if not ret:
+            print("Error: Could not read frame.")
+            break
+
+        with timer.stage("effect"):
+            final_frame = pipeline.process(frame, read_trackbars())
+        if broadcast is not None:
+            with timer.stage("broadcast"):
+                broadcast.send(final_frame)
+
+        # Display the result
+        with timer.stage("present"):
+            cv2.imshow(WINDOW_NAME, final_frame)
+            # Exit on 'q' key press, save the trackbars as a preset on 's'
+            key = cv2.waitKey(1) & 0xFF
+        if metrics is not None:
+            metrics.frame()
+        if key == ord('q'):
+            break
+        if key == ord('s'):
+            save_preset(preset_path, read_trackbars())
+            print("Saved preset to %s" % preset_path)
+
+    # Release resources
+    cap.release()
+    cv2.destroyAllWindows()
+    if broadcast is not None:
+        broadcast.close()
+    if publisher is not None:
+        publisher.stop()
+        publisher.join()
+
+if __name__ == "__main__":
+    main()
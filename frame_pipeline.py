@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import deque
+
+from perf_metrics import NULL_TIMER
+
+# Producer/consumer plumbing shared by the webcam apps: a capture thread
+# feeds a small drop-oldest queue, a worker processes the newest frames and
+# hands results to the UI through a single-slot mailbox.
+
+
+class FrameQueue:
+    # Bounded queue that never blocks the producer: when full, the oldest
+    # frame is discarded so consumers always work on recent input
+    def __init__(self, maxsize=2):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        # Returns None on timeout or once the queue is closed and drained
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self.closed, timeout):
+                return None
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class LatestValue:
+    # Single-slot mailbox: writers overwrite, the reader takes whatever is newest
+    def __init__(self):
+        self._value = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        # True when the slot was empty, i.e. the reader needs a fresh wake-up
+        with self._lock:
+            was_empty = self._value is None
+            self._value = value
+            return was_empty
+
+    def exchange(self, value):
+        # set() that hands back the unread value it replaced (or None), for
+        # values whose buffers must be returned to their owner
+        with self._lock:
+            previous, self._value = self._value, value
+            return previous
+
+    def take(self):
+        with self._lock:
+            value, self._value = self._value, None
+            return value
+
+
+class SharedParams:
+    # Slider values written by the UI thread and read once per frame by the
+    # worker; a snapshot keeps one frame's parameters consistent
+    def __init__(self, **values):
+        self._values = dict(values)
+        self._lock = threading.Lock()
+
+    def update(self, **values):
+        with self._lock:
+            self._values.update(values)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class Frame:
+    __slots__ = ('index', 'timestamp', 'image')
+
+    def __init__(self, index, timestamp, image):
+        self.index = index
+        self.timestamp = timestamp
+        self.image = image
+
+
+class CaptureThread(threading.Thread):
+    # timer: records each read() as the "capture" stage. After max_failures
+    # failed reads in a row (about 2 s by default; 1 ends a recording at its
+    # last frame) the source counts as gone: the thread ends and closes the
+    # queue so the worker finishes too.
+    def __init__(self, capture, queue, timer=NULL_TIMER, max_failures=400):
+        super().__init__(name='capture', daemon=True)
+        self.capture = capture
+        self.queue = queue
+        self.timer = timer
+        self.max_failures = max_failures
+        self.stop_event = threading.Event()
+        self.frames = 0
+        self.ended = False
+
+    def run(self):
+        failures = 0
+        while not self.stop_event.is_set():
+            with self.timer.stage('capture'):
+                ret, image = self.capture.read()
+            if not ret:
+                failures += 1
+                if failures >= self.max_failures:
+                    self.ended = True  # Camera unplugged or recording over
+                    break
+                # Camera hiccup; back off briefly
+                time.sleep(0.005)
+                continue
+            failures = 0
+            self.queue.put(Frame(self.frames, time.perf_counter(), image))
+            self.frames += 1
+        self.queue.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class ProcessingWorker(threading.Thread):
+    # Runs process(image, params) on the newest frames and publishes each
+    # result with on_result(result, frame); it is called from this thread
+    # and must be thread-safe. timer records each call as stage.
+    def __init__(self, queue, process, params, on_result, timer=NULL_TIMER, stage='process'):
+        super().__init__(name='processing', daemon=True)
+        self.queue = queue
+        self.process = process
+        self.timer = timer
+        self.stage = stage
+        self.params = params
+        self.on_result = on_result
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.last_latency = 0.0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            frame = self.queue.get(timeout=0.1)
+            if frame is None:
+                if self.queue.closed:
+                    break
+                continue
+            with self.timer.stage(self.stage):
+                result = self.process(frame.image, self.params.snapshot())
+            if result is None:
+                continue
+            self.processed += 1
+            self.last_latency = time.perf_counter() - frame.timestamp
+            self.on_result(result, frame)
+
+    def stop(self):
+        self.stop_event.set()
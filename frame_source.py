@@ -0,0 +1,117 @@
+import time
+
+import cv2
+import numpy as np
+
+# Frame sources with the cv2.VideoCapture interface (read/isOpened/get/release)
+# so every app can swap its webcam for a recording or a synthetic feed:
+#
+#   0, 1, ...               webcam index (the default)
+#   clip.mp4                a video file, looped
+#   synthetic               moving bright blobs over sensor noise, 640x480
+#   synthetic:1280x720      the same at another resolution
+
+
+class VideoFileSource:
+    def __init__(self, path, loop=True, realtime=False):
+        self.cap = cv2.VideoCapture(path)
+        self.loop = loop
+        # Pace reads to the file's frame rate, like a camera would
+        self.realtime = realtime
+        self.interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        self._next = time.perf_counter()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        if self.realtime:
+            delay = self._next - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next = max(self._next + self.interval, time.perf_counter() - self.interval)
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def release(self):
+        self.cap.release()
+
+
+class SyntheticSource:
+    # Deterministic test pattern: a few bright "visitors" drifting across a
+    # dark noisy background, enough to exercise motion and blob detection
+    def __init__(self, width=640, height=480, blobs=4, fps=30.0, seed=0, realtime=False):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.realtime = realtime
+        self.rng = np.random.default_rng(seed)
+        self.positions = self.rng.uniform((0, 0), (width, height), size=(blobs, 2))
+        self.velocities = self.rng.uniform(-0.02, 0.02, size=(blobs, 2)) * (width, height)
+        self.radius = max(8, min(width, height) // 12)
+        self.noise = self.rng.integers(0, 24, size=(4, height, width, 3), dtype=np.uint8)
+        self.index = 0
+        self.opened = True
+        self._next = time.perf_counter()
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        if self.realtime:
+            delay = self._next - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next = max(self._next + 1.0 / self.fps, time.perf_counter() - 1.0 / self.fps)
+
+        frame = self.noise[self.index % len(self.noise)].copy()
+        self.positions += self.velocities
+        # Bounce off the edges
+        for axis, limit in ((0, self.width), (1, self.height)):
+            out = (self.positions[:, axis] < 0) | (self.positions[:, axis] >= limit)
+            self.velocities[out, axis] *= -1
+            np.clip(self.positions[:, axis], 0, limit - 1, out=self.positions[:, axis])
+        for x, y in self.positions.astype(int):
+            cv2.circle(frame, (int(x), int(y)), self.radius, (220, 200, 180), -1)
+        self.index += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.index)
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self.opened = False
+
+
+def open_source(spec=0, realtime=True, loop=True):
+    # realtime=False lets benchmarks pull frames as fast as they can;
+    # loop=False makes a video file end instead of restarting
+    if isinstance(spec, int) or str(spec).isdigit():
+        return cv2.VideoCapture(int(spec))
+    if str(spec).startswith("synthetic"):
+        _, _, size = str(spec).partition(":")
+        width, height = (int(v) for v in size.split("x")) if size else (640, 480)
+        return SyntheticSource(width, height, realtime=realtime)
+    return VideoFileSource(spec, loop=loop, realtime=realtime)
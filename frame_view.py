@@ -0,0 +1,49 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from perf_metrics import NULL_TIMER
+
+# Video panes for the Qt webcam apps. The worker's BGR (or RGB) NumPy frame
+# is wrapped in a QImage without copying or converting it, and painted
+# straight into the widget only when a new frame arrived: no cvtColor, no
+# QPixmap per frame and no QLabel relayout. The array must stay untouched
+# while shown; the processing classes hand out frames from a pool of buffers
+# that only come back once the GUI has moved on (BlobDetector.release).
+
+# Qt >= 5.14 reads BGR byte order directly; older versions need one swap
+BGR_FORMAT = getattr(QtGui.QImage, "Format_BGR888", None)
+
+
+def wrap_image(image, bgr=True):
+    # (h, w, 3) uint8 with contiguous rows -> QImage sharing its memory
+    h, w = image.shape[:2]
+    if bgr and BGR_FORMAT is not None:
+        return QtGui.QImage(image.data, w, h, image.strides[0], BGR_FORMAT)
+    qt_image = QtGui.QImage(image.data, w, h, image.strides[0], QtGui.QImage.Format_RGB888)
+    return qt_image.rgbSwapped() if bgr else qt_image
+
+
+class FrameView(QtWidgets.QWidget):
+    # timer records each paint as stage (e.g. for perf_metrics)
+    def __init__(self, parent=None, stage="present"):
+        super().__init__(parent)
+        # Every pixel is painted, so Qt can skip erasing the background
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+        self.timer = NULL_TIMER
+        self.stage = stage
+        self._frame = None
+        self._image = None
+
+    def set_frame(self, image, bgr=True):
+        self._frame = image  # Keeps the memory behind the QImage alive
+        self._image = wrap_image(image, bgr)
+        self.update()
+
+    def paintEvent(self, event):
+        with self.timer.stage(self.stage):
+            painter = QtGui.QPainter(self)
+            if self._image is None:
+                painter.fillRect(self.rect(), QtCore.Qt.black)
+            else:
+                # Same size as the widget: a plain blit, otherwise scaled
+                painter.drawImage(self.rect(), self._image)
+            painter.end()
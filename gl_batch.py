@@ -0,0 +1,241 @@
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GLU import *
+
+# Retained-mode drawing for the advanced_blob_trigger.py effects. Geometry is
+# built with NumPy, uploaded once per frame into a persistent vertex buffer
+# and drawn with a single glDrawArrays per effect, instead of one
+# glBegin/glEnd (and a Python->GL call per vertex) per quad or point.
+
+FLOATS_PER_VERTEX = 6  # x, y, r, g, b, a
+VERTEX_STRIDE = FLOATS_PER_VERTEX * 4
+QUAD_CORNERS = np.array([[-1, -1], [1, -1], [1, 1], [-1, -1], [1, 1], [-1, 1]], dtype=np.float32)
+
+CYAN = (0.0, 1.0, 1.0, 1.0)
+ORANGE = (1.0, 0.5, 0.0)
+PARTICLE_SIZE = 5
+
+
+class DynamicVertexBuffer:
+    # Interleaved float32 [x, y, r, g, b, a] vertices in one VBO. The storage
+    # grows by doubling and is orphaned on every upload, so the driver never
+    # stalls waiting for the previous frame's draw to finish with it.
+    def __init__(self, capacity=1024):
+        self.vbo = glGenBuffers(1)
+        self.capacity = 0
+        self.count = 0
+        self._reserve(capacity)
+
+    def _reserve(self, vertices):
+        if vertices <= self.capacity:
+            return
+        capacity = max(self.capacity, 256)
+        while capacity < vertices:
+            capacity *= 2
+        self.capacity = capacity
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, capacity * VERTEX_STRIDE, None, GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def upload(self, vertices):
+        # vertices: (n, 6) float32, C-contiguous
+        self.count = len(vertices)
+        if not self.count:
+            return
+        self._reserve(self.count)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.capacity * VERTEX_STRIDE, None, GL_STREAM_DRAW)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, mode):
+        if not self.count:
+            return
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(0))
+        glColorPointer(4, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(8))
+        glDrawArrays(mode, 0, self.count)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        glDeleteBuffers(1, [self.vbo])
+
+
+def quad_vertices(centers, half_sizes, colors, out=None):
+    # Axis-aligned squares as GL_TRIANGLES, 6 vertices each, in input order.
+    # centers (n, 2), half_sizes (n,), colors (n, 4) or one RGBA tuple.
+    n = len(centers)
+    if out is None:
+        out = np.empty((n, 6, FLOATS_PER_VERTEX), dtype=np.float32)
+    out[:, :, :2] = QUAD_CORNERS
+    out[:, :, :2] *= np.asarray(half_sizes, dtype=np.float32).reshape(n, 1, 1)
+    out[:, :, :2] += np.asarray(centers, dtype=np.float32).reshape(n, 1, 2)
+    out[:, :, 2:] = np.asarray(colors, dtype=np.float32).reshape(-1, 1, 4)
+    return out.reshape(n * 6, FLOATS_PER_VERTEX)
+
+
+def as_points(positions):
+    # None, one (x, y) or (k, 2) -> (k, 2) float32 without NaN rows
+    if positions is None:
+        return np.empty((0, 2), dtype=np.float32)
+    points = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+    return points[np.isfinite(points).all(axis=1)]
+
+
+def trail_vertices(positions, blob_size):
+    # Glow trail: entry i of n fades as alpha = 1 - i/n and shrinks as
+    # r = blob_size * (1 - i/n), drawn in list order. positions (n, 2), or
+    # (n, k, 2) for k trails at once; NaN entries (a point not tracked in
+    # that frame) are skipped.
+    positions = np.asarray(positions, dtype=np.float32)
+    n = len(positions)
+    fade = np.broadcast_to((1.0 - np.arange(n, dtype=np.float32) / n).reshape((n,) + (1,) * (positions.ndim - 2)),
+                           positions.shape[:-1]).ravel()
+    positions = positions.reshape(-1, 2)
+    valid = np.isfinite(positions).all(axis=1)
+    positions, fade = positions[valid], fade[valid]
+    colors = np.empty((len(fade), 4), dtype=np.float32)
+    colors[:, :3] = ORANGE
+    colors[:, 3] = fade
+    return quad_vertices(positions, blob_size * fade, colors)
+
+
+class BlobRenderer:
+    # GL state and buffers behind GLWidget; needs a current context for
+    # every call. Usable from a QGLWidget or an offscreen context.
+    def __init__(self):
+        self._vertices = None
+
+    def initialize(self):
+        glClearColor(0.0, 0.0, 0.0, 1.0)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        self.lines = DynamicVertexBuffer(2)
+        self.quads = DynamicVertexBuffer()
+        self.points = DynamicVertexBuffer()
+
+    def resize(self, w, h):
+        glViewport(0, 0, w, h)
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        gluOrtho2D(0, w, h, 0)
+        glMatrixMode(GL_MODELVIEW)
+        # Vertical trigger line at x=320
+        self.lines.upload(np.array([[320, 0, 1, 1, 1, 1], [320, 480, 1, 1, 1, 1]], dtype=np.float32))
+
+    def paint(self, blob_pos, prev_pos, blob_size, effect_type, particles=None):
+        # blob_pos: one (x, y) or (k, 2) trigger points; prev_pos: the trail
+        # as (n, 2) or (n, k, 2), oldest first
+        glClear(GL_COLOR_BUFFER_BIT)
+        glLoadIdentity()
+        self.lines.draw(GL_LINES)
+
+        if effect_type == "particles":
+            # Live particles keep flying after the hand is lost
+            if particles is not None:
+                self.points.upload(self.particle_vertices(particles))
+                glPointSize(PARTICLE_SIZE)
+                self.points.draw(GL_POINTS)
+            return
+        points = as_points(blob_pos)
+        if not len(points):
+            return
+        if effect_type == "glow":
+            if prev_pos is not None and len(prev_pos):
+                self.quads.upload(trail_vertices(prev_pos, blob_size))
+                self.quads.draw(GL_TRIANGLES)
+        else:
+            self.quads.upload(quad_vertices(points, np.full(len(points), blob_size / 2), CYAN))
+            self.quads.draw(GL_TRIANGLES)
+
+    def particle_vertices(self, particles):
+        # Reuses one scratch array sized to the pool, so the per-frame
+        # cost is a few slice copies with no allocation
+        n = particles.count
+        if self._vertices is None or len(self._vertices) < particles.capacity:
+            self._vertices = np.empty((particles.capacity, FLOATS_PER_VERTEX), dtype=np.float32)
+        vertices = self._vertices[:n]
+        vertices[:, :2] = particles.pos[:n, :2]
+        vertices[:, 2:5] = particles.color[:n]
+        particles.alpha(out=vertices[:, 5])
+        return vertices
+
+    def delete(self):
+        for buffer in (self.lines, self.quads, self.points):
+            buffer.delete()
+
+
+# Full-viewport quad as x, y, u, v: image row 0 (v = 0) at the top
+FRAME_QUAD = np.array([[-1, -1, 0, 1], [1, -1, 1, 1], [1, 1, 1, 0], [-1, 1, 0, 0]], dtype=np.float32)
+
+
+class FrameTexture:
+    # Camera frames shown through one persistent texture. Storage is only
+    # (re)allocated when the frame size changes; every other frame is a
+    # glTexSubImage2D straight from the BGR (or RGB) NumPy buffer, so there
+    # is no color conversion or copy on the CPU side.
+    def __init__(self):
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        self.size = None
+
+    def resize(self, w, h):
+        glViewport(0, 0, w, h)
+
+    def upload(self, image, bgr=True):
+        # image: (h, w, 3) uint8 with contiguous rows
+        h, w = image.shape[:2]
+        image = np.ascontiguousarray(image)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        pixel_format = GL_BGR if bgr else GL_RGB
+        if self.size != (w, h):
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB8, w, h, 0, pixel_format, GL_UNSIGNED_BYTE, image)
+            self.size = (w, h)
+        else:
+            glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, w, h, pixel_format, GL_UNSIGNED_BYTE, image)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def draw(self):
+        # Stretches the last uploaded frame over the whole viewport
+        if self.size is None:
+            glClear(GL_COLOR_BUFFER_BIT)
+            return
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        # Pointers into the interleaved array itself (a sliced view would be
+        # copied by PyOpenGL and lose the stride)
+        glVertexPointer(2, GL_FLOAT, 16, ctypes.c_void_p(FRAME_QUAD.ctypes.data))
+        glTexCoordPointer(2, GL_FLOAT, 16, ctypes.c_void_p(FRAME_QUAD.ctypes.data + 8))
+        glDrawArrays(GL_TRIANGLE_FAN, 0, 4)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+
+    def delete(self):
+        glDeleteTextures(1, [self.texture])
@@ -0,0 +1,231 @@
+import argparse
+import multiprocessing
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from cybernetic_glitch_feed import (BAND_ROWS, GlitchPipeline, blur_rows, default_params, gather_cells,
+                                    tone_rows)
+from frame_source import open_source
+
+# Multi-core GlitchPipeline. The frame buffers live in shared memory; the
+# whole-frame stages (pixelate, glitch roll, color shift) and the stateful
+# layers (particle field, binary grid) run in the calling process, while the
+# frame-local stages (noise, tone/scan lines/contrast, binary tiles, blur)
+# are split into horizontal bands processed by a pool of worker processes.
+# All randomness comes from the pipeline's seeded plan and every band
+# computes the same pixels the serial pass would, so the output is identical
+# to GlitchPipeline with the same seed, for any number of workers:
+#
+#   python glitch_parallel.py --source synthetic:1920x1080 --workers 1 2 4 8
+#
+# reports throughput per worker count and checks each against the serial
+# pipeline. cybernetic_glitch_feed.py --workers N uses it for the live feed.
+
+BUFFERS = ("input", "ping", "pong", "noise", "noise_texture", "particles", "overlay", "binary")
+
+
+def _attach(spec):
+    # spec: {name: (shm name, shape, dtype)} -> ({name: array}, [blocks])
+    blocks, arrays = [], {}
+    for name, (shm_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return arrays, blocks
+
+
+def _worker(conn):
+    # Serves band tasks from the coordinator until it sends None
+    cv2.setNumThreads(1)  # The pool is the parallelism
+    arrays, blocks, tiles, cell = {}, [], None, 0
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        kind = task[0]
+        try:
+            if kind == "attach":
+                arrays = None
+                for block in blocks:
+                    block.close()
+                spec, tiles, cell = task[1:]
+                arrays, blocks = _attach(spec)
+            elif kind == "tone":
+                _, src, dst, y0, y1, plan = task
+                width = arrays["ping"].shape[1]
+                binary = arrays["binary"]
+                if plan["opacity"] > 0:
+                    bottom = min(-(-y1 // cell) * cell, len(binary))
+                    gather_cells(tiles, arrays["grid"], binary[y0:bottom], cell, y0 // cell)
+                tone_rows(arrays[src], arrays[dst], arrays["noise"], arrays["noise_texture"], arrays["particles"],
+                          binary[:, :width], arrays["overlay"], y0, y1, plan)
+            elif kind == "blur":
+                _, src, dst, y0, y1, radius = task
+                blur_rows(arrays[src], arrays[dst], y0, y1, radius)
+            conn.send(None)
+        except Exception:
+            conn.send(traceback.format_exc())
+    arrays = None
+    for block in blocks:
+        block.close()
+
+
+class ParallelGlitchPipeline(GlitchPipeline):
+    def __init__(self, workers, seed=None):
+        super().__init__(seed)
+        if BAND_ROWS % self.binary_overlay.cell:
+            raise ValueError("BAND_ROWS must be a multiple of the binary cell size")
+        # spawn: safe with OpenCV's threads and the same on every platform
+        context = multiprocessing.get_context("spawn")
+        self.connections, self.processes = [], []
+        for _ in range(workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=_worker, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        self.blocks = []
+
+    def _buffer(self, name, shape):
+        nbytes = int(np.prod(shape))
+        block = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.blocks.append(block)
+        self.spec[name] = (block.name, shape, np.uint8)
+        return np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+
+    def _allocate(self, shape):
+        self._release()
+        self.spec = {}
+        super()._allocate(shape)
+        self.input = self._buffer("input", shape)
+        cell = self.binary_overlay.cell
+        rows, cols = -(-shape[0] // cell), -(-shape[1] // cell)
+        # Padded to whole cells, like BinaryOverlay's canvas
+        self.binary = self._buffer("binary", (rows * cell, cols * cell, 3))
+        block = shared_memory.SharedMemory(create=True, size=rows * cols * 8)
+        self.blocks.append(block)
+        self.spec["grid"] = (block.name, (rows, cols), np.int64)
+        self.grid = np.ndarray((rows, cols), dtype=np.int64, buffer=block.buf)
+        self.names = {id(getattr(self, name)): name for name in BUFFERS}
+        self._broadcast(("attach", self.spec, self.binary_overlay.tiles, cell))
+
+    def _bands(self, h):
+        # One contiguous run of whole bands per worker
+        bands = -(-h // BAND_ROWS)
+        edges = np.linspace(0, bands, len(self.connections) + 1).round().astype(int) * BAND_ROWS
+        return [(y0, min(y1, h)) for y0, y1 in zip(edges[:-1], edges[1:]) if y0 < min(y1, h)]
+
+    def _broadcast(self, task):
+        for conn in self.connections:
+            conn.send(task)
+        self._wait(len(self.connections))
+
+    def _run(self, tasks):
+        for conn, task in zip(self.connections, tasks):
+            conn.send(task)
+        self._wait(len(tasks))
+
+    def _wait(self, count):
+        errors = [error for error in (conn.recv() for conn in self.connections[:count]) if error]
+        if errors:
+            raise RuntimeError("Glitch worker failed:\n" + errors[0])
+
+    def _binary_layer(self, h, w, params):
+        # Only the grid advances here; the workers draw the tiles of their bands
+        self.binary_overlay.update(h, w, params["Binary Refresh"] / 100, params["Binary Scroll"])
+        self.grid[:] = self.binary_overlay.grid
+        return self.binary[:h, :w]
+
+    def _tone(self, src, dst, plan):
+        h = src.shape[0]
+        if src is not self.ping and src is not self.pong:
+            # The untouched input frame: workers can only see shared buffers
+            np.copyto(self.input, src)
+            src = self.input
+        src_name, dst_name = self.names[id(src)], self.names[id(dst)]
+        self._run([("tone", src_name, dst_name, y0, y1, plan) for y0, y1 in self._bands(h)])
+
+    def _blur(self, src, dst, radius):
+        src_name, dst_name = self.names[id(src)], self.names[id(dst)]
+        self._run([("blur", src_name, dst_name, y0, y1, radius) for y0, y1 in self._bands(src.shape[0])])
+
+    def _release(self):
+        # Drop every view of the shared blocks before unmapping them
+        for name in BUFFERS + ("grid", "_binary"):
+            self.__dict__.pop(name, None)
+        self.shape = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def close(self):
+        for conn in self.connections:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.connections, self.processes = [], []
+        self._release()
+
+
+def run(pipeline, frames, params):
+    # Outputs of every frame and the throughput, not counting the first
+    # frame (worker start-up and buffer allocation)
+    outputs, times = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        outputs.append(pipeline.process(frame, params).copy())
+        times.append(time.perf_counter() - start)
+    return outputs, (len(times) - 1) / sum(times[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the glitch chain by worker count")
+    parser.add_argument("--source", default="synthetic:1920x1080", help="video file or synthetic[:WxH]")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--blur", type=int, default=2, help="Blur Radius for the run (0 skips the blur bands)")
+    args = parser.parse_args()
+
+    source = open_source(args.source, realtime=False)
+    if not source.isOpened():
+        raise SystemExit("Cannot open video source %r" % args.source)
+    frames = []
+    for _ in range(max(args.frames, 2)):
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames.append(frame)
+    source.release()
+    params = default_params()
+    params["Blur Radius"] = args.blur
+
+    print("%d frames of %dx%d, %d CPUs" % (len(frames), frames[0].shape[1], frames[0].shape[0],
+                                          multiprocessing.cpu_count()))
+    print("%-8s %9s %9s %9s  %s" % ("workers", "fps", "ms/frame", "speedup", "output"))
+    reference, serial_fps = run(GlitchPipeline(args.seed), frames, params)
+    print("%-8s %9.1f %9.2f %9.2f  %s" % ("serial", serial_fps, 1000 / serial_fps, 1.0, "reference"))
+    for workers in args.workers:
+        pipeline = ParallelGlitchPipeline(workers, args.seed)
+        try:
+            outputs, fps = run(pipeline, frames, params)
+        finally:
+            pipeline.close()
+        identical = all(np.array_equal(a, b) for a, b in zip(outputs, reference))
+        print("%-8d %9.1f %9.2f %9.2f  %s" % (workers, fps, 1000 / fps, fps / serial_fps,
+                                            "identical" if identical else "DIFFERS"), flush=True)
+
+
+if __name__ == "__main__":
+    main()
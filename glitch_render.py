@@ -0,0 +1,249 @@
+import argparse
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import cv2
+
+from cybernetic_glitch_feed import GlitchPipeline, default_params, load_preset
+from frame_source import open_source
+
+# Offline rendering of the glitch effect chain: reads a video file, applies
+# GlitchPipeline with the parameters of a preset (as saved with 's' in the
+# live feed) and streams the result into an encoder. Decoding and encoding
+# run on their own threads next to the processing, connected by small
+# blocking queues, so all three work at once and nothing is dropped:
+#
+#   python glitch_render.py clip.mp4 promo.mp4 --preset glitch_preset.json --seed 1
+#
+# Encodes with the ffmpeg binary (H.264, the input's audio copied) when it
+# is installed, otherwise with OpenCV's VideoWriter.
+
+QUEUE_FRAMES = 4  # Frames in flight between each pair of stages
+
+
+class Stop(Exception):
+    pass
+
+
+def put(items, item, stop):
+    # Blocking put that gives up once another stage has failed
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+    raise Stop()
+
+
+def get(items, stop):
+    while not stop.is_set():
+        try:
+            return items.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    raise Stop()
+
+
+class OpenCVEncoder:
+    FOURCC = {".mp4": "mp4v", ".mov": "mp4v", ".avi": "MJPG", ".mkv": "XVID"}
+
+    def __init__(self, path, fps, size, fourcc=None):
+        fourcc = fourcc or self.FOURCC.get(os.path.splitext(path)[1].lower(), "mp4v")
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise RuntimeError("OpenCV cannot write %s with fourcc %s" % (path, fourcc))
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+
+class FfmpegEncoder:
+    # Raw BGR frames piped into ffmpeg; the audio of audio_from (if any) is
+    # copied into the output
+    def __init__(self, path, fps, size, crf=18, preset="medium", audio_from=None):
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", "%dx%d" % size, "-r", "%g" % fps, "-i", "-"]
+        if audio_from:
+            command += ["-i", audio_from, "-map", "0:v", "-map", "1:a?", "-c:a", "copy", "-shortest"]
+        command += ["-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p", path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame.data)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait():
+            raise RuntimeError("ffmpeg exited with status %d" % self.process.returncode)
+
+
+def open_encoder(args, fps, size):
+    encoder = args.encoder
+    if encoder == "auto":
+        encoder = "ffmpeg" if shutil.which("ffmpeg") else "opencv"
+    if encoder == "ffmpeg":
+        audio = args.input if os.path.isfile(args.input) else None
+        return FfmpegEncoder(args.output, fps, size, args.crf, args.x264_preset, audio)
+    return OpenCVEncoder(args.output, fps, size, args.fourcc)
+
+
+class StageThread(threading.Thread):
+    # Runs target(); an exception is kept for the main thread and stops the
+    # other stages
+    def __init__(self, name, target, stop):
+        super().__init__(name=name, daemon=True)
+        self.target_function = target
+        self.stop = stop
+        self.error = None
+
+    def run(self):
+        try:
+            self.target_function()
+        except Stop:
+            pass
+        except BaseException as exc:
+            self.error = exc
+            self.stop.set()
+
+
+def render(args):
+    source = open_source(args.input, realtime=False, loop=False)
+    if not source.isOpened():
+        raise SystemExit("Cannot open %s" % args.input)
+    fps = source.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(source.get(cv2.CAP_PROP_FRAME_COUNT))
+    if args.frames:
+        total = min(total, args.frames) if total > 0 else args.frames
+    params = load_preset(args.preset) if args.preset else default_params()
+    if args.workers > 0:
+        from glitch_parallel import ParallelGlitchPipeline
+        pipeline = ParallelGlitchPipeline(args.workers, args.seed)
+    else:
+        pipeline = GlitchPipeline(args.seed)
+
+    stop = threading.Event()
+    decoded = queue.Queue(QUEUE_FRAMES)
+    processed = queue.Queue(QUEUE_FRAMES)
+    free = queue.Queue()  # Output buffers the encoder is done with
+    waits = {"decode": 0.0, "encode": 0.0}
+
+    def decode():
+        count = 0
+        try:
+            while not args.frames or count < args.frames:
+                ret, frame = source.read()
+                if not ret:
+                    break
+                put(decoded, frame, stop)
+                count += 1
+        finally:
+            source.release()
+            if not stop.is_set():
+                put(decoded, None, stop)
+
+    encoder = None
+
+    def encode():
+        nonlocal encoder
+        while True:
+            frame = get(processed, stop)
+            if frame is None:
+                break
+            if encoder is None:
+                encoder = open_encoder(args, fps, (frame.shape[1], frame.shape[0]))
+            encoder.write(frame)
+            free.put(frame)
+
+    threads = [StageThread("decode", decode, stop), StageThread("encode", encode, stop)]
+    for thread in threads:
+        thread.start()
+
+    start = last_report = time.perf_counter()
+    frames = 0
+    try:
+        while True:
+            wait = time.perf_counter()
+            frame = get(decoded, stop)
+            waits["decode"] += time.perf_counter() - wait
+            if frame is None:
+                break
+            result = pipeline.process(frame, params)
+            if not frames:
+                # A fixed set of output buffers cycles through the encoder,
+                # so a slow encoder holds processing back instead of
+                # frames piling up in memory
+                for _ in range(QUEUE_FRAMES + 2):
+                    free.put(result.copy())
+            wait = time.perf_counter()
+            out = get(free, stop)
+            waits["encode"] += time.perf_counter() - wait
+            out[...] = result
+            put(processed, out, stop)
+            frames += 1
+
+            now = time.perf_counter()
+            if now - last_report >= 1.0:
+                last_report = now
+                rate = frames / (now - start)
+                progress = "%d/%d" % (frames, total) if total > 0 else "%d" % frames
+                eta = " eta %.0f s" % ((total - frames) / rate) if total > 0 else ""
+                print("%s frames  %.1f fps  %.1fx real time%s" % (progress, rate, rate / fps, eta), flush=True)
+        put(processed, None, stop)
+    except Stop:
+        pass
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+        if hasattr(pipeline, "close"):
+            pipeline.close()
+        if encoder is not None and stop.is_set():
+            # A stage already failed: closing must not replace that error
+            try:
+                encoder.close()
+            except Exception:
+                pass
+    for thread in threads:
+        if thread.error is not None:
+            raise thread.error
+    if encoder is not None:
+        encoder.close()  # Flushes the file; a failure here is the run's error
+
+    elapsed = time.perf_counter() - start
+    rate = frames / elapsed if elapsed else 0.0
+    print("Rendered %d frames to %s in %.1f s: %.1f fps, %.1fx real time" % (
+        frames, args.output, elapsed, rate, rate / fps))
+    # Time the processing stage spent idle shows which stage limits the run
+    print("processing waited %.1f s for decode, %.1f s for encode" % (waits["decode"], waits["encode"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a video through the glitch effect chain")
+    parser.add_argument("input", help="video file (or synthetic[:WxH] with --frames)")
+    parser.add_argument("output", help="output video file")
+    parser.add_argument("--preset", help="JSON preset of trackbar values (defaults otherwise)")
+    parser.add_argument("--seed", type=int, help="fix the random effects, for reproducible renders")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes for the frame-local effects")
+    parser.add_argument("--frames", type=int, default=0, help="stop after this many frames")
+    parser.add_argument("--encoder", choices=["auto", "ffmpeg", "opencv"], default="auto")
+    parser.add_argument("--crf", type=int, default=18, help="ffmpeg H.264 quality (lower is better)")
+    parser.add_argument("--x264-preset", default="medium", help="ffmpeg H.264 speed preset")
+    parser.add_argument("--fourcc", help="OpenCV codec, e.g. mp4v or MJPG (default from the extension)")
+    args = parser.parse_args()
+    if args.input.startswith("synthetic") and not args.frames:
+        parser.error("a synthetic input needs --frames")
+    render(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import argparse
+import ctypes
+import socket
+import struct
+import time
+
+import numpy as np
+from OpenGL.GL import *
+
+# Getting rendered frames onto the physical LED cylinder without a desktop
+# window in the loop: render into a framebuffer object, read it back through
+# double-buffered pixel buffer objects (the copy of frame N overlaps
+# rendering of frame N+1), resample it to the LED grid with a precomputed
+# index map and hand the LED colors to a sink (file, shared memory or UDP).
+#
+# python led_output.py --listen udp:127.0.0.1:7000 (or shm:NAME) runs a
+# stand-in controller that reports the frame rate it receives.
+
+
+class Framebuffer:
+    # RGBA8 color + depth render target of a fixed size
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.fbo = glGenFramebuffers(1)
+        self.color, self.depth = glGenRenderbuffers(2)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("Framebuffer incomplete: 0x%x" % status)
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+
+    def blit_to_screen(self):
+        # Show the frame in the window as well (windowed mode)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, 0)
+        glBlitFramebuffer(0, 0, self.width, self.height, 0, 0, self.width, self.height,
+                          GL_COLOR_BUFFER_BIT, GL_NEAREST)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+
+    def delete(self):
+        glDeleteFramebuffers(1, [self.fbo])
+        glDeleteRenderbuffers(2, [self.color, self.depth])
+
+
+class AsyncReadback:
+    # glReadPixels into one PBO while the previous frame's PBO is mapped and
+    # consumed, so readback never waits for the frame that was just drawn.
+    # Frames come out one frame late; with buffers > 2 the GPU gets more slack.
+    def __init__(self, width, height, buffers=2):
+        self.width = width
+        self.height = height
+        self.size = width * height * 4
+        self.pbos = [int(pbo) for pbo in np.atleast_1d(glGenBuffers(buffers))]
+        for pbo in self.pbos:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.frames = 0
+
+    def read(self, consume):
+        # Starts reading the currently bound read framebuffer and calls
+        # consume(pixels) with the oldest completed frame: (height, width, 4)
+        # uint8 RGBA, bottom row first, only valid during the call
+        pbos = self.pbos
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbos[self.frames % len(pbos)])
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        self.frames += 1
+        if self.frames >= len(pbos):
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbos[self.frames % len(pbos)])
+            address = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.size, GL_MAP_READ_BIT)
+            try:
+                pixels = np.ctypeslib.as_array((ctypes.c_ubyte * self.size).from_address(address))
+                consume(pixels.reshape(self.height, self.width, 4))
+            finally:
+                glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+    def delete(self):
+        glDeleteBuffers(len(self.pbos), self.pbos)
+
+
+class LedMap:
+    # columns x rows LEDs wrapped around the cylinder, sampled from a
+    # width x height framebuffer. index is the flat pixel index for every
+    # LED in wiring order, computed once; resampling a frame is one gather.
+    # serpentine: every other column (strip) runs bottom-to-top.
+    def __init__(self, columns, rows, width, height, serpentine=False):
+        self.columns = columns
+        self.rows = rows
+        self.count = columns * rows
+        xs = ((np.arange(columns) + 0.5) * width / columns).astype(np.int64)
+        # Row 0 is the top LED; the framebuffer's first row is the bottom
+        ys = (height - 1 - ((np.arange(rows) + 0.5) * height / rows).astype(np.int64))
+        grid = ys[None, :] * width + xs[:, None]  # (columns, rows)
+        if serpentine:
+            grid[1::2] = grid[1::2, ::-1]
+        self.index = grid.ravel()
+        self.colors = np.empty((self.count, 3), dtype=np.uint8)
+
+    def resample(self, pixels):
+        # pixels: (height, width, 4) RGBA -> self.colors (count, 3) RGB
+        np.take(pixels.reshape(-1, 4)[:, :3], self.index, axis=0, out=self.colors)
+        return self.colors
+
+
+class NullSink:
+    def send(self, colors):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    # Raw RGB frames appended back to back (count * 3 bytes each)
+    def __init__(self, path):
+        self.file = open(path, "wb")
+
+    def send(self, colors):
+        self.file.write(colors.data)
+
+    def close(self):
+        self.file.close()
+
+
+SHM_HEADER = struct.Struct("<QI")  # sequence, LED count
+
+
+class SharedMemorySink:
+    # Latest frame in a named shared-memory block for a controller process on
+    # the same machine: header (sequence, LED count) + RGB bytes. The
+    # sequence is odd while a frame is being written (seqlock), so readers
+    # retry instead of seeing a torn frame.
+    def __init__(self, name, count):
+        from multiprocessing import shared_memory
+        size = SHM_HEADER.size + count * 3
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a run that didn't clean up
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.count = count
+        self.sequence = 0
+        self.data = np.ndarray((count, 3), dtype=np.uint8, buffer=self.shm.buf, offset=SHM_HEADER.size)
+        SHM_HEADER.pack_into(self.shm.buf, 0, self.sequence, count)
+
+    def send(self, colors):
+        SHM_HEADER.pack_into(self.shm.buf, 0, self.sequence + 1, self.count)
+        self.data[:] = colors
+        self.sequence += 2
+        SHM_HEADER.pack_into(self.shm.buf, 0, self.sequence, self.count)
+
+    def close(self):
+        del self.data
+        self.shm.close()
+        self.shm.unlink()
+
+
+UDP_HEADER = struct.Struct("<IHH")  # frame number, packet index, packet count
+UDP_PAYLOAD = 1440 - UDP_HEADER.size  # stays under a typical 1500-byte MTU
+
+
+class UdpSink:
+    # Each frame as numbered datagrams of whole LEDs; a controller applies a
+    # frame once all its packets arrived and drops frames with gaps
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.frame = 0
+        self.dropped = 0
+
+    def send(self, colors):
+        data = colors.data.cast("B")
+        step = UDP_PAYLOAD - UDP_PAYLOAD % 3
+        packets = (len(data) + step - 1) // step
+        for i in range(packets):
+            try:
+                self.socket.sendto(UDP_HEADER.pack(self.frame, i, packets) + data[i * step:(i + 1) * step],
+                                   self.address)
+            except BlockingIOError:
+                # Socket buffer full: never stall the render loop for output
+                self.dropped += 1
+        self.frame = (self.frame + 1) & 0xFFFFFFFF
+
+    def close(self):
+        self.socket.close()
+
+
+def open_sink(spec, count):
+    # "none", "file:PATH", "shm:NAME" or "udp:HOST:PORT"
+    kind, _, rest = (spec or "none").partition(":")
+    if kind == "none":
+        return NullSink()
+    if kind == "file":
+        return FileSink(rest or "led_frames.raw")
+    if kind == "shm":
+        return SharedMemorySink(rest or "led_frames", count)
+    if kind == "udp":
+        host, _, port = rest.rpartition(":")
+        return UdpSink(host or "127.0.0.1", int(port or 7000))
+    raise ValueError("Unknown LED sink %r" % spec)
+
+
+def listen_udp(host, port, seconds):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+    sock.settimeout(0.5)
+    frames = incomplete = 0
+    current, received, expected = None, 0, 0
+    deadline = time.monotonic() + seconds
+    report = time.monotonic() + 1
+    while time.monotonic() < deadline:
+        try:
+            packet = sock.recv(2048)
+        except socket.timeout:
+            continue
+        frame, index, count = UDP_HEADER.unpack_from(packet)
+        if frame != current:
+            if current is not None and received < expected:
+                incomplete += 1
+            current, received, expected = frame, 0, count
+        received += 1
+        if received == expected:
+            frames += 1
+        if time.monotonic() >= report:
+            print("%d frames/s, %d incomplete" % (frames, incomplete), flush=True)
+            frames = incomplete = 0
+            report += 1
+    sock.close()
+
+
+def listen_shm(name, seconds):
+    from multiprocessing import resource_tracker, shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    # Only attached here; the renderer owns the block and unlinks it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    last = None
+    count = 0
+    frames = 0
+    level = 0.0  # Mean channel value of the last frame, to show data moves
+    deadline = time.monotonic() + seconds
+    report = time.monotonic() + 1
+    while time.monotonic() < deadline:
+        sequence, count = SHM_HEADER.unpack_from(shm.buf, 0)
+        if sequence % 2 == 0 and sequence != last:
+            colors = np.frombuffer(bytes(shm.buf[SHM_HEADER.size:SHM_HEADER.size + count * 3]), np.uint8)
+            if SHM_HEADER.unpack_from(shm.buf, 0)[0] == sequence:  # not overwritten meanwhile
+                last = sequence
+                frames += 1
+                level = colors.mean() if len(colors) else 0.0
+        if time.monotonic() >= report:
+            print("%d frames/s (%d LEDs, mean level %.0f)" % (frames, count, level), flush=True)
+            frames = 0
+            report += 1
+        time.sleep(0.001)
+    shm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in LED controller: receive frames and report the rate")
+    parser.add_argument("--listen", default="udp:127.0.0.1:7000", help="udp:HOST:PORT or shm:NAME")
+    parser.add_argument("--seconds", type=float, default=3600)
+    args = parser.parse_args()
+    kind, _, rest = args.listen.partition(":")
+    if kind == "udp":
+        host, _, port = rest.rpartition(":")
+        listen_udp(host or "127.0.0.1", int(port or 7000), args.seconds)
+    elif kind == "shm":
+        listen_shm(rest or "led_frames", args.seconds)
+    else:
+        raise SystemExit("Unknown listener %r" % args.listen)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# Stage timing for the hot paths. Processing code calls
+#   with self.timer.stage("blur"): ...
+# and defaults to NULL_TIMER, which costs one method call per stage.
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}  # stage name -> [seconds, ...]
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+    def reset(self):
+        self.samples.clear()
+
+
+class NullTimer:
+    _null = nullcontext()
+
+    def stage(self, name):
+        return self._null
+
+
+NULL_TIMER = NullTimer()
+
+
+# Live metrics for the installation. Metrics has the same stage() interface
+# as StageTimer, so it can be assigned as the .timer of the processing
+# classes, and records into fixed log-spaced histograms: recording is a
+# bisect and a few adds, with no per-sample storage. A MetricsPublisher thread
+# sends a snapshot every second over UDP (to server.py on another machine)
+# or into a named shared-memory block (same machine); MetricsCollector
+# gathers them for server.py's /metrics endpoint and dashboard.
+#
+#   metrics, publisher = start_metrics("glitch", "udp:192.168.1.10:9109", target_fps=30)
+#   with metrics.stage("capture"): ...
+#   metrics.frame()  # once per displayed frame
+
+# Histogram bucket upper bounds in seconds: 50 us to about 10 s in 25% steps
+BUCKET_BOUNDS = [50e-6 * 1.25 ** i for i in range(56)]
+METRICS_PORT = 9109
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)  # last bucket: above the top bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+def bucket_quantile(counts, q):
+    # Upper bound of the bucket holding quantile q, in seconds (None if empty)
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, n in enumerate(counts):
+        seen += n
+        if seen >= rank and n:
+            return BUCKET_BOUNDS[min(i, len(BUCKET_BOUNDS) - 1)]
+    return BUCKET_BOUNDS[-1]
+
+
+class Metrics:
+    # Per-app registry of stage histograms and counters. Safe to record from
+    # several threads as long as each stage name is recorded by one thread.
+    def __init__(self, app, target_fps=None):
+        self.app = app
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.target_fps = target_fps
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._last_frame = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(seconds)
+
+    def frame(self):
+        # Frame-to-frame interval; with a target rate, frames that took over
+        # 1.5 intervals (a frame shown twice) count as late
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            interval = now - self._last_frame
+            self.observe("frame", interval)
+            if self.target_fps and interval > 1.5 / self.target_fps:
+                self.count("late_frames")
+        self._last_frame = now
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def watch(self, name, read):
+        # read() is called at snapshot time, e.g. lambda: queue.dropped
+        self.gauges[name] = read
+
+    def snapshot(self):
+        counters = dict(self.counters)
+        for name, read in list(self.gauges.items()):
+            counters[name] = read()
+        return {
+            "app": self.app,
+            "host": self.host,
+            "pid": self.pid,
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "stages": {name: {"counts": list(h.counts), "count": h.count, "sum": h.total, "max": h.max}
+                       for name, h in list(self.histograms.items())},
+            "counters": counters,
+        }
+
+
+def window_stats(previous, current, seconds):
+    # Rate and percentiles of the samples between two snapshots of a stage
+    counts = [b - a for a, b in zip(previous["counts"], current["counts"])] if previous else current["counts"]
+    n = sum(counts)
+    stats = {"rate": n / seconds if seconds else 0.0, "count": n}
+    for key, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        value = bucket_quantile(counts, q)
+        stats[key] = value * 1000 if value is not None else None
+    total = current["sum"] - (previous["sum"] if previous else 0.0)
+    stats["mean_ms"] = total / n * 1000 if n else None
+    return stats
+
+
+class UdpChannel:
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, data):
+        try:
+            self.socket.sendto(data, self.address)
+        except OSError:
+            pass  # Collector down or network gone: metrics must never stop the app
+
+    def close(self):
+        self.socket.close()
+
+
+SHM_METRICS_HEADER = struct.Struct("<QI")  # sequence (odd while writing), payload length
+SHM_METRICS_SIZE = 256 * 1024
+
+
+class SharedMemoryChannel:
+    # Latest snapshot as JSON in a named block, seqlocked like led_output's
+    # SharedMemorySink
+    def __init__(self, name):
+        from multiprocessing import shared_memory
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=SHM_METRICS_SIZE)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=SHM_METRICS_SIZE)
+        self.sequence = 0
+        SHM_METRICS_HEADER.pack_into(self.shm.buf, 0, 0, 0)
+
+    def send(self, data):
+        data = data[:SHM_METRICS_SIZE - SHM_METRICS_HEADER.size]
+        SHM_METRICS_HEADER.pack_into(self.shm.buf, 0, self.sequence + 1, len(data))
+        self.shm.buf[SHM_METRICS_HEADER.size:SHM_METRICS_HEADER.size + len(data)] = data
+        self.sequence += 2
+        SHM_METRICS_HEADER.pack_into(self.shm.buf, 0, self.sequence, len(data))
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def open_channel(spec):
+    # "udp:HOST[:PORT]" or "shm:NAME"
+    kind, _, rest = spec.partition(":")
+    if kind == "udp":
+        host, _, port = rest.partition(":")
+        return UdpChannel(host or "127.0.0.1", int(port or METRICS_PORT))
+    if kind == "shm":
+        return SharedMemoryChannel(rest or "metrics")
+    raise ValueError("Unknown metrics channel %r" % spec)
+
+
+class MetricsPublisher(threading.Thread):
+    # Sends a snapshot every interval seconds; all serialization happens on
+    # this thread, off the hot path
+    def __init__(self, metrics, spec, interval=1.0):
+        super().__init__(name="metrics", daemon=True)
+        self.metrics = metrics
+        self.channel = open_channel(spec)
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.publish()
+        self.publish()
+        self.channel.close()
+
+    def publish(self):
+        self.channel.send(json.dumps(self.metrics.snapshot(), separators=(",", ":")).encode())
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def start_metrics(app, spec, target_fps=None):
+    # Metrics and (if spec is set) a running publisher; returns (metrics,
+    # publisher or None). Apps pass --metrics straight through.
+    metrics = Metrics(app, target_fps)
+    publisher = None
+    if spec:
+        publisher = MetricsPublisher(metrics, spec)
+        publisher.start()
+    return metrics, publisher
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def valid_snapshot(snapshot):
+    # Snapshots arrive from the network: check every field the collector
+    # reads before keeping one
+    if not isinstance(snapshot, dict):
+        return False
+    if not (isinstance(snapshot.get("host"), str) and isinstance(snapshot.get("app"), str)
+            and isinstance(snapshot.get("pid"), int) and _number(snapshot.get("time"))
+            and _number(snapshot.get("uptime"))):
+        return False
+    stages, counters = snapshot.get("stages"), snapshot.get("counters")
+    if not isinstance(stages, dict) or not isinstance(counters, dict):
+        return False
+    for name, stage in stages.items():
+        if not isinstance(stage, dict) or not isinstance(stage.get("counts"), list):
+            return False
+        if len(stage["counts"]) != len(BUCKET_BOUNDS) + 1 or not all(isinstance(n, int) for n in stage["counts"]):
+            return False
+        if not (isinstance(stage.get("count"), int) and _number(stage.get("sum")) and _number(stage.get("max"))):
+            return False
+    return all(_number(value) for value in counters.values())
+
+
+def label_value(text):
+    # Escaping required inside Prometheus label values
+    return str(text).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsCollector:
+    # Latest snapshot per publisher (host, app, pid), from a UDP port and/or
+    # shared-memory blocks on this machine, plus windowed stats computed
+    # against the snapshot before it. Publishers silent for stale_after are
+    # reported down, and forgotten expire_after seconds later.
+    def __init__(self, udp=None, shm_names=(), stale_after=5.0, expire_after=60.0):
+        self.stale_after = stale_after
+        self.expire_after = expire_after
+        self.sources = {}  # key -> {"snapshot", "previous", "received"}
+        self._lock = threading.Lock()
+        self._shm = {}
+        self._shm_sequences = {}
+        self._shm_changed = {}  # name -> monotonic time the sequence last moved
+        self._shm_lock = threading.Lock()  # Polled from every request thread
+        self.shm_names = list(shm_names)
+        self.socket = None
+        if udp:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.bind(udp)
+            threading.Thread(target=self._receive, name="metrics-collector", daemon=True).start()
+
+    def _receive(self):
+        while True:
+            try:
+                data, _ = self.socket.recvfrom(65535)
+            except OSError:
+                return
+            try:
+                self._add(json.loads(data))
+            except Exception:
+                continue  # Not a metrics snapshot (malformed, or nested too deep to parse)
+
+    def _add(self, snapshot):
+        if not valid_snapshot(snapshot):
+            return
+        key = (snapshot["host"], snapshot["app"], snapshot["pid"])
+        with self._lock:
+            entry = self.sources.get(key)
+            previous = entry["snapshot"] if entry else None
+            self.sources[key] = {"snapshot": snapshot, "previous": previous, "received": time.time()}
+
+    def _poll_shm(self):
+        with self._shm_lock:
+            for name in self.shm_names:
+                self._poll_shm_block(name)
+
+    def _poll_shm_block(self, name):
+        from multiprocessing import resource_tracker, shared_memory
+        shm = self._shm.get(name)
+        if shm is None:
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            except FileNotFoundError:
+                return  # Publisher not started yet
+            # Only attached here; the publisher owns and unlinks it
+            resource_tracker.unregister(shm._name, "shared_memory")
+            self._shm[name] = shm
+            self._shm_sequences.pop(name, None)
+            self._shm_changed[name] = time.monotonic()
+        sequence, length = SHM_METRICS_HEADER.unpack_from(shm.buf, 0)
+        if sequence % 2 or not length or sequence == self._shm_sequences.get(name):
+            if time.monotonic() - self._shm_changed[name] > self.stale_after:
+                # Publisher gone or restarted under the same name; look it up again
+                shm.close()
+                del self._shm[name]
+            return
+        data = bytes(shm.buf[SHM_METRICS_HEADER.size:SHM_METRICS_HEADER.size + length])
+        if SHM_METRICS_HEADER.unpack_from(shm.buf, 0)[0] != sequence:
+            return  # Overwritten while copying; next poll gets it
+        self._shm_sequences[name] = sequence
+        self._shm_changed[name] = time.monotonic()
+        try:
+            self._add(json.loads(data))
+        except Exception:
+            pass  # Not a metrics snapshot
+
+    def _entries(self, now):
+        # Current sources, dropping those silent for over expire_after
+        with self._lock:
+            for key, entry in list(self.sources.items()):
+                if now - entry["received"] > self.stale_after + self.expire_after:
+                    del self.sources[key]
+            return list(self.sources.values())
+
+    def report(self):
+        # [{"host", "app", "pid", "age", "up", "uptime", "counters", "stages": {name: window stats}}]
+        self._poll_shm()
+        now = time.time()
+        report = []
+        for entry in sorted(self._entries(now), key=lambda e: (e["snapshot"]["host"], e["snapshot"]["app"])):
+            snapshot, previous = entry["snapshot"], entry["previous"]
+            seconds = snapshot["time"] - previous["time"] if previous else snapshot["uptime"]
+            age = now - entry["received"]
+            try:
+                stages = {name: window_stats(previous["stages"].get(name) if previous else None, stage, seconds)
+                          for name, stage in snapshot["stages"].items()}
+            except (KeyError, TypeError, ValueError, ZeroDivisionError):
+                continue  # Never let one odd publisher break the endpoint
+            report.append({
+                "host": snapshot["host"], "app": snapshot["app"], "pid": snapshot["pid"],
+                "age": age, "up": age < self.stale_after, "uptime": snapshot["uptime"],
+                "counters": snapshot["counters"], "stages": stages,
+            })
+        return report
+
+    def prometheus(self):
+        # Prometheus text exposition of the cumulative histograms and counters
+        self._poll_shm()
+        now = time.time()
+        # Each metric family must be one contiguous group
+        up, histograms, counters = ["# TYPE app_up gauge"], ["# TYPE stage_seconds histogram"], \
+            ["# TYPE app_counter counter"]
+        for entry in self._entries(now):
+            snapshot = entry["snapshot"]
+            labels = 'host="%s",app="%s",pid="%d"' % (label_value(snapshot["host"]), label_value(snapshot["app"]),
+                                                       snapshot["pid"])
+            try:
+                entry_histograms, entry_counters = [], []
+                for name, stage in snapshot["stages"].items():
+                    stage_labels = '%s,stage="%s"' % (labels, label_value(name))
+                    cumulative = 0
+                    for bound, n in zip(BUCKET_BOUNDS + [float("inf")], stage["counts"]):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else "%.6g" % bound
+                        entry_histograms.append('stage_seconds_bucket{%s,le="%s"} %d' % (stage_labels, le, cumulative))
+                    entry_histograms.append('stage_seconds_sum{%s} %.6f' % (stage_labels, stage["sum"]))
+                    entry_histograms.append('stage_seconds_count{%s} %d' % (stage_labels, stage["count"]))
+                for name, value in snapshot["counters"].items():
+                    entry_counters.append('app_counter{%s,name="%s"} %s' % (labels, label_value(name), value))
+            except (KeyError, TypeError, ValueError):
+                continue  # Skip the odd publisher, keep the rest of the page
+            up.append("app_up{%s} %d" % (labels, now - entry["received"] < self.stale_after))
+            histograms += entry_histograms
+            counters += entry_counters
+        lines = up + histograms + counters
+        return "\n".join(lines) + "\n"
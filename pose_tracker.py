@@ -0,0 +1,332 @@
+import threading
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from perf_metrics import NULL_TIMER
+
+# Pose tracking for advanced_blob_trigger.py, kept free of Qt so it can run
+# headless (bench_pipeline.py) or on a worker thread
+
+FRAME_WIDTH, FRAME_HEIGHT = 640, 480
+NUM_LANDMARKS = 33  # Mediapipe pose landmarks per person
+VISIBILITY_THRESHOLD = 0.5
+# Landmark indices used as blob triggers
+NOSE = 0
+LEFT_HAND, RIGHT_HAND = 19, 20  # Index finger knuckles
+LEFT_FOOT, RIGHT_FOOT = 31, 32  # Foot tips
+
+# Inference quality levels for adaptive mode, best first:
+# (model_complexity, inference width); height keeps the 4:3 aspect
+QUALITY_LEVELS = [(1, 640), (1, 480), (0, 480), (0, 320), (0, 256)]
+TARGET_INFERENCE_MS = 33.0
+
+
+class AdaptiveQuality:
+    # Steps inference quality down when it runs over the target latency and
+    # back up when there is plenty of headroom; the cooldown keeps it from
+    # oscillating (recreating the model for a complexity change is not free)
+    def __init__(self, cooldown=20, smoothing=0.2):
+        self.level = 0
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.ema_ms = None
+        self._wait = 0
+
+    def update(self, inference_ms, target_ms):
+        if self.ema_ms is None:
+            self.ema_ms = inference_ms
+        self.ema_ms += self.smoothing * (inference_ms - self.ema_ms)
+        if self._wait:
+            self._wait -= 1
+            return self.level
+        if self.ema_ms > target_ms * 1.15 and self.level < len(QUALITY_LEVELS) - 1:
+            self.level += 1
+        elif self.ema_ms < target_ms * 0.6 and self.level > 0:
+            self.level -= 1
+        else:
+            return self.level
+        self._wait = self.cooldown
+        self.ema_ms = None
+        return self.level
+
+    def reset(self):
+        self.level = 0
+        self.ema_ms = None
+        self._wait = 0
+
+
+class FrameRing:
+    # Fixed-capacity history of per-frame arrays, preallocated and indexed
+    # by frame number: frame f lives in slot f % capacity until it is
+    # overwritten capacity frames later
+    def __init__(self, capacity, shape, dtype=np.float32, fill=np.nan):
+        self.capacity = capacity
+        self.fill = fill
+        self.data = np.full((capacity,) + tuple(shape), fill, dtype=dtype)
+        self.times = np.zeros(capacity)
+        self.frames = 0  # Frames pushed so far; the next frame number
+
+    def push(self, timestamp, values=None):
+        # Stores values (or the fill value) as the next frame; returns the
+        # slot so callers can write into it in place
+        slot = self.data[self.frames % self.capacity]
+        if values is None:
+            slot[...] = self.fill
+        else:
+            slot[...] = values
+        self.times[self.frames % self.capacity] = timestamp
+        self.frames += 1
+        return slot
+
+    def latest(self, n):
+        # Copy of the last n frames (fewer if not recorded yet), oldest first
+        n = min(n, self.frames, self.capacity)
+        return self.data[np.arange(self.frames - n, self.frames) % self.capacity]
+
+    def clear(self):
+        self.data[...] = self.fill
+        self.frames = 0
+
+
+class OneEuroFilter:
+    # One-Euro filter (Casiez et al.) over a whole array of coordinates at
+    # once: a low-pass whose cutoff rises with speed, so still landmarks are
+    # steady and fast ones don't lag. The smoothed derivative doubles as the
+    # velocity estimate; it is taken between raw samples rather than against
+    # the lagging filtered value, so steady motion isn't overestimated.
+    # Units: pixels and seconds.
+    def __init__(self, shape, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.value = np.zeros(shape, dtype=np.float32)
+        self.velocity = np.zeros(shape, dtype=np.float32)
+        self.previous = np.zeros(shape, dtype=np.float32)
+        self.time = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        return 1.0 / (1.0 + 1.0 / (2 * np.pi * cutoff * dt))
+
+    def __call__(self, timestamp, values, reset=None):
+        # reset: boolean mask broadcastable to values; those entries restart
+        # from the raw values with zero velocity (e.g. a newly seen person)
+        if self.time is None or timestamp <= self.time:
+            self.value[...] = values
+            self.previous[...] = values
+            self.velocity[...] = 0
+            self.time = timestamp
+            return self.value
+        dt = timestamp - self.time
+        self.time = timestamp
+        raw_velocity = (values - self.previous) / dt
+        self.previous[...] = values
+        self.velocity += self._alpha(self.d_cutoff, dt) * (raw_velocity - self.velocity)
+        # Cutoff per landmark from its speed, shared by its x and y
+        speed = np.linalg.norm(self.velocity, axis=-1, keepdims=True)
+        self.value += self._alpha(self.min_cutoff + self.beta * speed, dt) * (values - self.value)
+        if reset is not None:
+            self.value[...] = np.where(reset, values, self.value)
+            self.velocity[...] = np.where(reset, 0, self.velocity)
+            self.previous[...] = np.where(reset, values, self.previous)
+        return self.value
+
+
+class PoseSnapshot:
+    # Consistent copy of the tracked poses for one render frame
+    __slots__ = ('positions', 'velocities', 'visibility', 'present')
+
+    def __init__(self, positions, velocities, visibility, present):
+        self.positions = positions  # (people, 33, 2) pixels
+        self.velocities = velocities  # (people, 33, 2) pixels/s
+        self.visibility = visibility  # (people, 33)
+        self.present = present  # (people,) bool
+
+    def landmarks(self, indices, min_visibility=VISIBILITY_THRESHOLD):
+        # (people, k, 2) positions and velocities of the given landmarks,
+        # NaN where the person is absent or the landmark not visible
+        visible = self.present[:, None] & (self.visibility[:, indices] >= min_visibility)
+        positions = np.where(visible[..., None], self.positions[:, indices], np.nan)
+        velocities = np.where(visible[..., None], self.velocities[:, indices], np.nan)
+        return positions, velocities
+
+
+class PoseHistory:
+    # All landmarks of up to max_people people: raw and One-Euro smoothed
+    # positions in frame rings, velocities from the filter and person slots
+    # kept stable across frames by nearest-centroid matching. observe() runs
+    # on the inference thread, snapshot() on the render thread.
+    def __init__(self, max_people=1, capacity=120, max_distance=150.0, timeout=0.5, max_horizon=0.15,
+                 min_cutoff=1.0, beta=0.05):
+        self.max_people = max_people
+        self.max_distance = max_distance
+        self.timeout = timeout
+        self.max_horizon = max_horizon
+        shape = (max_people, NUM_LANDMARKS, 2)
+        self.raw = FrameRing(capacity, shape)
+        self.smoothed = FrameRing(capacity, shape)
+        self.visibility = FrameRing(capacity, shape[:2], fill=0.0)
+        self.filter = OneEuroFilter(shape, min_cutoff, beta)
+        self.present = np.zeros(max_people, dtype=bool)
+        self.centroids = np.zeros((max_people, 2), dtype=np.float32)
+        self.time = 0.0
+        self._lock = threading.Lock()
+
+    def _assign(self, centroids):
+        # Slot per detected person: greedy nearest match to the people seen
+        # last frame; new people take slots that were empty, and people
+        # beyond max_people are dropped (-1)
+        slots = np.full(len(centroids), -1)
+        matched = np.zeros(self.max_people, dtype=bool)
+        if len(centroids) and self.present.any():
+            dist = np.linalg.norm(centroids[:, None, :] - self.centroids[None, :, :], axis=2)
+            dist[:, ~self.present] = np.inf
+            for flat in np.argsort(dist, axis=None):
+                person, slot = divmod(int(flat), self.max_people)
+                if dist[person, slot] > self.max_distance:
+                    break
+                if slots[person] >= 0 or matched[slot]:
+                    continue
+                slots[person] = slot
+                matched[slot] = True
+        free = [slot for slot in range(self.max_people) if not self.present[slot]]
+        for person in np.flatnonzero(slots < 0):
+            if free:
+                slots[person] = free.pop(0)
+        return slots
+
+    def observe(self, timestamp, poses):
+        # poses: (n, 33, 3) x, y in pixels and visibility, as returned by
+        # PoseTracker.process
+        with self._lock:
+            centroids = poses[:, :, :2].mean(axis=1) if len(poses) else np.empty((0, 2), dtype=np.float32)
+            slots = self._assign(centroids)
+            raw = self.raw.push(timestamp)
+            visibility = self.visibility.push(timestamp)
+            present = np.zeros(self.max_people, dtype=bool)
+            for person, slot in enumerate(slots):
+                if slot >= 0:
+                    raw[slot] = poses[person, :, :2]
+                    visibility[slot] = poses[person, :, 2]
+                    self.centroids[slot] = centroids[person]
+                    present[slot] = True
+            # People who just appeared start from their raw position; absent
+            # slots keep their last value and are masked by present
+            reset = (present & ~self.present)[:, None, None]
+            values = np.where(present[:, None, None], raw, self.filter.value)
+            self.smoothed.push(timestamp, self.filter(timestamp, values, reset))
+            self.present = present
+            self.time = timestamp
+
+    def snapshot(self, now):
+        # Smoothed poses extrapolated to now along their velocities, which
+        # also hides the capture-to-result latency
+        with self._lock:
+            positions = self.filter.value.copy()
+            velocities = self.filter.velocity.copy()
+            visibility = self.visibility.data[(self.visibility.frames - 1) % self.visibility.capacity].copy()
+            present = self.present.copy()
+            age = now - self.time
+        if age > self.timeout:
+            present[:] = False
+        positions += velocities * min(max(age, 0.0), self.max_horizon)
+        np.clip(positions, 0, (FRAME_WIDTH - 1, FRAME_HEIGHT - 1), out=positions)
+        return PoseSnapshot(positions, velocities, visibility, present)
+
+
+class PoseTracker:
+    # All 33 landmarks of every detected person. The classic Mediapipe Pose
+    # solution tracks one person; with model_path (a pose_landmarker .task
+    # file) the Tasks PoseLandmarker tracks up to num_poses people.
+    def __init__(self, min_detection_confidence=0.5, min_tracking_confidence=0.5, model_complexity=1,
+                 num_poses=1, model_path=None):
+        if num_poses > 1 and not model_path:
+            raise ValueError("Tracking several people needs a PoseLandmarker model (model_path)")
+        # Mediapipe setup
+        self.mp_pose = mp.solutions.pose
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.model_complexity = model_complexity
+        self.num_poses = num_poses
+        self.model_path = model_path
+        self.pose = self._create_pose()
+        self.level = 0
+        self.inference_width = FRAME_WIDTH
+        self.adaptive = AdaptiveQuality()
+        self.last_inference_ms = 0.0
+        self._timestamp_ms = 0
+        self._scale = np.array([FRAME_WIDTH, FRAME_HEIGHT, 1], dtype=np.float32)
+        self.timer = NULL_TIMER
+
+    def _create_pose(self):
+        if self.model_path:
+            vision = mp.tasks.vision
+            options = vision.PoseLandmarkerOptions(
+                base_options=mp.tasks.BaseOptions(model_asset_path=self.model_path),
+                running_mode=vision.RunningMode.VIDEO,
+                num_poses=self.num_poses,
+                min_pose_detection_confidence=self.min_detection_confidence,
+                min_tracking_confidence=self.min_tracking_confidence)
+            return vision.PoseLandmarker.create_from_options(options)
+        return self.mp_pose.Pose(model_complexity=self.model_complexity,
+                                 min_detection_confidence=self.min_detection_confidence,
+                                 min_tracking_confidence=self.min_tracking_confidence)
+
+    def set_quality(self, level):
+        self.level = level
+        model_complexity, self.inference_width = QUALITY_LEVELS[level]
+        # The Tasks model is fixed by its file; only the resolution adapts
+        if model_complexity != self.model_complexity and not self.model_path:
+            self.pose.close()
+            self.model_complexity = model_complexity
+            self.pose = self._create_pose()
+
+    def _detect(self, rgb):
+        # -> list of landmark lists, one per person
+        if self.model_path:
+            # VIDEO mode needs strictly increasing timestamps
+            self._timestamp_ms = max(self._timestamp_ms + 1, int(time.perf_counter() * 1000))
+            image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+            return self.pose.detect_for_video(image, self._timestamp_ms).pose_landmarks
+        results = self.pose.process(rgb)
+        return [results.pose_landmarks.landmark] if results.pose_landmarks else []
+
+    def process(self, frame, params=None):
+        # Returns the BGR display frame and the poses as (people, 33, 3)
+        # float32: x, y in pixels and visibility
+        params = params or {}
+        with self.timer.stage("resize"):
+            frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
+            # Landmarks are normalized, so a smaller inference image needs no
+            # mapping back. Only the inference image is converted to RGB; the
+            # display takes BGR as is.
+            if self.inference_width != FRAME_WIDTH:
+                size = (self.inference_width, self.inference_width * FRAME_HEIGHT // FRAME_WIDTH)
+                inference_frame = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA),
+                                               cv2.COLOR_BGR2RGB)
+            else:
+                inference_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with self.timer.stage("inference"):
+            start = time.perf_counter()
+            people = self._detect(inference_frame)
+            self.last_inference_ms = (time.perf_counter() - start) * 1000
+
+        if params.get("adaptive"):
+            level = self.adaptive.update(self.last_inference_ms, params.get("target_ms", TARGET_INFERENCE_MS))
+            if level != self.level:
+                self.set_quality(level)
+        elif self.adaptive.level:
+            self.adaptive.reset()
+            self.set_quality(0)
+
+        poses = np.array([[(lm.x, lm.y, lm.visibility if lm.visibility is not None else 1.0)
+                           for lm in landmarks] for landmarks in people],
+                         dtype=np.float32).reshape(-1, NUM_LANDMARKS, 3)
+        poses *= self._scale
+        return frame, poses
+
+    def close(self):
+        self.pose.close()
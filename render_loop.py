@@ -0,0 +1,331 @@
+import ctypes
+import csv
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v
+
+# Frame loop plumbing for the GL scripts (cilindrical_led.py): frame pacing,
+# uniforms that are only re-sent when they change, per-stage CPU and GPU
+# timing, a text overlay and periodic CSV export of frame-time percentiles.
+#
+#   loop = RenderLoop(target_fps=60)
+#   while running:
+#       with loop.frame():
+#           with loop.stage("update"): ...
+#           with loop.stage("draw"): ...
+#       report = loop.poll_report()  # every report_interval seconds
+#
+# With metrics (a perf_metrics.Metrics), every CPU stage, GPU stage (as
+# "gpu:NAME") and frame interval is also recorded there for live publishing.
+
+
+class UniformCache:
+    # Remembers the last value sent to each uniform location and skips the
+    # GL call when it hasn't changed. Locations are per program, so use one
+    # cache per program.
+    def __init__(self):
+        self._values = {}
+
+    def _changed(self, location, value):
+        old = self._values.get(location)
+        if old is not None and np.array_equal(old, value):
+            return False
+        self._values[location] = np.array(value, copy=True)
+        return True
+
+    def matrix4(self, location, value):
+        if self._changed(location, value):
+            glUniformMatrix4fv(location, 1, GL_FALSE, value)
+
+    def float1(self, location, value):
+        if self._changed(location, value):
+            glUniform1f(location, value)
+
+    def float2(self, location, x, y):
+        if self._changed(location, (x, y)):
+            glUniform2f(location, x, y)
+
+    def invalidate(self):
+        # After relinking a program or switching contexts
+        self._values.clear()
+
+
+class GpuStageTimer:
+    # GPU time per stage from GL_TIMESTAMP queries around each stage. Results
+    # are collected a few frames later, when the GPU has caught up, so
+    # measuring never stalls the pipeline. (Timestamps rather than
+    # GL_TIME_ELAPSED, which can't nest and is broken on some Mesa drivers.)
+    def __init__(self, max_pending=4):
+        self.max_pending = max_pending
+        self._free = []
+        self._current = []  # [(stage, start query, end query)]
+        self._pending = deque()
+        self._result = ctypes.c_uint64()
+
+    def _query(self):
+        return self._free.pop() if self._free else int(glGenQueries(1)[0])
+
+    def begin(self, name):
+        start = self._query()
+        glQueryCounter(start, GL_TIMESTAMP)
+        self._current.append([name, start, None])
+
+    def end(self):
+        end = self._query()
+        glQueryCounter(end, GL_TIMESTAMP)
+        self._current[-1][2] = end
+
+    def end_frame(self):
+        # Returns [(stage, seconds), ...] of every frame whose results arrived
+        if self._current:
+            self._pending.append(self._current)
+            self._current = []
+        finished = []
+        while self._pending:
+            frame = self._pending[0]
+            last_query = frame[-1][2]
+            # Only block when the GPU is more than max_pending frames behind
+            if len(self._pending) <= self.max_pending and \
+                    not glGetQueryObjectuiv(last_query, GL_QUERY_RESULT_AVAILABLE):
+                break
+            self._pending.popleft()
+            for name, start, end in frame:
+                finished.append((name, (self._read(end) - self._read(start)) / 1e9))
+                self._free.extend((start, end))
+        return finished
+
+    def _read(self, query):
+        glGetQueryObjectui64v(query, GL_QUERY_RESULT, ctypes.byref(self._result))
+        return self._result.value
+
+    def delete(self):
+        queries = self._free + [q for frame in self._pending for _, start, end in frame for q in (start, end)]
+        if queries:
+            glDeleteQueries(len(queries), queries)
+        self._free, self._pending = [], deque()
+
+
+class FramePacer:
+    # Sleeps to a fixed frame rate on an absolute schedule, so one slow frame
+    # doesn't push all later frames back. target_fps=0 runs unpaced.
+    def __init__(self, target_fps=60):
+        self.interval = 1.0 / target_fps if target_fps else 0.0
+        self.deadline = time.perf_counter()
+
+    def wait(self):
+        if not self.interval:
+            return
+        self.deadline += self.interval
+        delay = self.deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -self.interval:
+            # Fell more than a frame behind: resync instead of bursting
+            self.deadline = time.perf_counter()
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+class RenderLoop:
+    def __init__(self, target_fps=60, gpu_timing=True, report_interval=1.0, csv_path=None, metrics=None):
+        self.target_fps = target_fps
+        self.metrics = metrics
+        self.pacer = FramePacer(target_fps)
+        self.gpu = GpuStageTimer() if gpu_timing else None
+        self.report_interval = report_interval
+        self.csv_path = csv_path
+        self.frames = 0
+        self._frame_start = None
+        self._reset_samples()
+        self._report_start = time.perf_counter()
+        self.last_report = None
+
+    def _reset_samples(self):
+        self.frame_times = []
+        self.cpu_samples = {}  # stage -> [seconds, ...]
+        self.gpu_samples = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.gpu is not None:
+            self.gpu.begin(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.cpu_samples.setdefault(name, []).append(seconds)
+            if self.metrics is not None:
+                self.metrics.observe(name, seconds)
+            if self.gpu is not None:
+                self.gpu.end()
+
+    @contextmanager
+    def frame(self):
+        # Frame time is start-to-start, so it includes pacing and vsync
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            self.frame_times.append(now - self._frame_start)
+        self._frame_start = now
+        if self.metrics is not None:
+            self.metrics.frame()
+        yield
+        if self.gpu is not None:
+            for name, seconds in self.gpu.end_frame():
+                self.gpu_samples.setdefault(name, []).append(seconds)
+                if self.metrics is not None:
+                    self.metrics.observe("gpu:" + name, seconds)
+        self.frames += 1
+        self.pacer.wait()
+
+    def poll_report(self):
+        # Every report_interval seconds: percentiles of the frames since the
+        # last report (also appended to the CSV); otherwise None
+        now = time.perf_counter()
+        if now - self._report_start < self.report_interval or not self.frame_times:
+            return None
+        report = self.report(now - self._report_start)
+        self._report_start = now
+        self._reset_samples()
+        if self.csv_path:
+            self.write_csv(report)
+        self.last_report = report
+        return report
+
+    def report(self, elapsed):
+        budget = 1.0 / self.target_fps if self.target_fps else None
+        rows = {"frame": percentiles(self.frame_times)}
+        for kind, samples in (("cpu", self.cpu_samples), ("gpu", self.gpu_samples)):
+            for name, values in samples.items():
+                rows["%s:%s" % (kind, name)] = percentiles(values)
+        return {
+            "time": time.time(),
+            "fps": len(self.frame_times) / elapsed,
+            # Frames that took over 1.5 intervals, i.e. showed a frame twice
+            "dropped": int(sum(t > 1.5 * budget for t in self.frame_times)) if budget else 0,
+            "rows": rows,
+        }
+
+    def write_csv(self, report):
+        new_file = not os.path.exists(self.csv_path)
+        with open(self.csv_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["time", "fps", "dropped", "metric", "count", "mean_ms", "p50_ms", "p95_ms",
+                                 "p99_ms", "max_ms"])
+            for metric, stats in report["rows"].items():
+                writer.writerow(["%.3f" % report["time"], "%.2f" % report["fps"], report["dropped"], metric,
+                                 stats["count"]] + ["%.3f" % stats[key] for key in
+                                                    ("mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")])
+
+    def close(self):
+        if self.gpu is not None:
+            self.gpu.delete()
+
+
+def format_report(report):
+    lines = ["%.1f fps  %d dropped" % (report["fps"], report["dropped"]),
+             "%-18s %7s %7s %7s" % ("", "p50", "p99", "max")]
+    for metric, stats in report["rows"].items():
+        lines.append("%-18s %7.2f %7.2f %7.2f" % (metric, stats["p50_ms"], stats["p99_ms"], stats["max_ms"]))
+    return lines
+
+
+overlay_vertex_shader = """
+#version 330
+in vec2 corner;
+uniform vec4 rect;  // x, y, width, height in NDC
+out vec2 uv;
+void main() {
+    uv = vec2(corner.x, 1.0 - corner.y);
+    gl_Position = vec4(rect.xy + corner * rect.zw, 0.0, 1.0);
+}
+"""
+
+overlay_fragment_shader = """
+#version 330
+in vec2 uv;
+uniform sampler2D text;
+out vec4 fragColor;
+void main() {
+    fragColor = texture(text, uv);
+}
+"""
+
+
+class TextOverlay:
+    # Draws an RGBA image (rows top to bottom) in the top-left corner of the
+    # viewport, e.g. text rasterized by pygame.font. The texture is only
+    # re-uploaded when set_image is called.
+    def __init__(self, viewport_size):
+        from OpenGL.GL.shaders import compileProgram, compileShader
+        self.viewport_size = viewport_size
+        self.program = compileProgram(compileShader(overlay_vertex_shader, GL_VERTEX_SHADER),
+                                      compileShader(overlay_fragment_shader, GL_FRAGMENT_SHADER))
+        self.rect_loc = glGetUniformLocation(self.program, "rect")
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        self.size = None
+
+        corners = np.array([[0, 0], [1, 0], [1, 1], [0, 0], [1, 1], [0, 1]], dtype=np.float32)
+        self.vao = glGenVertexArrays(1)
+        self.vbo = glGenBuffers(1)
+        glBindVertexArray(self.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, corners.nbytes, corners, GL_STATIC_DRAW)
+        corner_loc = glGetAttribLocation(self.program, "corner")
+        glEnableVertexAttribArray(corner_loc)
+        glVertexAttribPointer(corner_loc, 2, GL_FLOAT, GL_FALSE, 8, None)
+        glBindVertexArray(0)
+
+    def set_image(self, rgba):
+        h, w = rgba.shape[:2]
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, w, h, 0, GL_RGBA, GL_UNSIGNED_BYTE,
+                     np.ascontiguousarray(rgba, dtype=np.uint8))
+        glBindTexture(GL_TEXTURE_2D, 0)
+        self.size = (w, h)
+
+    def draw(self, margin=8):
+        if self.size is None:
+            return
+        vw, vh = self.viewport_size
+        w, h = self.size
+        x = -1 + 2 * margin / vw
+        y = 1 - 2 * (margin + h) / vh
+        depth_test = glIsEnabled(GL_DEPTH_TEST)
+        glDisable(GL_DEPTH_TEST)
+        glUseProgram(self.program)
+        glUniform4f(self.rect_loc, x, y, 2 * w / vw, 2 * h / vh)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glBindVertexArray(self.vao)
+        glDrawArrays(GL_TRIANGLES, 0, 6)
+        glBindVertexArray(0)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        if depth_test:
+            glEnable(GL_DEPTH_TEST)
+
+    def delete(self):
+        glDeleteTextures(1, [self.texture])
+        glDeleteBuffers(1, [self.vbo])
+        glDeleteVertexArrays(1, [self.vao])
+        glDeleteProgram(self.program)
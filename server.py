@@ -1,15 +1,176 @@
-from flask import Flask, send_from_directory
+import argparse
 import os
+import secrets
+import threading
 
-app = Flask(__name__, static_folder='.')
+from perf_metrics import METRICS_PORT, MetricsCollector
+from static_assets import (AssetIndex, cache_headers, is_not_modified, is_versioned, iter_body, plan_ranges,
+                           range_layout, unsatisfiable_headers)
 
-@app.route('/')
-def index():
-    return send_from_directory('.', 'index.html')
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Pages the kiosks load on every visit; hashed up front so the first hit is warm
+HTML_PAGES = ['index.html', 'virtualPark.html', 'parkVR.html', 'parkrpg.html', 'worldmemory.html']
 
-@app.route('/<path:path>')
-def serve_file(path):
-    return send_from_directory('.', path)
+assets = AssetIndex(ROOT)
+production = False
+# Live stage metrics published by the installation apps (--metrics); the
+# collector binds on first use so the debug reloader's parent never holds the port
+metrics_config = None  # (udp address or None, shm names)
+metrics_collector = None
+metrics_lock = threading.Lock()
+
+def get_collector():
+    global metrics_collector
+    with metrics_lock:
+        if metrics_collector is None and metrics_config is not None:
+            metrics_collector = MetricsCollector(*metrics_config)
+        return metrics_collector
+
+# Live video from the webcam apps (--broadcast NAME), one Broadcaster per
+# stream, started on the first viewer for the same reason
+stream_names = set()
+broadcasters = {}
+stream_fps = 30
+broadcast_lock = threading.Lock()
+
+def get_broadcaster(name):
+    if name not in stream_names:
+        return None
+    with broadcast_lock:
+        if name not in broadcasters:
+            # Imported here so serving files never needs OpenCV or NumPy
+            from video_broadcast import Broadcaster
+            broadcasters[name] = Broadcaster(name, stream_fps)
+            broadcasters[name].start()
+        return broadcasters[name]
+
+def create_app():
+    # Flask is only imported for the flask engine, so --engine asyncio runs
+    # without it installed
+    from flask import Flask, Response, abort, jsonify, request, send_from_directory
+
+    app = Flask(__name__, static_folder='.')
+
+    def serve_asset(path):
+        asset = assets.get(path)
+        if asset is None:
+            abort(404)
+
+        range_header = request.headers.get('Range')
+        # Ranges address the identity bytes, so partial requests skip compression
+        accept_encoding = None if range_header else request.headers.get('Accept-Encoding')
+        encoding, body, file_path = assets.representation(asset, accept_encoding)
+        headers = cache_headers(asset, is_versioned(path, request.query_string.decode('latin-1')), encoding)
+        if is_not_modified(asset, request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since'),
+                           headers['ETag']):
+            return Response(status=304, headers=headers)
+
+        status, ranges = plan_ranges(asset, range_header, request.headers.get('If-Range'))
+        if status == 416:
+            headers.update(unsatisfiable_headers(asset))
+            return Response(status=416, headers=headers)
+        if status == 206:
+            range_headers, parts, trailer = range_layout(asset, ranges, secrets.token_hex(12))
+            headers.update(range_headers)
+            return Response(iter_body(body, file_path, parts, trailer), status=206, headers=headers,
+                            direct_passthrough=True)
+
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        if body is not None:
+            return Response(body, headers=headers, content_type=asset.content_type)
+        # Too large to keep in memory: stream it from a memory map
+        headers['Content-Length'] = str(os.path.getsize(file_path))
+        return Response(iter_body(None, file_path), headers=headers, content_type=asset.content_type,
+                        direct_passthrough=True)
+
+    @app.route('/')
+    def index():
+        if production:
+            return serve_asset('index.html')
+        return send_from_directory('.', 'index.html')
+
+    @app.route('/metrics')
+    def metrics():
+        collector = get_collector()
+        if collector is None:
+            abort(404)
+        if request.args.get('format') == 'json':
+            response = jsonify(collector.report())
+        else:
+            response = Response(collector.prometheus(), content_type='text/plain; version=0.0.4')
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    @app.route('/metrics/dashboard')
+    def metrics_dashboard():
+        if get_collector() is None:
+            abort(404)
+        return send_from_directory(ROOT, 'metrics_dashboard.html', max_age=0)
+
+    @app.route('/stream/<name>.mjpg')
+    def stream_mjpeg(name):
+        broadcaster = get_broadcaster(name)
+        if broadcaster is None:
+            abort(404)
+        from video_broadcast import DEFAULT_LEVEL, mjpeg
+        level = request.args.get('quality', DEFAULT_LEVEL)
+        if level not in broadcaster.channels:
+            abort(400)
+        # Every viewer of a level shares one encode; a slow phone just skips frames
+        return Response(mjpeg(broadcaster.frames(level)), mimetype='multipart/x-mixed-replace; boundary=frame',
+                        headers={'Cache-Control': 'no-store'}, direct_passthrough=True)
+
+    @app.route('/stream/<name>')
+    def stream_page(name):
+        if name not in stream_names:
+            abort(404)
+        return send_from_directory(ROOT, 'stream_viewer.html', max_age=0)
+
+    @app.route('/<path:path>')
+    def serve_file(path):
+        if production:
+            return serve_asset(path)
+        return send_from_directory('.', path)
+
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8000)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Virtual Park server')
+    parser.add_argument('--production', action='store_true',
+                        help='serve from the in-memory asset index with ETag/304 caching, no debugger')
+    parser.add_argument('--engine', choices=['flask', 'asyncio'], default='flask',
+                        help='asyncio: pre-forked asyncio workers with sendfile (implies --production)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes for the asyncio engine')
+    parser.add_argument('--max-connections', type=int, default=256,
+                        help='requests answered at once per asyncio worker (idle keep-alive connections are not counted)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--metrics-port', type=int, nargs='?', const=METRICS_PORT, default=0,
+                        help='listen for app metrics on this UDP port (%d if omitted), served at /metrics and '
+                             '/metrics/dashboard (flask engine); off by default' % METRICS_PORT)
+    parser.add_argument('--metrics-shm', nargs='*', default=[], metavar='NAME',
+                        help='also read metrics from these shared-memory blocks (apps run with --metrics shm:NAME)')
+    parser.add_argument('--stream', nargs='*', default=[], metavar='NAME',
+                        help='serve these app feeds (apps run with --broadcast NAME) at /stream/NAME (flask engine)')
+    parser.add_argument('--stream-fps', type=int, default=30, help='most frames per second encoded per stream')
+    args = parser.parse_args()
+    stream_names.update(args.stream)
+    stream_fps = args.stream_fps
+    if args.metrics_port or args.metrics_shm:
+        metrics_config = ((args.host, args.metrics_port) if args.metrics_port else None, args.metrics_shm)
+
+    if args.engine == 'asyncio':
+        if args.stream:
+            parser.error('--stream needs the flask engine')
+        if metrics_config:
+            parser.error('--metrics-port/--metrics-shm need the flask engine')
+        from async_server import serve
+        serve(ROOT, args.host, args.port, args.workers, args.max_connections, warm=HTML_PAGES)
+    elif args.production:
+        production = True
+        assets.warm(HTML_PAGES)
+        create_app().run(debug=False, host=args.host, port=args.port, threaded=True)
+    else:
+        create_app().run(debug=True, host=args.host, port=args.port)
@@ -1,5 +1,17 @@
 #!/bin/bash
-echo "Starting Virtual Park server on http://localhost:8000"
+# Production entry point: precompress the pages, then run the pre-forked
+# asyncio engine. `./start.sh dev` runs the Flask debug server instead.
+cd "$(dirname "$0")"
+PYTHON=${PYTHON:-python3}
+PORT=${PORT:-8000}
+WORKERS=${WORKERS:-$(nproc 2>/dev/null || sysctl -n hw.ncpu 2>/dev/null || echo 2)}
+
+if [ "$1" = "dev" ]; then
+    echo "Starting Virtual Park dev server on http://localhost:$PORT"
+    exec "$PYTHON" server.py --port "$PORT"
+fi
+
+"$PYTHON" compress_assets.py > /dev/null
+echo "Starting Virtual Park server on http://localhost:$PORT ($WORKERS workers)"
 echo "Press Ctrl+C to stop the server"
-conda activate virtualpark
-python server.py
\ No newline at end of file
+exec "$PYTHON" server.py --engine asyncio --workers "$WORKERS" --port "$PORT"
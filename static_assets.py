@@ -0,0 +1,447 @@
+import gzip
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+import stat
+import threading
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Files at or below this size are kept in memory next to their metadata
+MAX_CACHED_BODY = 2 * 1024 * 1024
+
+# Long-lived caching for URLs that change whenever their content changes
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Everything else is cached but revalidated (cheap thanks to 304s)
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# Text-like assets worth compressing; images/audio/video are already compressed
+COMPRESSIBLE_EXTENSIONS = ('.html', '.htm', '.js', '.mjs', '.css', '.json', '.svg', '.txt', '.md', '.xml', '.glsl', '.obj', '.gltf')
+# Suffix written by compress_assets.py for each content coding, best first
+ENCODING_SUFFIXES = (('br', '.br'), ('gzip', '.gz')) if brotli else (('gzip', '.gz'),)
+# Budget for on-the-fly compressed bodies kept by the LRU cache
+COMPRESSION_CACHE_BYTES = 32 * 1024 * 1024
+# Below this size the compression overhead outweighs the saving
+MIN_COMPRESS_SIZE = 1024
+
+# More ranges than this in one request is treated as abuse and ignored
+MAX_RANGES = 16
+# Slice size when streaming from a memory-mapped file
+STREAM_CHUNK = 256 * 1024
+
+# e.g. scene.3f9a1c2b.js or texture-3f9a1c2b4d.png
+_HASHED_NAME = re.compile(r'[.-][0-9a-f]{8,}\.[A-Za-z0-9]+$')
+
+
+class Asset:
+    __slots__ = ('path', 'size', 'mtime', 'mtime_ns', 'inode', 'etag',
+                 'last_modified', 'content_type', 'body', 'compressible')
+
+    def __init__(self, path, st, digest, body):
+        self.path = path
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)
+        self.mtime_ns = st.st_mtime_ns
+        self.inode = st.st_ino
+        self.etag = '"%s"' % digest
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.content_type = guess_content_type(path)
+        self.body = body
+        self.compressible = is_compressible(path) and self.size >= MIN_COMPRESS_SIZE
+
+    def variant_etag(self, encoding):
+        # Each representation needs its own strong validator
+        if encoding is None:
+            return self.etag
+        return '"%s-%s"' % (self.etag.strip('"'), encoding)
+
+    def matches(self, st):
+        # A changed size, mtime or inode (atomic replace) invalidates the entry
+        return (st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+                and st.st_ino == self.inode)
+
+
+def guess_content_type(path):
+    content_type, _ = mimetypes.guess_type(path)
+    if content_type is None:
+        return 'application/octet-stream'
+    if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+        return content_type + '; charset=utf-8'
+    return content_type
+
+
+def is_compressible(path):
+    return path.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def find_variant(asset, encoding):
+    # Precompressed sibling written by compress_assets.py, checked on every use
+    # so a rebuild (or a deleted sibling) is picked up without a restart
+    variant = asset.path + dict(ENCODING_SUFFIXES)[encoding]
+    try:
+        st = os.stat(variant)
+    except OSError:
+        return None, None
+    # A sibling older than its source is stale and must not be served
+    if st.st_mtime_ns < asset.mtime_ns:
+        return None, None
+    return variant, st
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def hash_file(path):
+    # Strong validator: 128 bits of SHA-256 over the full content
+    digest = hashlib.sha256()
+    body = bytearray()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+            size += len(chunk)
+            if size <= MAX_CACHED_BODY:
+                body += chunk
+    return digest.hexdigest()[:32], (bytes(body) if size <= MAX_CACHED_BODY else None)
+
+
+class AssetIndex:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._assets = {}
+        self._lock = threading.Lock()
+        self._compressed = LRUCache(COMPRESSION_CACHE_BYTES)
+
+    def resolve(self, path):
+        # Reject traversal, absolute paths, dotfiles (.git, .cursorrules, ...)
+        # and NUL bytes, which the OS calls refuse
+        parts = path.replace('\\', '/').split('/')
+        if any(not part or part.startswith('.') or '\x00' in part for part in parts):
+            return None
+        return os.path.join(self.root, *parts)
+
+    def get(self, path):
+        full_path = self.resolve(path)
+        if full_path is None:
+            return None
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            self.invalidate(path)
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        asset = self._assets.get(path)
+        if asset is not None and asset.matches(st):
+            return asset
+
+        digest, body = hash_file(full_path)
+        # The file may have been rewritten while hashing; only trust a stable stat
+        st_after = os.stat(full_path)
+        asset = Asset(full_path, st_after, digest, body)
+        if asset.matches(st):
+            with self._lock:
+                self._assets[path] = asset
+        return asset
+
+    def encoded_body(self, asset, encoding):
+        # Returns (body, path): exactly one is set, or (None, None) if unavailable
+        variant, variant_st = find_variant(asset, encoding)
+        if variant is not None:
+            if asset.body is None:
+                return None, variant
+            key = (variant, variant_st.st_mtime_ns, variant_st.st_size)
+            body = self._compressed.get(key)
+            if body is None:
+                with open(variant, 'rb') as f:
+                    body = f.read()
+                self._compressed.put(key, body)
+            return body, None
+        if asset.body is None:
+            # Large files are only sent compressed when a sibling was prebuilt
+            return None, None
+        key = (asset.path, asset.etag, encoding)
+        body = self._compressed.get(key)
+        if body is None:
+            body = compress(asset.body, encoding)
+            self._compressed.put(key, body)
+        return body, None
+
+    def representation(self, asset, accept_encoding):
+        # Returns (encoding, body, path) for the best variant the client accepts
+        for encoding in negotiate_encodings(asset, accept_encoding):
+            body, path = self.encoded_body(asset, encoding)
+            if body is not None or path is not None:
+                return encoding, body, path
+        return None, asset.body, asset.path
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._assets.clear()
+            else:
+                self._assets.pop(path, None)
+
+    def warm(self, paths):
+        for path in paths:
+            self.get(path)
+
+
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = value
+            self.size += len(value)
+            # Stale entries (old ETags) simply age out here
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def parse_accept_encoding(header):
+    codings = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def negotiate_encodings(asset, accept_encoding):
+    # Acceptable codings, best first; brotli wins over gzip at equal q.
+    # An empty list means the identity representation is sent.
+    if not asset.compressible or not accept_encoding:
+        return []
+    codings = parse_accept_encoding(accept_encoding)
+    wildcard = codings.get('*', 0.0)
+    ranked = []
+    for rank, (encoding, _) in enumerate(ENCODING_SUFFIXES):
+        q = codings.get(encoding, wildcard)
+        if encoding == 'gzip':
+            q = codings.get('gzip', codings.get('x-gzip', wildcard))
+        if q > 0:
+            ranked.append((-q, rank, encoding))
+    return [encoding for _, _, encoding in sorted(ranked)]
+
+
+def _etag_list(header):
+    return [tag.strip() for tag in header.split(',') if tag.strip()]
+
+
+def _weak_equal(a, b):
+    return a.removeprefix('W/') == b.removeprefix('W/')
+
+
+def _parse_http_date(value):
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def is_not_modified(asset, if_none_match=None, if_modified_since=None, etag=None):
+    # RFC 9110 13.2.2: If-None-Match takes precedence over If-Modified-Since
+    if if_none_match:
+        tags = _etag_list(if_none_match)
+        etag = etag or asset.etag
+        return '*' in tags or any(_weak_equal(tag, etag) for tag in tags)
+    if if_modified_since:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and asset.mtime <= since
+    return False
+
+
+def parse_range(header, size):
+    # Returns inclusive (start, end) pairs, [] when nothing is satisfiable,
+    # or None when the header must be ignored and the full body sent
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        if not sep:
+            return None
+        try:
+            if not first:
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(0, size - length), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else None
+                if start < 0 or (end is not None and end < start):
+                    return None
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        if end is None:
+            end = size - 1
+        ranges.append((start, min(end, size - 1)))
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Overlapping and adjacent ranges are merged (RFC 9110 14.3 allows it)
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(asset, if_range):
+    # If-Range needs a strong validator: an exact ETag or the exact date
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == asset.etag
+    date = _parse_http_date(if_range)
+    return date is not None and int(date) == asset.mtime
+
+
+def plan_ranges(asset, range_header, if_range=None):
+    # Returns (status, ranges): 200 for the whole body, 206 or 416
+    if not range_header or not if_range_matches(asset, if_range):
+        return 200, None
+    ranges = parse_range(range_header, asset.size)
+    if ranges is None:
+        return 200, None
+    if not ranges:
+        return 416, None
+    if ranges == [(0, asset.size - 1)]:
+        return 200, None
+    return 206, ranges
+
+
+def range_layout(asset, ranges, boundary):
+    # Returns (headers, parts, trailer) where parts are (part header, start, end)
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers = {
+            'Content-Type': asset.content_type,
+            'Content-Range': 'bytes %d-%d/%d' % (start, end, asset.size),
+            'Content-Length': str(end - start + 1),
+        }
+        return headers, [(b'', start, end)], b''
+
+    parts = []
+    length = 0
+    for start, end in ranges:
+        head = ('\r\n--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n'
+                % (boundary, asset.content_type, start, end, asset.size)).encode('latin-1')
+        parts.append((head, start, end))
+        length += len(head) + end - start + 1
+    trailer = ('\r\n--%s--\r\n' % boundary).encode('latin-1')
+    headers = {
+        'Content-Type': 'multipart/byteranges; boundary=' + boundary,
+        'Content-Length': str(length + len(trailer)),
+    }
+    return headers, parts, trailer
+
+
+def unsatisfiable_headers(asset):
+    return {'Content-Range': 'bytes */%d' % asset.size, 'Content-Length': '0'}
+
+
+def iter_file_range(path, start, end, chunk_size=STREAM_CHUNK):
+    # Streams bytes [start, end] through an mmap so resident memory stays at
+    # one chunk no matter how large the file is
+    if end < start:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for offset in range(start, end + 1, chunk_size):
+            yield mm[offset:min(offset + chunk_size, end + 1)]
+
+
+def iter_body(body, path, parts=None, trailer=b''):
+    # Yields a whole body (parts=None) or the parts of a range response,
+    # from the in-memory copy when there is one, otherwise from disk
+    if parts is None:
+        if body is not None:
+            yield body
+        else:
+            yield from iter_file_range(path, 0, os.path.getsize(path) - 1)
+        return
+    for head, start, end in parts:
+        if head:
+            yield head
+        if body is not None:
+            yield body[start:end + 1]
+        else:
+            yield from iter_file_range(path, start, end)
+    if trailer:
+        yield trailer
+
+
+def is_versioned(path, query_string=''):
+    # ?v=<anything> cache-busting or a content hash baked into the file name
+    if query_string:
+        for pair in query_string.split('&'):
+            if pair.split('=', 1)[0] == 'v':
+                return True
+    return bool(_HASHED_NAME.search(path))
+
+
+def cache_headers(asset, versioned=False, encoding=None):
+    headers = {
+        'ETag': asset.variant_etag(encoding),
+        'Last-Modified': asset.last_modified,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL,
+    }
+    if asset.compressible:
+        headers['Vary'] = 'Accept-Encoding'
+    return headers
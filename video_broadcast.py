@@ -0,0 +1,242 @@
+import argparse
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frame_source import open_source
+
+# Live video of the webcam effects for visitors' phones. An app publishes
+# each processed frame into a named shared-memory block (FramePublisher,
+# seqlocked like led_output's SharedMemorySink); server.py reads it with a
+# Broadcaster, which JPEG-encodes every new frame once per quality level and
+# hands the same bytes to every viewer of that level. Viewers always take
+# the newest encoded frame, so a slow phone skips frames instead of queueing
+# them, and the encode cost does not grow with the number of viewers.
+#
+#   python cybernetic_glitch_feed.py --broadcast glitch
+#   python server.py --stream glitch      # http://HOST:8000/stream/glitch
+#
+# python video_broadcast.py --source synthetic --name glitch publishes a test
+# feed without a camera or app.
+
+HEADER = struct.Struct("<QIII")  # sequence (odd while writing), width, height, flags
+FLAG_RGB = 1
+MAX_WIDTH, MAX_HEIGHT = 1920, 1080  # Larger frames are scaled down to fit
+BLOCK_SIZE = HEADER.size + MAX_WIDTH * MAX_HEIGHT * 3
+
+# Quality levels offered to viewers: (max width, JPEG quality)
+LEVELS = {"low": (480, 50), "medium": (800, 70), "high": (MAX_WIDTH, 85)}
+DEFAULT_LEVEL = "medium"
+
+
+class FramePublisher:
+    # App side: latest processed frame in shared memory; send() is a copy
+    def __init__(self, name):
+        from multiprocessing import shared_memory
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=BLOCK_SIZE)
+        except FileExistsError:
+            # Left over from a run that didn't clean up
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=BLOCK_SIZE)
+        self.sequence = 0
+        HEADER.pack_into(self.shm.buf, 0, 0, 0, 0, 0)
+
+    def send(self, frame, rgb=False):
+        # frame: (h, w, 3) uint8, BGR unless rgb
+        h, w = frame.shape[:2]
+        if w > MAX_WIDTH or h > MAX_HEIGHT:
+            scale = min(MAX_WIDTH / w, MAX_HEIGHT / h)
+            w, h = int(w * scale), int(h * scale)
+            frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+        HEADER.pack_into(self.shm.buf, 0, self.sequence + 1, w, h, FLAG_RGB if rgb else 0)
+        np.copyto(np.ndarray((h, w, 3), dtype=np.uint8, buffer=self.shm.buf, offset=HEADER.size), frame)
+        self.sequence += 2
+        HEADER.pack_into(self.shm.buf, 0, self.sequence, w, h, FLAG_RGB if rgb else 0)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FrameReader:
+    # Server side: attaches to a publisher's block, re-attaching when the
+    # app restarts (a new block under the same name) or hasn't started yet
+    def __init__(self, name, stale_after=2.0):
+        self.name = name
+        self.stale_after = stale_after
+        self.shm = None
+        self.sequence = None
+        self.last_frame = 0.0
+        self.buffer = np.empty(MAX_WIDTH * MAX_HEIGHT * 3, dtype=np.uint8)
+
+    def _attach(self):
+        from multiprocessing import resource_tracker, shared_memory
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return False
+        # Only attached here; the app owns the block and unlinks it
+        resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.sequence = None
+        self.last_frame = time.monotonic()
+        return True
+
+    def detach(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+    def read(self):
+        # -> (frame view into self.buffer, rgb) for a frame not returned
+        # before, else None
+        if self.shm is None and not self._attach():
+            return None
+        sequence, w, h, flags = HEADER.unpack_from(self.shm.buf, 0)
+        if sequence % 2 or not sequence or sequence == self.sequence:
+            if time.monotonic() - self.last_frame > self.stale_after:
+                self.detach()  # Publisher gone or replaced; look it up again
+            return None
+        frame = self.buffer[:h * w * 3].reshape(h, w, 3)
+        np.copyto(frame, np.ndarray((h, w, 3), dtype=np.uint8, buffer=self.shm.buf, offset=HEADER.size))
+        if HEADER.unpack_from(self.shm.buf, 0)[0] != sequence:
+            return None  # Overwritten while copying; the next poll gets it
+        self.sequence = sequence
+        self.last_frame = time.monotonic()
+        return frame, bool(flags & FLAG_RGB)
+
+
+class Channel:
+    # Newest encoded frame of one quality level and who is watching it
+    def __init__(self, width, quality):
+        self.width = width
+        self.quality = quality
+        self.cond = threading.Condition()
+        self.viewers = 0
+        self.number = 0
+        self.jpeg = None
+
+
+class Broadcaster(threading.Thread):
+    # Polls a FrameReader and encodes each new frame once for every level
+    # that has viewers, at most max_fps times a second
+    def __init__(self, name, max_fps=30, levels=LEVELS):
+        super().__init__(name="broadcast-%s" % name, daemon=True)
+        self.reader = FrameReader(name)
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self.channels = {level: Channel(width, quality) for level, (width, quality) in levels.items()}
+        self.stop_event = threading.Event()
+        self.encoded = 0
+
+    def run(self):
+        last = 0.0
+        while not self.stop_event.is_set():
+            channels = [channel for channel in self.channels.values() if channel.viewers]
+            if not channels:
+                # Nobody watching: don't even copy the frames
+                self.stop_event.wait(0.05)
+                continue
+            wait = last + self.interval - time.monotonic()
+            if wait > 0:
+                self.stop_event.wait(wait)
+            result = self.reader.read()
+            if result is None:
+                self.stop_event.wait(0.002)
+                continue
+            last = time.monotonic()
+            frame, rgb = result
+            for channel in channels:
+                self.publish(channel, self.encode(frame, rgb, channel))
+        self.reader.detach()
+
+    def encode(self, frame, rgb, channel):
+        h, w = frame.shape[:2]
+        if w > channel.width:
+            frame = cv2.resize(frame, (channel.width, h * channel.width // w), interpolation=cv2.INTER_AREA)
+        if rgb:
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, channel.quality])
+        self.encoded += 1
+        return jpeg.tobytes()
+
+    def publish(self, channel, jpeg):
+        with channel.cond:
+            channel.number += 1
+            channel.jpeg = jpeg
+            channel.cond.notify_all()
+
+    def frames(self, level, timeout=1.0):
+        # Generator of JPEG bytes for one viewer: each new frame at most
+        # once, skipping any that came and went while the viewer was busy
+        channel = self.channels[level]
+        with channel.cond:
+            channel.viewers += 1
+        try:
+            seen = 0
+            while not self.stop_event.is_set():
+                with channel.cond:
+                    if not channel.cond.wait_for(lambda: channel.number != seen, timeout):
+                        continue
+                    seen, jpeg = channel.number, channel.jpeg
+                yield jpeg
+        finally:
+            with channel.cond:
+                channel.viewers -= 1
+
+    def viewers(self):
+        return {level: channel.viewers for level, channel in self.channels.items()}
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def mjpeg(jpegs, boundary=b"frame"):
+    # multipart/x-mixed-replace body parts; the JPEG bytes are shared by all
+    # viewers of a level and written without copying
+    for jpeg in jpegs:
+        yield b"--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % (boundary, len(jpeg))
+        yield jpeg
+        yield b"\r\n"
+
+
+def main():
+    # Stand-in app: publishes a video source for testing server.py --stream
+    parser = argparse.ArgumentParser(description="Publish a test video feed for server.py --stream")
+    parser.add_argument("--source", default="synthetic:1280x720", help="webcam index, video file or synthetic[:WxH]")
+    parser.add_argument("--name", default="glitch", help="shared-memory name (server.py --stream NAME)")
+    parser.add_argument("--seconds", type=float, default=3600)
+    args = parser.parse_args()
+
+    source = open_source(args.source)
+    if not source.isOpened():
+        raise SystemExit("Cannot open video source %r" % args.source)
+    publisher = FramePublisher(args.name)
+    deadline = time.monotonic() + args.seconds
+    frames = 0
+    report = time.monotonic() + 1
+    try:
+        while time.monotonic() < deadline:
+            ret, frame = source.read()
+            if not ret:
+                time.sleep(0.005)
+                continue
+            publisher.send(frame)
+            frames += 1
+            if time.monotonic() >= report:
+                print("%d frames/s published to %s" % (frames, args.name), flush=True)
+                frames = 0
+                report += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publisher.close()
+        source.release()
+
+
+if __name__ == "__main__":
+    main()